@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import atexit
 import datetime
 # System imports
 import logging
@@ -7,6 +8,7 @@ import os
 import signal
 import ssl
 import sys
+import time
 import traceback
 
 # discord.py imports
@@ -28,12 +30,28 @@ from aiohttp import web
 
 from libhusky import HuskyConfig
 from libhusky import HuskyHTTP
+from libhusky import HuskyHTTPClient
+from libhusky import HuskyLogging
+from libhusky import HuskyLoopMonitor
+from libhusky import HuskyMetrics
 from libhusky import HuskyUtils
 from libhusky.HuskyStatics import *
 from libhusky.discord.HuskyHelpFormatter import HuskyHelpFormatter
+from libhusky.managers.BanManager import BanManager
+from libhusky.managers.ComputeManager import ComputeManager
+from libhusky.managers.MemberCountManager import MemberCountManager
+from libhusky.managers.ModActionManager import ModActionManager
+from libhusky.managers.ReactionManager import ReactionManager
 
 LOG = logging.getLogger("HuskyBot.Core")
 
+GATEWAY_EVENTS = HuskyMetrics.get_registry().counter(
+    "husky_gateway_events_total", "Events received from the Discord gateway, by type.", ("type",)
+)
+LISTENER_LATENCY = HuskyMetrics.get_registry().histogram(
+    "husky_listener_seconds", "Time taken by each event listener to run.", ("event", "listener")
+)
+
 
 class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
     def __init__(self):
@@ -73,6 +91,46 @@ class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
             help_command=HuskyHelpFormatter()
         )
 
+        # Shared queue for deletes/kicks/bans, so modules acting on the same spam wave don't duplicate work.
+        self.mod_actions = ModActionManager(self)
+
+        # In-memory ban list, so nothing needs to download the full list from Discord to check a single user.
+        self.ban_index = BanManager(self)
+
+        # Who reacted to what, kept current from gateway events rather than paging reaction users over HTTP.
+        self.reaction_index = ReactionManager(self)
+
+        # Running member counts by status and role, so nothing needs to walk the member list to count it.
+        self.member_counts = MemberCountManager(self)
+
+        # One pooled HTTP session for every outbound request, with shared limits, timeouts, DNS cache and retries.
+        http_config = self.config.get('httpClient', {})
+        self.http_client = HuskyHTTPClient.HTTPClient(
+            connection_limit=http_config.get('connectionLimit', 100),
+            per_host_limit=http_config.get('perHostLimit', 10),
+            timeout=http_config.get('timeoutSeconds', 30),
+            retries=http_config.get('retries', 2)
+        )
+
+        # Worker processes for CPU-heavy checks (big regex batches, fuzzy matching), so they don't stall the loop.
+        compute_config = self.config.get('compute', {})
+        self.compute = ComputeManager(
+            self,
+            workers=compute_config.get('workers', 2),
+            inline_below=compute_config.get('inlineBelowMs', 1),
+            timeout=compute_config.get('timeoutSeconds', 5)
+        )
+
+        # Watch for anything blocking the event loop, and tell staff if the bot stays sluggish.
+        monitor_config = self.config.get('loopMonitor', {})
+        self.loop_monitor = HuskyLoopMonitor.LoopMonitor(
+            loop=self.loop,
+            threshold=monitor_config.get('stallThresholdMs', 250) / 1000,
+            alert_lag=monitor_config.get('alertLagMs', 100) / 1000,
+            alert_callback=self.__alert_loop_lag
+        )
+        self.loop_monitor.start()
+
         self.init_stage = 0
 
     def entrypoint(self):
@@ -117,6 +175,9 @@ class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
 
         if self.config.get("restartReason") is not None:
             print("READY FOR RESTART!")
+            # exec skips atexit hooks, so anything still queued (or being archived) has to be written out now.
+            self.log_pipeline.stop()
+            logging.shutdown()
             os.execl(sys.executable, *([sys.executable] + sys.argv))
 
     def shutdown(self):
@@ -163,12 +224,21 @@ class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
         stream_log_handler = logging.StreamHandler(sys.stdout)
         if self.__daemon_mode:
             stream_log_handler.setFormatter(logging.Formatter("[%(levelname)s] %(name)s: %(message)s"))
+        else:
+            stream_log_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+                                                              datefmt="%Y-%m-%d %H:%M:%S"))
+
+        # Loggers only queue their records, and a background thread writes them out, so the loop never waits on disk.
+        self.log_pipeline = HuskyLogging.LogPipeline(
+            file_log_handler, stream_log_handler,
+            queue_size=self.config.get('logging', {}).get('queueSize', 10000)
+        )
+        self.log_pipeline.start()
+        atexit.register(self.log_pipeline.stop)
 
         logging.basicConfig(
             level=logging.WARNING,
-            format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-            datefmt="%Y-%m-%d %H:%M:%S",
-            handlers=[file_log_handler, stream_log_handler]
+            handlers=[self.log_pipeline.handler]
         )
 
         bot_logger = logging.getLogger("HuskyBot")
@@ -209,8 +279,9 @@ class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
                 ssl_context = ssl.SSLContext()
                 ssl_context.load_cert_chain(cert.read())
 
-        for method in ["GET", "HEAD", "POST", "PATCH", "PUT", "DELETE", "VIEW"]:
-            self.webapp.router.add_route(method, '/{tail:.*}', HuskyHTTP.get_router().handle(self))
+        # Every request goes through our own router, so plugins can add and remove endpoints as they're loaded.
+        self.webapp.router.add_route('*', '/{tail:.*}', HuskyHTTP.get_router().handle)
+        HuskyHTTP.get_router().add_route("GET", "/metrics", "HuskyBot", HuskyMetrics.handle_metrics)
 
         runner = web.AppRunner(self.webapp)
         await runner.setup()
@@ -300,6 +371,60 @@ class HuskyBot(commands.Bot, metaclass=HuskyUtils.Singleton):
         self.session_store.set('initTime', datetime.datetime.now())
         LOG.info("The bot has been initialized. Ready to process commands and events.")
 
+    def dispatch(self, event_name, *args, **kwargs):
+        # Every gateway payload passes through here as a socket_response, so this is the cheapest place to count them.
+        if event_name == 'socket_response':
+            payload = args[0]
+            GATEWAY_EVENTS.labels(payload.get('t') or f"OP_{payload.get('op')}").inc()
+
+        super().dispatch(event_name, *args, **kwargs)
+
+    async def _run_event(self, coro, event_name, *args, **kwargs):
+        start = time.perf_counter()
+
+        try:
+            await super()._run_event(coro, event_name, *args, **kwargs)
+        finally:
+            listener = getattr(coro, '__qualname__', repr(coro))
+            LISTENER_LATENCY.labels(event_name, listener).observe(time.perf_counter() - start)
+
+    def add_cog(self, cog):
+        super().add_cog(cog)
+        HuskyHTTP.get_router().register_plugin(cog)
+
+    def remove_cog(self, name):
+        cog = self.get_cog(name)
+
+        if cog is not None:
+            HuskyHTTP.get_router().unload_plugin(cog)
+
+        super().remove_cog(name)
+
+    async def close(self):
+        self.compute.cleanup()
+        await self.http_client.close()
+        await super().close()
+
+    async def __alert_loop_lag(self, monitor: HuskyLoopMonitor.LoopMonitor):
+        lag = monitor.lag_percentiles()
+
+        embed = discord.Embed(
+            title=Emojis.TIMER + " Event Loop Lag",
+            description="The bot's event loop has been running behind for the last minute. Commands and moderation "
+                        "actions may be slow to respond. See `/debug loop` for details.",
+            color=Colors.WARNING
+        )
+
+        embed.add_field(name="Lag", value=f"p50 {lag[0.5] * 1000:.0f} ms, p95 {lag[0.95] * 1000:.0f} ms, "
+                                          f"p99 {lag[0.99] * 1000:.0f} ms, max {lag['max'] * 1000:.0f} ms")
+
+        if monitor.stalls:
+            # Field values are capped at 1024 characters, so keep the innermost (most relevant) frames.
+            stack = monitor.stalls[-1].stack[-900:]
+            embed.add_field(name="Most Recent Stall", value=f"```{stack}```", inline=False)
+
+        await HuskyUtils.send_to_keyed_channel(self, ChannelKeys.STAFF_LOG, embed)
+
     async def on_ready(self):
         # Attempt to initialize the bot
         await self.init_stage1()
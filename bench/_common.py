@@ -0,0 +1,22 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Run them from the repository root (`python bench/<script>.py`). Results are printed and appended to bench_output.txt
+at the repository root, which is ignored by git.
+"""
+
+import datetime
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def report(benchmark: str, line: str):
+    print(line)
+
+    with open(os.path.join(ROOT, "bench_output.txt"), "a") as f:
+        f.write(f"{datetime.datetime.utcnow().isoformat()} [{benchmark}] {line}\n")
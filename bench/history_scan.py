@@ -0,0 +1,141 @@
+"""
+Benchmark of HistoryScan (the parallel history scanner behind /msgcount, /activeusercount and the statistics backfill)
+against reading channels one after another.
+
+Uses discord.py's real HistoryIterator, on top of a local stub of the channel messages endpoint that answers every
+page of 100 messages after a fixed delay, standing in for Discord's latency.
+"""
+
+import asyncio
+import datetime
+import sys
+import time
+
+from _common import report
+
+import discord
+from discord import iterators
+
+from libhusky.HuskyHistory import HistoryScan
+
+PAGE_LATENCY = 0.05
+
+BASE_SNOWFLAKE = discord.utils.time_snowflake(datetime.datetime.utcnow() - datetime.timedelta(days=1))
+
+if sys.version_info >= (3, 10):
+    # discord.py 1.x passes loop= to asyncio.Queue, which newer Pythons no longer accept.
+    class _Queue(asyncio.Queue):
+        def __init__(self, *args, loop=None, **kwargs):
+            super().__init__(*args, **kwargs)
+
+    class _AsyncioShim:
+        def __getattr__(self, name):
+            return _Queue if name == "Queue" else getattr(asyncio, name)
+
+    iterators.asyncio = _AsyncioShim()
+
+
+class StubHTTP:
+    def __init__(self, messages: dict):
+        self.messages = messages
+
+    async def logs_from(self, channel_id, limit, before=None, after=None, around=None):
+        await asyncio.sleep(PAGE_LATENCY)
+
+        messages = self.messages[channel_id]
+
+        if after is not None:
+            return list(reversed([m for m in messages if int(m['id']) > after][:limit]))
+
+        return messages[-limit:][::-1]
+
+
+class StubMessage:
+    __slots__ = ('id', 'author_id')
+
+    def __init__(self, data: dict):
+        self.id = int(data['id'])
+        self.author_id = data['author']
+
+
+class StubState:
+    def __init__(self, http: StubHTTP):
+        self.http = http
+        self.loop = asyncio.get_event_loop()
+
+    def create_message(self, channel, data):
+        return StubMessage(data)
+
+
+class StubPermissions:
+    read_message_history = True
+
+
+class StubGuild:
+    me = None
+
+
+class StubChannel:
+    def __init__(self, state: StubState, channel_id: int):
+        self._state = state
+        self.id = channel_id
+        self.guild = StubGuild()
+
+    async def _get_channel(self):
+        return self
+
+    def permissions_for(self, member):
+        return StubPermissions()
+
+    def history(self, **kwargs):
+        return iterators.HistoryIterator(self, **kwargs)
+
+    def __str__(self):
+        return f"channel-{self.id}"
+
+
+def build_channels(channel_count: int, per_channel: int) -> list:
+    messages = {c: [{'id': str(BASE_SNOWFLAKE + (i << 22) + c), 'author': i % 37} for i in range(per_channel)]
+                for c in range(channel_count)}
+
+    state = StubState(StubHTTP(messages))
+
+    return [StubChannel(state, c) for c in range(channel_count)]
+
+
+async def sequential(channels: list, after) -> int:
+    count = 0
+
+    for channel in channels:
+        async for _ in channel.history(limit=None, after=after):
+            count += 1
+
+    return count
+
+
+async def run():
+    after = discord.Object(id=BASE_SNOWFLAKE - 1)
+
+    for (channel_count, per_channel) in [(8, 1000), (24, 500)]:
+        channels = build_channels(channel_count, per_channel)
+
+        start = time.perf_counter()
+        expected = await sequential(channels, after)
+        sequential_time = time.perf_counter() - start
+
+        results = []
+
+        for concurrency in (4, 8):
+            start = time.perf_counter()
+            count = await HistoryScan(channels, lambda total, _: total + 1, 0, concurrency=concurrency,
+                                      after=after).run()
+            results.append(f"parallel c={concurrency} {time.perf_counter() - start:.2f}s")
+
+            assert count == expected == channel_count * per_channel
+
+        report("history_scan", f"{channel_count} channels x {per_channel} msgs: sequential {sequential_time:.2f}s, "
+                               + ", ".join(results))
+
+
+if __name__ == '__main__':
+    asyncio.get_event_loop().run_until_complete(run())
@@ -0,0 +1,123 @@
+"""
+Benchmark of log-heavy message handling, with handlers attached directly (as before the log pipeline) against the
+queue-based LogPipeline.
+
+Every simulated message does a little CPU work (standing in for the rest of its processing) and logs three INFO lines,
+as AntiSpam does when handing out strikes. Logs go to a 5 MB rotating, compressing file (as HuskyBot configures it) and
+to a stream on /dev/null. Reports message throughput and the time spent handling each message, including any stall
+from a log rollover.
+"""
+
+import asyncio
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from _common import report
+
+from libhusky import HuskyLogging, HuskyUtils
+
+MESSAGES = 20000
+FORMAT = "%(asctime)s [%(levelname)s] %(name)s: %(message)s"
+
+
+class SynchronousArchiveHandler(HuskyUtils.CompressingRotatingFileHandler):
+    """
+    The rotating handler as it was before, compressing the old log on the logging thread during the rollover.
+    """
+
+    def doRollover(self):
+        super().doRollover()
+        self.wait_for_archive()
+
+
+def build_handlers(mode: str, log_dir: str) -> list:
+    handler_class = SynchronousArchiveHandler if mode == "direct" else HuskyUtils.CompressingRotatingFileHandler
+
+    file_handler = handler_class(os.path.join(log_dir, "huskybot.log"), maxBytes=(1024 ** 2) * 5, backupCount=5,
+                                 encoding='utf-8')
+    file_handler.setFormatter(logging.Formatter(FORMAT))
+
+    stream_handler = logging.StreamHandler(open(os.devnull, 'w'))
+    stream_handler.setFormatter(logging.Formatter(FORMAT, datefmt="%Y-%m-%d %H:%M:%S"))
+
+    return [file_handler, stream_handler]
+
+
+def work(n: int) -> int:
+    total = 0
+
+    for i in range(n):
+        total += i * i
+
+    return total
+
+
+async def handle_message(log: logging.Logger, i: int):
+    work(1500)
+
+    for module in ("AttachmentFilter", "NonUniqueFilter", "LinkFilter"):
+        log.info(f"{module}: message {i} from SomeUser#{i % 9999:04d} in #general checked, strike added. "
+                 f"Similarity = 0.{i % 1000:03d}")
+
+    await asyncio.sleep(0)
+
+
+async def handle_messages(log: logging.Logger) -> list:
+    durations = []
+
+    for i in range(MESSAGES):
+        start = time.perf_counter()
+        await handle_message(log, i)
+        durations.append(time.perf_counter() - start)
+
+    return durations
+
+
+def run(mode: str):
+    log_dir = tempfile.mkdtemp(prefix="husky-bench-")
+    handlers = build_handlers(mode, log_dir)
+
+    root = logging.getLogger()
+    root.handlers = []
+    pipeline = None
+
+    if mode == "direct":
+        for handler in handlers:
+            root.addHandler(handler)
+    else:
+        pipeline = HuskyLogging.LogPipeline(*handlers)
+        pipeline.start()
+        root.addHandler(pipeline.handler)
+
+    log = logging.getLogger("HuskyBot.AntiSpam")
+    log.setLevel(logging.INFO)
+
+    start = time.perf_counter()
+    durations = asyncio.get_event_loop().run_until_complete(handle_messages(log))
+    elapsed = time.perf_counter() - start
+
+    if pipeline is not None:
+        pipeline.stop()
+
+    for handler in handlers:
+        handler.close()
+
+    root.handlers = []
+    shutil.rmtree(log_dir)
+
+    durations.sort()
+    dropped = sum(child.value for child in HuskyLogging.DROPPED_RECORDS._children.values())
+
+    report("logging_pipeline", f"{mode}: {MESSAGES / elapsed:,.0f} messages/s, per message p50 "
+                               f"{durations[len(durations) // 2] * 1e6:.0f}us p99 "
+                               f"{durations[int(len(durations) * 0.99)] * 1e6:.0f}us max "
+                               f"{durations[-1] * 1e3:.1f}ms, {dropped:g} records dropped so far")
+
+
+if __name__ == '__main__':
+    for mode in sys.argv[1:] or ["direct", "pipeline"]:
+        run(mode)
@@ -0,0 +1,66 @@
+"""
+CPU-bound jobs that may be run off the event loop, in a worker process (see ComputeManager).
+
+Everything here must be a pure, module-level function of picklable arguments, so it can be sent to a worker. This module
+is imported by every worker, so it should stay light - standard library only.
+
+Each job has a matching cost estimate, in milliseconds of CPU, used to decide whether the job is worth sending to a
+worker at all. The estimates come from timing the jobs on typical chat messages, and are deliberately on the high side.
+"""
+
+import re
+from difflib import SequenceMatcher
+
+# Roughly 30 ns per character scanned, per pattern.
+REGEX_MS_PER_CHAR = 0.00003
+
+# Roughly 1 us per character compared (this varies a lot with content, so errs high).
+SEQUENCE_MS_PER_CHAR = 0.001
+
+
+def search_patterns(patterns: list, text: str, flags: int = re.IGNORECASE, first_only: bool = False) -> list:
+    """
+    Search some text for each of a list of regular expressions.
+
+    :param patterns: The patterns to search for.
+    :param text: The text to search.
+    :param flags: The regex flags to search with.
+    :param first_only: Stop at the first pattern that matches.
+    :return: The indices (into `patterns`) of every pattern that matched, in order.
+    """
+    matched = []
+
+    for (index, pattern) in enumerate(patterns):
+        if re.search(pattern, text, flags) is not None:
+            matched.append(index)
+
+            if first_only:
+                break
+
+    return matched
+
+
+def estimate_search_patterns(patterns: list, text: str) -> float:
+    return len(patterns) * len(text) * REGEX_MS_PER_CHAR
+
+
+def best_sequence_match(candidates: list, text: str, threshold: float):
+    """
+    Find the first candidate string that's at least `threshold` similar to some text, as by SequenceMatcher.ratio().
+
+    :param candidates: The strings to compare against.
+    :param text: The string to compare.
+    :param threshold: The minimum similarity ratio (0 to 1) to count as a match.
+    :return: A tuple of (index of the matching candidate, similarity), or (None, None) if nothing matched.
+    """
+    for (index, candidate) in enumerate(candidates):
+        ratio = SequenceMatcher(None, candidate, text).ratio()
+
+        if ratio >= threshold:
+            return index, ratio
+
+    return None, None
+
+
+def estimate_best_sequence_match(candidates: list, text: str, threshold: float = None) -> float:
+    return sum(len(candidate) + len(text) for candidate in candidates) * SEQUENCE_MS_PER_CHAR
@@ -1,10 +1,17 @@
 import json
 import os
+import time
 from threading import Lock
 
+from libhusky import HuskyMetrics
+
+SAVE_TIME = HuskyMetrics.get_registry().histogram(
+    "husky_config_save_seconds", "Time taken to save each config file to disk.", ("config",)
+)
+
 
 def override_dumper(obj):
-    if hasattr(obj, "toJSON"):
+    if hasattr(obj, "to_json"):
         return obj.to_json()
     else:
         return obj.__dict__
@@ -80,9 +87,13 @@ class WolfConfig:
         if self._path is None:
             return
 
+        start = time.perf_counter()
+
         with open(self._path, 'w') as config_file:
             json.dump(self._config, config_file, sort_keys=True, default=override_dumper)
 
+        SAVE_TIME.labels(os.path.basename(self._path)).observe(time.perf_counter() - start)
+
 
 __cache__ = {}
 
@@ -4,6 +4,8 @@ import discord
 
 
 class Mute:
+    __slots__ = ('user_id', 'reason', 'guild', 'channel', 'expiry', 'perms_cache')
+
     def __getitem__(self, item):
         return getattr(self, item)
 
@@ -20,25 +22,31 @@ class Mute:
         return (self.expiry is None) or (self.expiry > other.expiry)
 
     def __init__(self, data: dict = None):
-        if data is not None:
-            self.load_dict(data)
+        self.user_id = 0
+        self.reason = ""
 
-    user_id = 0
-    reason = ""
+        # Guild ID. Mandatory.
+        self.guild = 0
 
-    # Guild ID. Mandatory.
-    guild = 0
+        # None for guildwide, ID for a channel
+        self.channel = None
 
-    # None for guildwide, ID for a channel
-    channel = None
+        # Expiry of None is permanent.
+        self.expiry = None
 
-    # Expiry of None is permanent.
-    expiry = None
+        # Permissions cache (None is either guild mute *or* "no manual permissions")
+        # tens digit = react (0 = not set, 1 = no, 2 = yes) [ perms_cache / 10 ]
+        # ones digit = send  (0 = not set, 1 = no, 2 = yes) [ perms_cache % 10 ]
+        self.perms_cache = None
+
+        if data is not None:
+            self.load_dict(data)
 
-    # Permissions cache (None is either guild mute *or* "no manual permissions")
-    # tens digit = react (0 = not set, 1 = no, 2 = yes) [ perms_cache / 10 ]
-    # ones digit = send  (0 = not set, 1 = no, 2 = yes) [ perms_cache % 10 ]
-    perms_cache = None
+    def key(self) -> tuple:
+        """
+        Get the identity of this mute. A user may only have one mute per channel (or one guild mute) at a time.
+        """
+        return self.guild, self.user_id, self.channel
 
     def load_dict(self, data: dict):
         self.user_id = data.get('user_id')
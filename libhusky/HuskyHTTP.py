@@ -1,18 +1,100 @@
 import logging
 
 from aiohttp import web
-from discord.ext import commands
 
 LOG = logging.getLogger("HuskyBot.HttpServer")
 
+# Path parameter types, in the order they're tried when more than one could match a segment. Static segments always
+# win over parameters, and "path" parameters (which swallow the rest of the path) are only tried last.
+PARAM_TYPES = {
+    "int": int,
+    "float": float,
+    "str": str
+}
+
+
+class Route:
+    """
+    A single method on a single path, bound to whatever handles it.
+    """
+    __slots__ = ('method', 'path', 'plugin', 'handler')
+
+    def __init__(self, method: str, path: str, plugin: str, handler):
+        self.method = method
+        self.path = path
+        self.plugin = plugin
+        self.handler = handler
+
+
+class RouteNode:
+    """
+    One segment of the routing trie.
+    """
+    __slots__ = ('static', 'params', 'tail', 'routes')
+
+    def __init__(self):
+        # { segment: RouteNode }
+        self.static = {}
+
+        # [(type_name, converter, param_name, RouteNode)], ordered by PARAM_TYPES.
+        self.params = []
+
+        # (param_name, RouteNode) for a "path" parameter, if any.
+        self.tail = None
+
+        # { method: Route }, for paths ending at this node.
+        self.routes = {}
+
+    def child(self, segment: str):
+        if not (segment.startswith("{") and segment.endswith("}")):
+            return self.static.setdefault(segment, RouteNode())
+
+        (name, _, type_name) = segment[1:-1].partition(":")
+        type_name = type_name or "str"
+
+        if type_name == "path":
+            if self.tail is None:
+                self.tail = (name, RouteNode())
+            elif self.tail[0] != name:
+                raise ValueError(f"Conflicting path parameters {{{self.tail[0]}:path}} and {segment}.")
+
+            return self.tail[1]
+
+        if type_name not in PARAM_TYPES:
+            raise ValueError(f"Unknown path parameter type {type_name} in {segment}.")
+
+        for (p_type, _, p_name, node) in self.params:
+            if p_type == type_name and p_name == name:
+                return node
+
+        node = RouteNode()
+        self.params.append((type_name, PARAM_TYPES[type_name], name, node))
+        self.params.sort(key=lambda p: list(PARAM_TYPES).index(p[0]))
+
+        return node
+
 
 class WolfRouter:
     """
-    A simple dynamic router that allows methods to be added/removed freely.
+    A dynamic router that allows routes to be added/removed freely.
+
+    Routes may contain typed path parameters (`/users/{user_id:int}`, `/files/{name:path}`), which are passed to the
+    handler as keyword arguments. Parameters are `str` unless given a type of `int`, `float`, `str` or `path` (which
+    matches the rest of the path, slashes included).
+
+    Routes are compiled into a trie of path segments, which is rebuilt whenever routes change. Dispatching a request is
+    a walk down the trie, one segment at a time - it doesn't get slower as more routes are added. Routes without any
+    parameters are also kept in a flat lookup table, so the common case skips the walk entirely.
     """
     def __init__(self):
+        # { path: { method: Route } }
         self.routes = {}
 
+        self._root = RouteNode()
+
+        # { (method, path): Route } for paths without parameters - a single lookup for the common case.
+        self._static = {}
+
     def add_route(self, method: str, path: str, plugin: str, handler):
         """
         Add a new route to the internal routing table.
@@ -20,16 +102,13 @@ class WolfRouter:
         :param method: The method that this route should target.
         :param path: The path that this route should handle.
         :param plugin: The plugin name this works on
-        :param handler: The function/def that will handle this route.
+        :param handler: The coroutine function that will handle this route, called with the request and any path
+                        parameters as keyword arguments.
         """
-        path_route = self.routes.setdefault(path, {})
-        path_route[method.upper()] = {}
+        route = Route(method.upper(), path, plugin, handler)
 
-        path_route[method.upper()]['func'] = handler
-
-        # This is discordpy related bullshit, because we need to be able to
-        # pass a self()
-        path_route[method.upper()]['plugin'] = plugin
+        self.routes.setdefault(path, {})[route.method] = route
+        self._insert(route)
 
     def remove_method(self, path: str, method: str):
         """
@@ -45,6 +124,11 @@ class WolfRouter:
 
         del path_route[method.upper()]
 
+        if len(path_route) == 0:
+            del self.routes[path]
+
+        self._compile()
+
     def remove_path(self, path: str):
         """
         Remove a specific path from our routing table.
@@ -52,6 +136,7 @@ class WolfRouter:
         :param path: The path (and methods) to remove.
         """
         del self.routes[path]
+        self._compile()
 
     def remove_paths(self, path: str):
         """
@@ -64,6 +149,23 @@ class WolfRouter:
             if p.startswith(path):
                 del self.routes[p]
 
+        self._compile()
+
+    def register_plugin(self, instance):
+        """
+        Route every method of a plugin marked with `register`, bound to that plugin instance.
+
+        :param instance: The plugin (cog) instance being loaded.
+        """
+        plugin_name = instance.__class__.__name__
+
+        for attr_name in dir(instance.__class__):
+            func = getattr(instance.__class__, attr_name, None)
+
+            for (method, path) in getattr(func, '__http_routes__', []):
+                self.add_route(method, path, plugin_name, getattr(instance, attr_name))
+                LOG.debug(f'Registered HTTP endpoint "{method} {path}" for plugin {plugin_name}')
+
     def unload_plugin(self, instance):
         plugin_name = instance.__class__.__name__
 
@@ -71,28 +173,103 @@ class WolfRouter:
             path_o = self.routes[path]
 
             for method in list(path_o.keys()):
-                method_o = path_o[method]
-
-                if method_o['plugin'] == plugin_name:
-                    del self.routes[path][method]
+                if path_o[method].plugin == plugin_name:
+                    del path_o[method]
 
             if len(path_o.keys()) == 0:
                 del self.routes[path]
 
-    def handle(self, bot: commands.Bot):
-        async def wrapped(request: web.BaseRequest):
-            if request.path not in self.routes:
-                raise web.HTTPNotFound()
+        self._compile()
+
+    def resolve(self, method: str, path: str):
+        """
+        Find the route for a request.
+
+        :param method: The request method.
+        :param path: The request path.
+        :return: A tuple of (route, path parameters). Route is None if nothing matches the path.
+        :raises web.HTTPMethodNotAllowed: If the path matches, but not for this method.
+        """
+        route = self._static.get((method, path))
+
+        if route is not None:
+            return route, {}
+
+        match = self._match(self._root, path.split("/")[1:], 0, {})
+
+        if match is None:
+            return None, None
+
+        (node, params) = match
+        route = node.routes.get(method)
+
+        if route is None:
+            raise web.HTTPMethodNotAllowed(method=method, allowed_methods=node.routes.keys())
+
+        return route, params
+
+    async def handle(self, request: web.BaseRequest):
+        # Inlined fast path for parameterless routes, which is most of them.
+        route = self._static.get((request.method, request.path))
 
-            path_routes = self.routes[request.path]
+        if route is not None:
+            return await route.handler(request=request)
 
-            if request.method not in path_routes:
-                raise web.HTTPMethodNotAllowed(method=request.method, allowed_methods=path_routes.keys())
+        (route, params) = self.resolve(request.method, request.path)
 
-            method = path_routes[request.method]
-            result = await method['func'](bot.get_cog(name=method['plugin']), request=request)
-            return result
-        return wrapped
+        if route is None:
+            raise web.HTTPNotFound()
+
+        return await route.handler(request=request, **params)
+
+    def _insert(self, route: Route):
+        node = self._root
+
+        for segment in route.path.split("/")[1:]:
+            node = node.child(segment)
+
+        node.routes[route.method] = route
+
+        if "{" not in route.path:
+            self._static[(route.method, route.path)] = route
+
+    def _compile(self):
+        self._root = RouteNode()
+        self._static = {}
+
+        for methods in self.routes.values():
+            for route in methods.values():
+                self._insert(route)
+
+    def _match(self, node: RouteNode, segments: list, index: int, params: dict):
+        if index == len(segments):
+            return (node, params) if node.routes else None
+
+        segment = segments[index]
+
+        static_node = node.static.get(segment)
+        if static_node is not None:
+            match = self._match(static_node, segments, index + 1, params)
+
+            if match is not None:
+                return match
+
+        if segment:
+            for (_, converter, name, param_node) in node.params:
+                try:
+                    value = converter(segment)
+                except ValueError:
+                    continue
+
+                match = self._match(param_node, segments, index + 1, {**params, name: value})
+
+                if match is not None:
+                    return match
+
+        if node.tail is not None and node.tail[1].routes:
+            return node.tail[1], {**params, node.tail[0]: "/".join(segments[index:])}
+
+        return None
 
 
 router = WolfRouter()
@@ -105,13 +282,15 @@ def get_router():
 def register(path: str, methods: list):
     def decorator(f):
         """
-        This is a ***dangerously ugly*** way of registering things with an otherwise pretty HTTP router.
+        Mark a plugin method as an HTTP endpoint.
 
-        We need to be able to access plugin instance selfs, and decorators can't get those. Boo.
+        Decorators can't see plugin instances, so this only records the route on the function. The route is added
+        (bound to the plugin instance) when the plugin is loaded, and removed when it's unloaded.
         """
-        for method in methods:
-            plugin = f.__qualname__.split('.')[-2]
-            router.add_route(method, path, plugin, f)
-            LOG.debug(f'Registered HTTP endpoint "{method} {path}" for plugin {plugin}')
+        routes = getattr(f, '__http_routes__', [])
+        routes.extend((method.upper(), path) for method in methods)
+        f.__http_routes__ = routes
+
+        return f
 
     return decorator
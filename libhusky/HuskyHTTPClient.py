@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+from yarl import URL
+
+from libhusky import HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.HttpClient")
+
+# Methods that are safe to send twice, and so may be retried.
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+# Response statuses worth retrying, as the next attempt has a reasonable chance of succeeding.
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+
+# Outbound requests take far longer than anything on the loop, so they get their own buckets.
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Some plugins fetch arbitrary user-supplied URLs, so only this many hosts get their own metric labels.
+MAX_TRACKED_HOSTS = 50
+
+REQUEST_LATENCY = HuskyMetrics.get_registry().histogram(
+    "husky_http_client_request_seconds", "Time taken for outbound HTTP requests to return a response, by host.",
+    ("host",), LATENCY_BUCKETS
+)
+REQUEST_ERRORS = HuskyMetrics.get_registry().counter(
+    "husky_http_client_errors_total", "Outbound HTTP requests that failed or returned a retryable status, by host.",
+    ("host", "kind")
+)
+REQUEST_RETRIES = HuskyMetrics.get_registry().counter(
+    "husky_http_client_retries_total", "Outbound HTTP requests that were retried, by host.", ("host",)
+)
+
+
+class _RequestContextManager:
+    """
+    Lets `HTTPClient.request` be used either with `await` (returning the response) or with `async with` (releasing the
+    response afterwards), just like `aiohttp.ClientSession.request`.
+    """
+    __slots__ = ('_coro', '_response')
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._response = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        self._response = await self._coro
+        return self._response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self._response.release()
+
+
+class HTTPClient:
+    """
+    The bot-wide HTTP client, shared by everything that talks to the outside world.
+
+    All requests go through a single `aiohttp.ClientSession`, so they share one connection pool (and its keep-alive
+    connections), one DNS cache, and one set of limits on concurrent connections - both overall and per host. Requests
+    get a default timeout unless they ask for their own.
+
+    Idempotent requests that fail with a connection error, a timeout, or a retryable status are retried with jittered
+    exponential backoff. Non-idempotent requests (POST, PATCH) are never retried, as there's no telling whether the
+    first attempt was acted on.
+
+    The session is created on first use, so that it's always created on the running loop.
+    """
+
+    def __init__(self, connection_limit: int = 100, per_host_limit: int = 10, timeout: float = 30,
+                 dns_cache_ttl: int = 300, retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 10):
+        """
+        :param connection_limit: The maximum number of open connections, across all hosts.
+        :param per_host_limit: The maximum number of open connections to any one host.
+        :param timeout: The default total timeout for a request, in seconds.
+        :param dns_cache_ttl: How long resolved addresses are cached for, in seconds.
+        :param retries: The default number of times to retry a failed idempotent request.
+        :param backoff_base: The backoff before the first retry, in seconds. Doubles for every retry after.
+        :param backoff_max: The longest backoff between any two attempts, in seconds.
+        """
+        self._connection_limit = connection_limit
+        self._per_host_limit = per_host_limit
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._dns_cache_ttl = dns_cache_ttl
+
+        self._retries = retries
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+        self._session = None  # type: aiohttp.ClientSession
+        self._hosts = set()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared session, creating it if needed. Prefer `request` (which adds retries and metrics) over using
+        this directly.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self._connection_limit,
+                limit_per_host=self._per_host_limit,
+                use_dns_cache=True,
+                ttl_dns_cache=self._dns_cache_ttl
+            )
+
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+
+        return self._session
+
+    def request(self, method: str, url: str, *, retries: int = None, **kwargs) -> _RequestContextManager:
+        """
+        Make an HTTP request through the shared session.
+
+        Use as `async with client.request(...) as response`, or `response = await client.request(...)` (in which case
+        the caller must release the response).
+
+        :param method: The HTTP method to use.
+        :param url: The URL to request.
+        :param retries: How many times to retry the request if it fails. Defaults to the client's default for
+                        idempotent methods, and 0 for anything else.
+        :param kwargs: Any other arguments for `aiohttp.ClientSession.request`.
+        :return: The response to the last attempt made.
+        """
+        method = method.upper()
+
+        if retries is None:
+            retries = self._retries if method in IDEMPOTENT_METHODS else 0
+
+        return _RequestContextManager(self._request(method, url, retries, kwargs))
+
+    def get(self, url: str, **kwargs) -> _RequestContextManager:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> _RequestContextManager:
+        return self.request("POST", url, **kwargs)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def _request(self, method: str, url: str, retries: int, kwargs: dict) -> aiohttp.ClientResponse:
+        host = self._host_label(url)
+        attempt = 0
+
+        while True:
+            start = time.perf_counter()
+
+            try:
+                response = await self.session.request(method, url, **kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as ex:
+                kind = "timeout" if isinstance(ex, asyncio.TimeoutError) else "connection"
+                REQUEST_ERRORS.labels(host, kind).inc()
+
+                if attempt >= retries:
+                    raise
+
+                LOG.debug(f"{method} {url} failed ({type(ex).__name__}), retrying.")
+                delay = self._backoff(attempt)
+            else:
+                REQUEST_LATENCY.labels(host).observe(time.perf_counter() - start)
+
+                if response.status not in RETRY_STATUSES:
+                    return response
+
+                REQUEST_ERRORS.labels(host, str(response.status)).inc()
+
+                if attempt >= retries:
+                    return response
+
+                LOG.debug(f"{method} {url} returned HTTP {response.status}, retrying.")
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                response.release()
+
+            REQUEST_RETRIES.labels(host).inc()
+            attempt += 1
+
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        # Honour the server's Retry-After (in seconds) if it's reasonable. The HTTP date form isn't worth parsing.
+        if retry_after is not None and retry_after.isdigit() and int(retry_after) <= self._backoff_max:
+            return int(retry_after)
+
+        # "Full jitter" - spreads out retries from many callers that failed at the same time.
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * (2 ** attempt)))
+
+    def _host_label(self, url: str) -> str:
+        host = URL(url).host or "unknown"
+
+        if host in self._hosts:
+            return host
+
+        if len(self._hosts) >= MAX_TRACKED_HOSTS:
+            return "other"
+
+        self._hosts.add(host)
+        return host
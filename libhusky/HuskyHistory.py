@@ -0,0 +1,139 @@
+import asyncio
+import logging
+
+import discord
+
+LOG = logging.getLogger("HuskyBot.History")
+
+
+class HistoryScan:
+    """
+    A scan of message history across several channels at once.
+
+    Channels are handed out to a fixed number of workers, so at most `concurrency` history requests are in flight at
+    any time (discord.py's rate limiter keeps each channel's own requests in line). Every message is folded into a
+    single result through a reducer as it arrives - nothing is held beyond the page being read.
+
+    Reducers are called as `reducer(result, message)` and must return the new result. They run on the event loop, so
+    they must not block, but never need to worry about being called concurrently.
+
+    A scan can be cancelled at any point with `cancel()`. It will still return whatever it had reduced so far, with
+    `cancelled` set.
+    """
+
+    def __init__(self, channels: list, reducer, initial=None, concurrency: int = 4, progress_callback=None,
+                 progress_interval: float = 5, **history_kwargs):
+        """
+        Prepare a new history scan. Nothing happens until `run` is awaited.
+
+        :param channels: The TextChannels to scan. Channels the bot can't read history for are skipped.
+        :param reducer: A function taking (result, message), returning the new result.
+        :param initial: The initial result.
+        :param concurrency: The maximum number of channels to scan at the same time.
+        :param progress_callback: An optional coroutine function, called with this scan every `progress_interval`
+                                  seconds while the scan is running.
+        :param progress_interval: The number of seconds between progress callbacks.
+        :param history_kwargs: Arguments (limit, before, after, ...) passed to each channel's `history()` call.
+        """
+        self.channels = channels
+        self.result = initial
+
+        self.scanned = 0
+        self.channels_done = 0
+        self.skipped = []
+        self.failed = []
+        self.cancelled = False
+
+        self._reducer = reducer
+        self._concurrency = max(1, concurrency)
+        self._progress_callback = progress_callback
+        self._progress_interval = progress_interval
+        self._history_kwargs = history_kwargs
+        self._history_kwargs.setdefault('limit', None)
+
+        self._workers = []
+
+    async def run(self):
+        """
+        Run the scan to completion (or cancellation).
+
+        :return: The final reduced result.
+        """
+        queue = asyncio.Queue()
+
+        for channel in self.channels:
+            queue.put_nowait(channel)
+
+        self._workers = [asyncio.ensure_future(self._worker(queue))
+                         for _ in range(min(self._concurrency, len(self.channels)))]
+
+        reporter = None
+        if self._progress_callback is not None:
+            reporter = asyncio.ensure_future(self._report_progress())
+
+        try:
+            if self._workers:
+                await asyncio.wait(self._workers)
+
+            for worker in self._workers:
+                if not worker.cancelled() and worker.exception() is not None:
+                    raise worker.exception()
+        finally:
+            if reporter is not None:
+                reporter.cancel()
+
+            for worker in self._workers:
+                worker.cancel()
+
+        return self.result
+
+    def cancel(self):
+        """
+        Stop the scan. Whatever has been reduced so far is kept, and returned from `run`.
+        """
+        self.cancelled = True
+
+        for worker in self._workers:
+            worker.cancel()
+
+    async def _worker(self, queue: asyncio.Queue):
+        while not self.cancelled:
+            try:
+                channel = queue.get_nowait()  # type: discord.TextChannel
+            except asyncio.QueueEmpty:
+                return
+
+            if not channel.permissions_for(channel.guild.me).read_message_history:
+                LOG.info("I don't have permission to get history for channel %s", channel)
+                self.skipped.append(channel)
+                continue
+
+            try:
+                async for message in channel.history(**self._history_kwargs):
+                    self.result = self._reducer(self.result, message)
+                    self.scanned += 1
+            except discord.HTTPException as e:
+                LOG.warning(f"Failed to scan history for channel {channel}: {e}")
+                self.failed.append(channel)
+
+            self.channels_done += 1
+
+    async def _report_progress(self):
+        while True:
+            await asyncio.sleep(self._progress_interval)
+
+            try:
+                await self._progress_callback(self)
+            except discord.HTTPException as e:
+                LOG.debug(f"Failed to report history scan progress: {e}")
+
+
+async def scan_history(channels: list, reducer, initial=None, **kwargs):
+    """
+    Scan message history across several channels in parallel, folding every message into a single result.
+
+    This is a shorthand for `HistoryScan(...).run()`. See `HistoryScan` for all arguments.
+
+    :return: The final reduced result.
+    """
+    return await HistoryScan(channels, reducer, initial, **kwargs).run()
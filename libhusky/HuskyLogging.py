@@ -0,0 +1,106 @@
+import copy
+import logging
+import queue
+from logging import handlers
+
+from libhusky import HuskyMetrics
+
+DROPPED_RECORDS = HuskyMetrics.get_registry().counter(
+    "husky_log_records_dropped_total", "Log records dropped because the log queue was full, by level.", ("level",)
+)
+
+
+class DroppingQueueHandler(handlers.QueueHandler):
+    """
+    A QueueHandler for a bounded queue, which drops records (rather than blocking the caller) when the queue is full.
+
+    Drops are counted, and a warning saying how many records were lost is logged as soon as there's room again, so gaps
+    in the log are never silent.
+
+    Unlike the stock QueueHandler, records aren't formatted here - only their message is rendered (so later changes to
+    the arguments can't change what's logged). Formatting, exceptions and all, is left to the listener's thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+
+        # Records dropped since the last drop warning.
+        self._dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            if self._dropped:
+                self.queue.put_nowait(self._drop_warning(record))
+                self._dropped = 0
+
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._dropped += 1
+            DROPPED_RECORDS.labels(record.levelname).inc()
+
+    def _drop_warning(self, record: logging.LogRecord) -> logging.LogRecord:
+        return logging.LogRecord(
+            name="HuskyBot.Logging", level=logging.WARNING, pathname=__file__, lineno=0,
+            msg=f"The log queue was full, so {self._dropped} log records were dropped.", args=None, exc_info=None
+        )
+
+
+class BlockingQueueListener(handlers.QueueListener):
+    """
+    A QueueListener that can still be stopped when its (bounded) queue is full, by waiting for room for the sentinel.
+    """
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Moves all log output off the calling thread.
+
+    Loggers only ever put records on a bounded queue, which is drained by a dedicated thread that formats the records
+    and hands them to the real handlers (files, stdout, ...). Logging from the event loop is then just a queue put, no
+    matter how slow the disk or the terminal is, or how long a log rollover takes. If the writer can't keep up, records
+    are dropped (see DroppingQueueHandler) instead of stalling the bot.
+    """
+
+    def __init__(self, *targets: logging.Handler, queue_size: int = 10000):
+        """
+        :param targets: The handlers to send records to. Each one's own level is respected.
+        :param queue_size: The most records that may be waiting to be written at once.
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.targets = targets
+
+        self._listener = BlockingQueueListener(self.queue, *targets, respect_handler_level=True)
+        self._running = False
+
+        HuskyMetrics.get_registry().gauge(
+            "husky_log_queue_depth", "Log records waiting to be written.", callback=self.depth
+        )
+
+    def start(self):
+        if not self._running:
+            self._listener.start()
+            self._running = True
+
+    def stop(self):
+        """
+        Stop the pipeline, after writing out everything already queued.
+        """
+        if self._running:
+            self._listener.stop()
+            self._running = False
+
+    def depth(self) -> int:
+        return self.queue.qsize()
@@ -0,0 +1,199 @@
+import asyncio
+import collections
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from libhusky import HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.LoopMonitor")
+
+
+class LoopStall:
+    """
+    A single period where the event loop was blocked for longer than the monitor's threshold.
+    """
+    __slots__ = ('started', 'duration', 'stack')
+
+    def __init__(self, started: float, stack: str):
+        # Wall-clock time (time.time()) the stall was noticed at.
+        self.started = started
+
+        # How long the loop was blocked for, in seconds. None while the stall is still going.
+        self.duration = None
+
+        # The loop thread's stack, as captured while it was blocked.
+        self.stack = stack
+
+
+class LoopMonitor:
+    """
+    Watches the event loop for anything that blocks it.
+
+    A heartbeat task on the loop sleeps for a short, fixed interval, and records how late it was to wake up (the loop's
+    lag). Meanwhile, a watchdog thread off the loop checks that the heartbeat is still beating. If it hasn't beaten for
+    longer than the threshold, the loop is stuck in a callback right now - so the watchdog grabs the loop thread's stack
+    to show exactly what that callback is doing.
+
+    Recent lag samples and stalls are kept in memory, for percentiles and for `/debug loop`. If lag stays high (the p95
+    over the last `alert_window` seconds is over `alert_lag`), the alert callback is called, at most once per
+    `alert_cooldown` seconds.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop = None, interval: float = 0.1, threshold: float = 0.25,
+                 window: int = 3000, max_stalls: int = 20, alert_callback=None, alert_lag: float = 0.1,
+                 alert_window: float = 60, alert_cooldown: float = 900):
+        """
+        :param loop: The loop to watch. Defaults to the current event loop.
+        :param interval: How often the heartbeat beats, in seconds.
+        :param threshold: How long the loop may go without a heartbeat before a stall is captured, in seconds.
+        :param window: The number of lag samples to keep (3000 at 0.1s is about five minutes).
+        :param max_stalls: The number of captured stalls to keep.
+        :param alert_callback: An optional coroutine function, called with this monitor when lag is sustained.
+        :param alert_lag: The p95 lag (in seconds) that counts as sustained.
+        :param alert_window: The number of seconds of samples used to decide whether lag is sustained.
+        :param alert_cooldown: The minimum number of seconds between alerts.
+        """
+        self._loop = loop or asyncio.get_event_loop()
+        self._interval = interval
+        self._threshold = threshold
+
+        self._alert_callback = alert_callback
+        self._alert_lag = alert_lag
+        self._alert_window = alert_window
+        self._alert_cooldown = alert_cooldown
+        self._last_alert = None
+
+        # (monotonic time, lag in seconds)
+        self._samples = collections.deque(maxlen=window)
+        self.stalls = collections.deque(maxlen=max_stalls)
+
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._open_stall = None  # type: LoopStall
+        self._loop_thread_id = None
+
+        self._heartbeat_task = None  # type: asyncio.Task
+        self._alert_task = None  # type: asyncio.Task
+        self._watchdog = None  # type: threading.Thread
+        self._stopped = threading.Event()
+
+        registry = HuskyMetrics.get_registry()
+        self._lag_gauge = registry.gauge(
+            "husky_event_loop_lag_seconds", "How late the event loop last was to run a timer."
+        )
+        self._lag_histogram = registry.histogram(
+            "husky_event_loop_lag_distribution_seconds", "How late the event loop is to run timers."
+        )
+        self._stall_counter = registry.counter(
+            "husky_event_loop_stalls_total", "Times the event loop was blocked for longer than the stall threshold."
+        )
+
+    def start(self):
+        self._stopped.clear()
+        self._last_beat = time.monotonic()
+
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+
+        if self._alert_callback is not None:
+            self._alert_task = self._loop.create_task(self._check_alerts())
+
+        self._watchdog = threading.Thread(target=self._watch, name="HuskyBot-LoopWatchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stopped.set()
+
+        for task in (self._heartbeat_task, self._alert_task):
+            if task is not None:
+                task.cancel()
+
+        self._heartbeat_task = None
+        self._alert_task = None
+
+    def lag_percentiles(self, percentiles: tuple = (0.5, 0.95, 0.99), since: float = None) -> dict:
+        """
+        Get percentiles of recent loop lag, in seconds.
+
+        :param percentiles: The percentiles to calculate (0 to 1).
+        :param since: Only use samples taken after this time (time.monotonic()). Defaults to every kept sample.
+        :return: A dict of percentile to lag, plus "max". All zero if there are no samples yet.
+        """
+        lags = sorted(lag for (taken, lag) in list(self._samples) if since is None or taken >= since)
+
+        if not lags:
+            return {**{pct: 0.0 for pct in percentiles}, "max": 0.0}
+
+        result = {pct: lags[min(len(lags) - 1, int(round(pct * (len(lags) - 1))))] for pct in percentiles}
+        result["max"] = lags[-1]
+
+        return result
+
+    def sample_count(self) -> int:
+        return len(self._samples)
+
+    async def _heartbeat(self):
+        self._loop_thread_id = threading.get_ident()
+
+        while True:
+            start = self._loop.time()
+            await asyncio.sleep(self._interval)
+
+            lag = max(0.0, self._loop.time() - start - self._interval)
+            now = time.monotonic()
+
+            with self._lock:
+                self._last_beat = now
+
+                if self._open_stall is not None:
+                    self._open_stall.duration = lag
+                    LOG.warning(f"The event loop was blocked for {self._open_stall.duration * 1000:.0f} ms.")
+                    self._open_stall = None
+
+            self._samples.append((now, lag))
+            self._lag_gauge.set(lag)
+            self._lag_histogram.observe(lag)
+
+    async def _check_alerts(self):
+        while True:
+            await asyncio.sleep(self._alert_window)
+
+            now = time.monotonic()
+            p95 = self.lag_percentiles((0.95,), since=now - self._alert_window)[0.95]
+
+            if p95 < self._alert_lag:
+                continue
+
+            if self._last_alert is not None and now - self._last_alert < self._alert_cooldown:
+                continue
+
+            self._last_alert = now
+            LOG.warning(f"Event loop lag has been high for the last {self._alert_window} seconds "
+                        f"(p95 {p95 * 1000:.0f} ms).")
+
+            try:
+                await self._alert_callback(self)
+            except Exception:
+                LOG.exception("Failed to send a loop lag alert.")
+
+    def _watch(self):
+        # Check often enough to catch the blocking callback while it's still running.
+        check_interval = min(self._interval, self._threshold / 2)
+
+        while not self._stopped.wait(check_interval):
+            with self._lock:
+                if self._open_stall is not None or self._loop_thread_id is None:
+                    continue
+
+                if time.monotonic() - self._last_beat < self._threshold + self._interval:
+                    continue
+
+                frame = sys._current_frames().get(self._loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame is not None else "(stack unavailable)"
+
+                self._open_stall = LoopStall(time.time(), stack)
+                self.stalls.append(self._open_stall)
+
+            self._stall_counter.inc()
@@ -0,0 +1,527 @@
+import asyncio
+import collections
+import hashlib
+import logging
+import struct
+import time
+
+import aiohttp
+from yarl import URL
+
+from libhusky.HuskyResponseCache import CACHE_REQUESTS
+
+LOG = logging.getLogger("HuskyBot.Media")
+
+# How much of a GIF is read at a time.
+CHUNK_SIZE = 64 * 1024
+
+# How much of the start of a file goes into its fingerprint.
+FINGERPRINT_BYTES = 64 * 1024
+
+# Discord attachment URLs point at one upload forever, so what's behind them can't change.
+IMMUTABLE_HOSTS = frozenset(("cdn.discordapp.com", "media.discordapp.net"))
+
+
+class GifInspection:
+    """
+    What a `GifInspector` found out about a GIF.
+    """
+    __slots__ = ('width', 'height', 'frames', 'bytes_read', 'complete', 'bomb_reason')
+
+    def __init__(self):
+        # The logical screen size - the size the GIF claims to be.
+        self.width = None
+        self.height = None
+
+        self.frames = 0
+        self.bytes_read = 0
+
+        # True if the whole GIF (up to its trailer) was read.
+        self.complete = False
+
+        # Why the GIF is a bomb, or None if it doesn't look like one (yet).
+        self.bomb_reason = None
+
+    @property
+    def is_bomb(self) -> bool:
+        return self.bomb_reason is not None
+
+
+class GifInspector:
+    """
+    An incremental GIF parser, looking for GIFs built to crash Discord clients.
+
+    Bytes are fed in as they arrive, and the parser walks the GIF's block structure: the header, the logical screen
+    descriptor, and then each extension and image descriptor in turn. Image data is skipped over without being
+    decoded, as everything the checks need is in the descriptors. Nothing is buffered beyond the block currently being
+    parsed, so memory use doesn't grow with the size of the GIF.
+
+    Two kinds of GIF are considered bombs:
+
+    - A huge logical screen (over `max_screen` pixels in both directions) in a small file (under `min_bomb_size`
+      bytes), which takes a lot of memory to display but very little to send.
+    - A frame that extends far past the logical screen (over twice its width or height).
+
+    Callers should stop feeding the inspector as soon as `done` is True.
+    """
+
+    def __init__(self, max_screen: int = 5000, min_bomb_size: int = 1000000):
+        self.max_screen = max_screen
+        self.min_bomb_size = min_bomb_size
+
+        self.result = GifInspection()
+
+        self._buffer = bytearray()
+        self._state = self._parse_header
+        self._skip = 0
+        self._expected_size = None
+        self._error = None
+
+    @property
+    def done(self) -> bool:
+        return self.result.is_bomb or self.result.complete or self._error is not None
+
+    @property
+    def error(self):
+        return self._error
+
+    def set_expected_size(self, size: int):
+        """
+        Tell the inspector how big the GIF is (from its Content-Length), so small-file bombs are found from the header
+        alone instead of after reading the whole file.
+        """
+        self._expected_size = size
+        self._check_screen()
+
+    def feed(self, data: bytes):
+        """
+        Parse the next chunk of the GIF.
+        """
+        if self.done:
+            return
+
+        self.result.bytes_read += len(data)
+        self._buffer.extend(data)
+
+        position = 0
+
+        while not self.done:
+            if self._skip:
+                skipped = min(self._skip, len(self._buffer) - position)
+                self._skip -= skipped
+                position += skipped
+
+                if self._skip:
+                    break
+
+            consumed = self._state(self._buffer, position)
+
+            if consumed is None:
+                break
+
+            position = consumed
+
+        del self._buffer[:position]
+
+    def finish(self) -> GifInspection:
+        """
+        Signal that there's nothing more to feed in, and get the result.
+        """
+        if not self.done:
+            # The GIF ended without a trailer, but its size is known now.
+            self._check_screen_at_end()
+
+        return self.result
+
+    def _fail(self, reason: str):
+        self._error = reason
+
+        # Parsing stops here, so this is the last chance to catch a small-file bomb (anything can follow a huge header).
+        # If the file's size isn't known, what's been read of it so far has to stand in.
+        if self._expected_size is None:
+            self._check_screen_at_end()
+
+        return None
+
+    def _check_screen(self):
+        if self.result.width is None or self._expected_size is None:
+            return
+
+        if self.result.width > self.max_screen and self.result.height > self.max_screen \
+                and self._expected_size < self.min_bomb_size:
+            self.result.bomb_reason = f"{self.result.width}x{self.result.height} GIF in only {self._expected_size} " \
+                                      f"bytes"
+
+    def _check_screen_at_end(self):
+        self._expected_size = self.result.bytes_read
+        self._check_screen()
+
+    # Each state takes the buffer and a position in it, and returns the position after what it consumed (having set
+    # the next state), or None if it needs more data first.
+
+    def _parse_header(self, buffer: bytearray, position: int):
+        if len(buffer) - position < 13:
+            return None
+
+        if buffer[position:position + 6] not in (b"GIF87a", b"GIF89a"):
+            return self._fail("not a GIF")
+
+        (width, height, flags) = struct.unpack_from("<HHB", buffer, position + 6)
+        self.result.width = width
+        self.result.height = height
+        self._check_screen()
+
+        if flags & 0x80:
+            self._skip = 3 << ((flags & 0x07) + 1)
+
+        self._state = self._parse_block
+        return position + 13
+
+    def _parse_block(self, buffer: bytearray, position: int):
+        if len(buffer) - position < 1:
+            return None
+
+        introducer = buffer[position]
+
+        if introducer == 0x2C:
+            self._state = self._parse_image_descriptor
+            return position + 1
+
+        if introducer == 0x21:
+            # Extension label, then data sub-blocks. None of the extensions matter here.
+            if len(buffer) - position < 2:
+                return None
+
+            self._state = self._parse_sub_block
+            return position + 2
+
+        if introducer == 0x3B:
+            self.result.complete = True
+            self._check_screen_at_end()
+            return position + 1
+
+        return self._fail(f"unexpected block 0x{introducer:02x}")
+
+    def _parse_image_descriptor(self, buffer: bytearray, position: int):
+        # Nine bytes of descriptor, followed by the (optional) local color table and the LZW minimum code size.
+        if len(buffer) - position < 9:
+            return None
+
+        (left, top, width, height, flags) = struct.unpack_from("<HHHHB", buffer, position)
+        self.result.frames += 1
+
+        (screen_width, screen_height) = (self.result.width, self.result.height)
+        (right, bottom) = (left + width, top + height)
+
+        if (screen_width + screen_height) > 0 and (right > 2 * screen_width or bottom > 2 * screen_height):
+            self.result.bomb_reason = f"frame {self.result.frames} is {right}x{bottom} on a " \
+                                      f"{screen_width}x{screen_height} screen"
+
+        if flags & 0x80:
+            self._skip = 3 << ((flags & 0x07) + 1)
+
+        self._state = self._parse_lzw_code_size
+        return position + 9
+
+    def _parse_lzw_code_size(self, buffer: bytearray, position: int):
+        if len(buffer) - position < 1:
+            return None
+
+        self._state = self._parse_sub_block
+        return position + 1
+
+    def _parse_sub_block(self, buffer: bytearray, position: int):
+        if len(buffer) - position < 1:
+            return None
+
+        size = buffer[position]
+
+        if size == 0:
+            self._state = self._parse_block
+        else:
+            self._skip = size
+
+        return position + 1
+
+
+async def inspect_gif(response: aiohttp.ClientResponse, byte_budget: int = 8 * 1024 * 1024,
+                      head: bytes = b"") -> GifInspection:
+    """
+    Inspect a GIF as it's downloaded, stopping as soon as there's a verdict.
+
+    The body is read a chunk at a time and fed to a `GifInspector`, and is never kept in full or written to disk.
+    Reading stops once the inspector has found a bomb or reached the end of the GIF, or once `byte_budget` bytes have
+    been read - so a huge GIF costs at most the budget, and a bomb usually costs only its first few kilobytes.
+
+    :param response: The response whose body is the GIF. Reading is abandoned (and the connection closed) early if
+                     there's no need to read the whole body.
+    :param byte_budget: The most bytes to read.
+    :param head: Any bytes already read from the start of the body (by `read_head`, for example).
+    :return: The inspection result. Its `complete` is False if the budget ran out (or the GIF was truncated or
+             malformed) before the end of the GIF.
+    """
+    inspector = GifInspector()
+
+    if response.content_length is not None:
+        inspector.set_expected_size(response.content_length)
+
+    if head:
+        inspector.feed(head[:byte_budget])
+
+    while not inspector.done and inspector.result.bytes_read < byte_budget:
+        chunk = await response.content.read(CHUNK_SIZE)
+
+        if not chunk:
+            break
+
+        inspector.feed(chunk[:byte_budget - inspector.result.bytes_read])
+
+        # Let everything else have a turn between chunks, even when the body arrives faster than it's parsed.
+        await asyncio.sleep(0)
+
+    if not inspector.done:
+        if inspector.result.bytes_read >= byte_budget:
+            LOG.debug(f"Stopped inspecting a GIF after reaching the {byte_budget} byte budget.")
+        else:
+            inspector.finish()
+
+    if inspector.error is not None:
+        LOG.debug(f"Stopped inspecting a GIF early: {inspector.error}")
+
+    if not response.content.at_eof():
+        response.close()
+
+    return inspector.result
+
+
+async def read_head(response: aiohttp.ClientResponse, limit: int = FINGERPRINT_BYTES) -> bytes:
+    """
+    Read (up to) the first `limit` bytes of a response body, leaving the rest unread.
+    """
+    head = bytearray()
+
+    while len(head) < limit:
+        chunk = await response.content.read(limit - len(head))
+
+        if not chunk:
+            break
+
+        head.extend(chunk)
+
+    return bytes(head)
+
+
+def fingerprint(head: bytes, size: int) -> str:
+    """
+    Fingerprint a file from the start of its content and its total size.
+
+    Hashing only the start of a file means it can be fingerprinted without downloading all of it. Different files will
+    rarely share both, but it's possible to craft one that does - so a fingerprint should only be trusted to identify a
+    *whole* file (see `fingerprint_covers`) when it's used to call something safe.
+
+    :param head: At least the first FINGERPRINT_BYTES of the file (or all of it, if it's smaller).
+    :param size: The size of the whole file, in bytes.
+    :return: A string identifying the file.
+    """
+    return f"{hashlib.sha256(head[:FINGERPRINT_BYTES]).hexdigest()}-{size}"
+
+
+def is_immutable_url(url: str) -> bool:
+    """
+    Check whether a URL always serves the same file (as Discord attachment URLs do).
+    """
+    try:
+        parsed = URL(url)
+    except ValueError:
+        return False
+
+    return parsed.host in IMMUTABLE_HOSTS and parsed.path.startswith("/attachments/")
+
+
+def fingerprint_covers(size: int) -> bool:
+    """
+    Check whether a file's fingerprint covers its entire content (and so identifies it exactly).
+    """
+    return size is not None and size <= FINGERPRINT_BYTES
+
+
+async def fetch_fingerprint(http_client, url: str, size: int = None):
+    """
+    Fingerprint a remote file, downloading only as much of it as the fingerprint needs.
+
+    :param http_client: The HTTP client to download with.
+    :param url: The URL of the file.
+    :param size: The size of the file, if already known (as it is for Discord attachments).
+    :return: The file's fingerprint, or None if it couldn't be downloaded.
+    """
+    headers = {"Range": f"bytes=0-{FINGERPRINT_BYTES - 1}"}
+
+    async with http_client.get(url, headers=headers) as r:  # type: aiohttp.ClientResponse
+        if r.status == 206:
+            # "bytes 0-65535/123456"
+            total = r.headers.get("Content-Range", "").rpartition("/")[2]
+            size = size or (int(total) if total.isdigit() else None)
+        elif r.status == 200:
+            size = size or r.content_length
+        else:
+            return None
+
+        if size is None:
+            return None
+
+        head = await read_head(r)
+
+        if not r.content.at_eof():
+            r.close()
+
+    return fingerprint(head, size)
+
+
+class MediaVerdict:
+    """
+    The outcome of analyzing a file.
+    """
+    __slots__ = ('is_bad', 'reason')
+
+    def __init__(self, is_bad: bool, reason: str = None):
+        self.is_bad = is_bad
+        self.reason = reason
+
+
+class AnalysisCache:
+    """
+    Remembers what's already been learned about files, so the same file isn't downloaded and analyzed over and over.
+
+    Files are tracked two ways. By URL, each seen URL maps to the file's fingerprint and (once analyzed) its verdict -
+    reposting the same link costs nothing. Only immutable (Discord attachment) URLs get their clean verdicts back this
+    way, though, as anyone can swap the file behind a URL on their own server for a worse one.
+
+    By fingerprint, known-bad files are remembered no matter where they're uploaded, so a re-upload can be blocked after
+    downloading only enough of it to fingerprint it. Clean verdicts are only remembered by fingerprint when the
+    fingerprint covers the whole file, so a crafted file can't borrow another file's clean verdict.
+
+    Both are bounded LRUs. Entries expire after `ttl` seconds, or `bad_ttl` seconds for bad verdicts.
+    """
+
+    def __init__(self, max_entries: int = 4096, ttl: float = 24 * 60 * 60, bad_ttl: float = 7 * 24 * 60 * 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bad_ttl = bad_ttl
+
+        # { url: (fingerprint, MediaVerdict or None, expires) }
+        self._urls = collections.OrderedDict()
+
+        # { fingerprint: (MediaVerdict, expires) }
+        self._verdicts = collections.OrderedDict()
+
+        self._requests = {result: CACHE_REQUESTS.labels("media", result) for result in ("hit", "miss")}
+
+    def lookup(self, url: str):
+        """
+        Look up what's known about a URL.
+
+        :return: A tuple of (fingerprint, verdict). The fingerprint is None if the URL hasn't been seen, and the verdict
+                 is None if the file hasn't been judged. For URLs that may serve a different file by now, only a bad
+                 verdict is returned - the file has to be fetched (and its fingerprint checked) again to be trusted.
+        """
+        entry = self._get(self._urls, url)
+
+        if entry is None:
+            self._requests["miss"].inc()
+            return None, None
+
+        self._requests["hit"].inc()
+        (fp, verdict, _) = entry
+
+        # The file may have been blocked since this URL was last judged.
+        fp_verdict = self.lookup_fingerprint(fp)
+
+        if fp_verdict is not None and fp_verdict.is_bad:
+            return fp, fp_verdict
+
+        if is_immutable_url(url):
+            return fp, verdict or fp_verdict
+
+        if verdict is not None and verdict.is_bad:
+            return fp, verdict
+
+        return fp, None
+
+    def lookup_fingerprint(self, fp: str):
+        entry = self._get(self._verdicts, fp)
+
+        return entry[0] if entry is not None else None
+
+    def record(self, url: str, fp: str, verdict: MediaVerdict = None, size: int = None):
+        """
+        Remember a URL's fingerprint and, if it's been analyzed, its verdict.
+
+        :param url: The URL the file was downloaded from.
+        :param fp: The file's fingerprint.
+        :param verdict: The verdict on the file, if it has one.
+        :param size: The file's size, used to decide whether a clean verdict may be remembered by fingerprint.
+        """
+        ttl = self.bad_ttl if verdict is not None and verdict.is_bad else self.ttl
+        self._put(self._urls, url, (fp, verdict, time.time() + ttl))
+
+        if verdict is not None and (verdict.is_bad or fingerprint_covers(size)):
+            self._put(self._verdicts, fp, (verdict, time.time() + ttl))
+
+    def block(self, fp: str, reason: str):
+        """
+        Mark a file as bad, wherever it's seen next.
+        """
+        self._put(self._verdicts, fp, (MediaVerdict(True, reason), time.time() + self.bad_ttl))
+
+    def unblock(self, prefix: str) -> int:
+        """
+        Forget bad verdicts for every fingerprint starting with `prefix`.
+
+        :return: The number of fingerprints unblocked.
+        """
+        matches = [fp for (fp, (verdict, _)) in self._verdicts.items() if verdict.is_bad and fp.startswith(prefix)]
+
+        for fp in matches:
+            del self._verdicts[fp]
+
+        for (url, (fp, verdict, expires)) in list(self._urls.items()):
+            if fp in matches:
+                self._urls[url] = (fp, None, expires)
+
+        return len(matches)
+
+    def blocked(self) -> list:
+        """
+        Get every currently blocked file, as a list of (fingerprint, reason), most recently seen first.
+        """
+        now = time.time()
+
+        return [(fp, verdict.reason) for (fp, (verdict, expires)) in reversed(self._verdicts.items())
+                if verdict.is_bad and expires > now]
+
+    def _get(self, tier: collections.OrderedDict, key: str):
+        entry = tier.get(key)
+
+        if entry is None:
+            return None
+
+        if entry[-1] <= time.time():
+            del tier[key]
+            return None
+
+        tier.move_to_end(key)
+        return entry
+
+    def _put(self, tier: collections.OrderedDict, key: str, entry: tuple):
+        tier[key] = entry
+        tier.move_to_end(key)
+
+        while len(tier) > self.max_entries:
+            tier.popitem(last=False)
+
+
+analysis_cache = AnalysisCache()
+
+
+def get_analysis_cache():
+    return analysis_cache
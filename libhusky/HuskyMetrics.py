@@ -0,0 +1,268 @@
+import bisect
+import logging
+import math
+
+from aiohttp import web
+
+LOG = logging.getLogger("HuskyBot.Metrics")
+
+# Default histogram buckets, in seconds. Tuned for things that happen on the event loop (handlers, modules, saves).
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value) -> str:
+    if value == math.inf:
+        return "+Inf"
+
+    if value == -math.inf:
+        return "-Inf"
+
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+
+    return repr(value)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace("\"", "\\\"")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for (name, value) in zip(names, values)]
+
+    if extra is not None:
+        pairs.append(extra)
+
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ('_upper_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, upper_bounds: tuple):
+        self._upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self._upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metric:
+    """
+    A single named metric, optionally split by labels.
+
+    Labelled metrics hand out one child per combination of label values. Children are created on first use and never
+    removed, so labels should only ever take a small, bounded set of values. Callers on hot paths can hold on to the
+    child returned by `labels()` to skip even the dictionary lookup.
+
+    Unlabelled metrics act as their own (only) child.
+    """
+    TYPE = None
+
+    def __init__(self, name: str, documentation: str, labels: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+        self._children = {}
+
+        if not self.label_names:
+            self._default = self._children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        child = self._children.get(values)
+
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"Metric {self.name} takes labels {self.label_names}, but got {values}.")
+
+            child = self._children[values] = self._new_child()
+
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.TYPE}"]
+
+        for (values, child) in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+
+        return lines
+
+    def _render_child(self, values: tuple, child) -> list:
+        return [f"{self.name}{_format_labels(self.label_names, values)} {_format_value(child.value)}"]
+
+
+class Counter(Metric):
+    """
+    A value that only ever goes up, such as a number of events or actions.
+    """
+    TYPE = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+
+class Gauge(Metric):
+    """
+    A value that can go up and down, such as a queue length.
+
+    Gauges may be given a callback instead of being set, in which case the callback is called for the current value
+    whenever metrics are collected. This is the cheapest option for anything that can already be measured on demand.
+    """
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), callback=None):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1):
+        self._default.value += amount
+
+    def dec(self, amount: float = 1):
+        self._default.value -= amount
+
+    def set(self, value: float):
+        self._default.value = value
+
+    def render(self) -> list:
+        if self.callback is not None:
+            try:
+                self._default.value = self.callback()
+            except Exception:
+                LOG.exception(f"Failed to collect gauge {self.name}.")
+
+        return super().render()
+
+
+class Histogram(Metric):
+    """
+    A distribution of observed values (usually durations, in seconds), counted into fixed buckets.
+    """
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labels)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def _render_child(self, values: tuple, child) -> list:
+        lines = []
+        cumulative = 0
+
+        for (bound, count) in zip(self.upper_bounds + (math.inf,), child.counts):
+            cumulative += count
+            labels = _format_labels(self.label_names, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+
+        labels = _format_labels(self.label_names, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The set of all metrics the bot exposes.
+
+    Metrics are created through the registry, which hands back the existing metric if one of the same name was already
+    created. This lets plugins declare their metrics when they're loaded without worrying about being reloaded.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        metric = self._metrics.get(name)
+
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.TYPE}.")
+
+        return metric
+
+    def counter(self, name: str, documentation: str, labels: tuple = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labels)
+
+    def gauge(self, name: str, documentation: str, labels: tuple = (), callback=None) -> Gauge:
+        gauge = self._get_or_create(Gauge, name, documentation, labels)
+
+        # A reloaded plugin's callback replaces its old one.
+        if callback is not None:
+            gauge.callback = callback
+
+        return gauge
+
+    def histogram(self, name: str, documentation: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) \
+            -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labels, buckets)
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format.
+        """
+        lines = []
+
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def get_registry():
+    return registry
+
+
+async def handle_metrics(request: web.BaseRequest):
+    return web.Response(text=registry.render(), content_type="text/plain")
@@ -0,0 +1,241 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+from libhusky import HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.ResponseCache")
+
+CACHE_REQUESTS = HuskyMetrics.get_registry().counter(
+    "husky_cache_requests_total", "Cache lookups, by cache and result (hit or miss).", ("cache", "result")
+)
+
+
+def make_key(*parts, **params) -> str:
+    """
+    Build a cache key from the parts of a request (method, endpoint, query, body, ...).
+
+    Parameters are sorted and every part is serialized the same way, so equivalent requests always get the same key no
+    matter how they were built. Strings have leading and trailing whitespace stripped, which is never significant.
+
+    :return: A hex digest identifying the request.
+    """
+    def normalize(value):
+        if isinstance(value, str):
+            return value.strip()
+
+        return value
+
+    blob = json.dumps([[normalize(p) for p in parts], {k: normalize(v) for (k, v) in params.items()}],
+                      sort_keys=True, separators=(',', ':'), default=str)
+
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class CacheEntry:
+    __slots__ = ('value', 'expires', 'stale_until')
+
+    def __init__(self, value, expires: float, stale_until: float):
+        self.value = value
+
+        # Wall-clock times (time.time()), so entries mean the same thing after being read back from disk.
+        self.expires = expires
+        self.stale_until = stale_until
+
+    def to_data(self) -> dict:
+        return {"value": self.value, "expires": self.expires, "staleUntil": self.stale_until}
+
+    @classmethod
+    def from_data(cls, data: dict):
+        return cls(data['value'], data['expires'], data['staleUntil'])
+
+
+class ResponseCache:
+    """
+    A cache for the responses of slow or rate-limited external lookups.
+
+    Entries live in a bounded, in-memory LRU and (optionally) in a directory on disk, so they survive restarts. Every
+    entry has a TTL, after which it's stale. Stale entries are still served for a while longer (stale-while-revalidate),
+    but serving one starts a refresh in the background, so the next lookup gets a fresh value without having waited for
+    it. Entries past their stale window are treated as missing.
+
+    Concurrent lookups for the same key are coalesced: only the first actually calls out, and everyone else waits for
+    its result. A lookup that fails is never cached, and its error goes to everyone waiting on it.
+
+    Values must be JSON-serializable if the disk tier is used.
+    """
+
+    def __init__(self, name: str, ttl: float = 300, stale_ttl: float = 0, max_entries: int = 256,
+                 disk_path: str = None):
+        """
+        :param name: The cache's name, used in logs and metrics.
+        :param ttl: How long an entry is fresh for, in seconds.
+        :param stale_ttl: How long after going stale an entry may still be served while it's refreshed, in seconds.
+        :param max_entries: The number of entries kept in memory.
+        :param disk_path: A directory to keep entries in on disk, or None to keep them in memory only.
+        """
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+
+        # { key: CacheEntry }, least recently used first.
+        self._entries = collections.OrderedDict()
+
+        # { key: asyncio.Future }, for lookups currently calling out.
+        self._inflight = {}
+
+        self._requests = {result: CACHE_REQUESTS.labels(name, result)
+                          for result in ("hit", "stale", "disk", "miss", "coalesced")}
+
+    async def get(self, key: str, fetch, ttl=None):
+        """
+        Get a value from the cache, fetching it if it's missing.
+
+        :param key: The request's key, usually from `make_key`.
+        :param fetch: A coroutine function (taking no arguments) that fetches the value.
+        :param ttl: Overrides the cache's TTL for this entry. May be a function, which is called with the fetched value
+                    and returns the TTL. A TTL of 0 means the value isn't cached at all, for results that shouldn't
+                    stick (like "try again later" responses).
+        :return: The cached or fetched value.
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+
+        if entry is None and self.disk_path is not None:
+            entry = await asyncio.get_event_loop().run_in_executor(None, self._read, key)
+
+            if entry is not None:
+                self._remember(key, entry)
+                self._requests["disk"].inc()
+
+        if entry is not None and now < entry.stale_until:
+            self._entries.move_to_end(key)
+
+            if now < entry.expires:
+                self._requests["hit"].inc()
+            else:
+                self._requests["stale"].inc()
+
+                if key not in self._inflight:
+                    self._start_fetch(key, fetch, ttl, background=True)
+
+            return entry.value
+
+        if key in self._inflight:
+            self._requests["coalesced"].inc()
+        else:
+            self._requests["miss"].inc()
+            self._start_fetch(key, fetch, ttl, background=False)
+
+        # Shielded, so one caller giving up doesn't cancel the fetch for everyone else waiting on it.
+        return await asyncio.shield(self._inflight[key])
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+        if self.disk_path is not None:
+            try:
+                os.remove(self._entry_path(key))
+            except FileNotFoundError:
+                pass
+
+    def _start_fetch(self, key: str, fetch, ttl, background: bool):
+        future = self._inflight[key] = asyncio.ensure_future(self._fetch(key, fetch, ttl))
+
+        if background:
+            future.add_done_callback(self._log_refresh_failure)
+
+    async def _fetch(self, key: str, fetch, ttl):
+        try:
+            value = await fetch()
+        finally:
+            self._inflight.pop(key, None)
+
+        if callable(ttl):
+            ttl = ttl(value)
+        elif ttl is None:
+            ttl = self.ttl
+
+        if not ttl:
+            return value
+
+        now = time.time()
+        entry = CacheEntry(value, now + ttl, now + ttl + self.stale_ttl)
+        self._remember(key, entry)
+
+        if self.disk_path is not None:
+            try:
+                await asyncio.get_event_loop().run_in_executor(None, self._write, key, entry)
+            except OSError:
+                LOG.warning(f"Failed to write an entry for cache {self.name} to disk.", exc_info=True)
+
+        return value
+
+    def _log_refresh_failure(self, future: asyncio.Future):
+        # Background refreshes have no one to raise to, and the stale value is still there to serve.
+        if not future.cancelled() and future.exception() is not None:
+            LOG.warning(f"Failed to refresh cache {self.name}, will keep serving the stale entry.",
+                        exc_info=future.exception())
+
+    def _remember(self, key: str, entry: CacheEntry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.disk_path, key + ".json")
+
+    def _read(self, key: str):
+        path = self._entry_path(key)
+
+        try:
+            with open(path, 'r') as f:
+                entry = CacheEntry.from_data(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError):
+            LOG.warning(f"Discarding unreadable entry {key} from cache {self.name}.")
+            os.remove(path)
+            return None
+
+        if time.time() >= entry.stale_until:
+            os.remove(path)
+            return None
+
+        return entry
+
+    def _write(self, key: str, entry: CacheEntry):
+        os.makedirs(self.disk_path, exist_ok=True)
+
+        path = self._entry_path(key)
+        temp_path = path + ".tmp"
+
+        with open(temp_path, 'w') as f:
+            json.dump(entry.to_data(), f, separators=(',', ':'))
+
+        os.replace(temp_path, path)
+
+
+caches = {}
+
+
+def get_cache(name: str, **kwargs) -> ResponseCache:
+    """
+    Get the response cache with this name, creating it (with the given settings) if it doesn't exist yet.
+
+    Caches outlive the plugins that use them, so reloading a plugin doesn't throw away everything it had cached.
+    """
+    cache = caches.get(name)
+
+    if cache is None:
+        cache = caches[name] = ResponseCache(name, **kwargs)
+
+    return cache
@@ -0,0 +1,170 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+
+from libhusky import HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.Scheduler")
+
+
+def utc_timestamp() -> float:
+    """
+    The clock used for all scheduler deadlines. This matches the timestamps stored by HuskyData objects.
+    """
+    return datetime.datetime.utcnow().timestamp()
+
+
+class ScheduledTask:
+    """
+    A handle to a single scheduled callback. Returned by `WolfScheduler.schedule`, and used to cancel it.
+    """
+    __slots__ = ('deadline', 'name', 'callback', 'cancelled', 'started', '_seq')
+
+    def __init__(self, deadline: float, seq: int, callback, name: str = None):
+        self.deadline = deadline
+        self.name = name
+        self.callback = callback
+        self.cancelled = False
+        self.started = False
+        self._seq = seq
+
+    def __lt__(self, other):
+        return (self.deadline, self._seq) < (other.deadline, other._seq)
+
+    def __repr__(self):
+        return f"<ScheduledTask name={self.name!r} deadline={self.deadline} cancelled={self.cancelled}>"
+
+
+class WolfScheduler:
+    """
+    A shared deadline scheduler for anything that needs to happen at a specific time (mute expiry, giveaway ends...).
+
+    Pending tasks are kept in a min-heap keyed by deadline. The scheduler sleeps until exactly the earliest deadline,
+    and is only woken early when something is scheduled (or cancelled) at the front of the queue. An idle scheduler
+    never wakes up at all.
+
+    Callbacks are coroutine functions taking no arguments. Each one is run in its own task, so a slow callback can't
+    hold up anything else that's due.
+
+    Cancellation is lazy: a cancelled task stays in the heap and is simply discarded when it reaches the front.
+    """
+
+    def __init__(self, clock=utc_timestamp):
+        self._clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._live = 0
+
+        self._wakeup = None  # type: asyncio.Event
+        self._task = None  # type: asyncio.Task
+
+    def __len__(self):
+        return self._live
+
+    def schedule(self, deadline: float, callback, name: str = None) -> ScheduledTask:
+        """
+        Schedule a coroutine function to be run at (or shortly after) a specific time.
+
+        :param deadline: The timestamp (see `utc_timestamp`) to run the callback at. Past deadlines run immediately.
+        :param callback: A coroutine function taking no arguments.
+        :param name: An optional name for the task, used in logs.
+        :return: A ScheduledTask handle that can be passed to `cancel`.
+        """
+        task = ScheduledTask(deadline, next(self._seq), callback, name)
+        heapq.heappush(self._heap, task)
+        self._live += 1
+
+        self._ensure_running()
+
+        # Only bother the runner if this task is now the next thing due.
+        if self._heap[0] is task:
+            self._wakeup.set()
+
+        return task
+
+    def cancel(self, task: ScheduledTask):
+        """
+        Cancel a scheduled task. Cancelling a task that has already run (or been cancelled) does nothing.
+
+        :param task: The handle returned by `schedule`.
+        """
+        if task is None or task.cancelled or task.started:
+            return
+
+        task.cancelled = True
+        self._live -= 1
+
+        if self._heap and self._heap[0] is task:
+            self._wakeup.set()
+
+    def next_deadline(self):
+        """
+        Get the deadline of the next pending task, or None if nothing is scheduled.
+        """
+        self._discard_cancelled()
+
+        return self._heap[0].deadline if self._heap else None
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _ensure_running(self):
+        if self._task is not None and not self._task.done():
+            return
+
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+
+        self._task = asyncio.ensure_future(self._run())
+
+    def _discard_cancelled(self):
+        while self._heap and self._heap[0].cancelled:
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._discard_cancelled()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0].deadline - self._clock()
+
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            task = heapq.heappop(self._heap)
+            task.started = True
+            self._live -= 1
+            asyncio.ensure_future(self._execute(task))
+
+    @staticmethod
+    async def _execute(task: ScheduledTask):
+        LOG.debug(f"Running scheduled task {task.name} (deadline {task.deadline}).")
+
+        try:
+            await task.callback()
+        except Exception:
+            LOG.exception(f"Scheduled task {task.name} raised an exception.")
+
+
+scheduler = WolfScheduler()
+
+HuskyMetrics.get_registry().gauge(
+    "husky_scheduler_pending_tasks", "Tasks waiting in the shared scheduler.", callback=lambda: len(scheduler)
+)
+
+
+def get_scheduler():
+    return scheduler
@@ -6,9 +6,11 @@ import imghdr
 import logging
 import math
 import os
+import random
 import re
 import struct
 import subprocess
+import threading
 import unicodedata
 from logging import handlers
 
@@ -139,22 +141,6 @@ def get_timedelta_from_string(timestring: str):
     return datetime.timedelta(**time_params)
 
 
-def get_sort_index(target_list: list, new_object, attribute: str):
-    comparator = new_object[attribute]
-
-    # special null case
-    if comparator is None:
-        return len(target_list)
-
-    for i in range(0, len(target_list)):
-        item = target_list[i]
-
-        if comparator < item[attribute]:
-            return i
-
-    return len(target_list)
-
-
 def get_image_size(fname):
     """
     Determine the image type of fhandle and return its size.
@@ -341,6 +327,66 @@ def get_delta_timestr(timediff: datetime.timedelta):
     return ", ".join(time_components)
 
 
+def progress_bar(current: int, total: int, width: int = 20) -> str:
+    """
+    Build a simple text progress bar, suitable for embeds.
+
+    :param current: The number of completed items.
+    :param total: The total number of items.
+    :param width: The number of characters in the bar itself.
+    :return: A string like `[#####---------------] 25% (5/20)`.
+    """
+    fraction = (current / total) if total else 1
+    filled = int(round(fraction * width))
+
+    return f"`[{'#' * filled}{'-' * (width - filled)}]` {fraction * 100:.0f}% ({current}/{total})"
+
+
+def reservoir_sample(iterable, k: int, rng: random.Random = None) -> list:
+    """
+    Uniformly choose up to k items from an iterable of unknown length, holding only k items in memory at a time.
+
+    :param iterable: The iterable to sample from. It is consumed exactly once.
+    :param k: The maximum number of items to choose.
+    :param rng: The random number generator to use. Defaults to a SystemRandom.
+    :return: A list of at most k chosen items, in no particular order.
+    """
+    rng = rng or random.SystemRandom()
+    reservoir = []
+
+    for (i, item) in enumerate(iterable):
+        if i < k:
+            reservoir.append(item)
+            continue
+
+        j = rng.randint(0, i)
+        if j < k:
+            reservoir[j] = item
+
+    return reservoir
+
+
+async def reservoir_sample_async(async_iterable, k: int, rng: random.Random = None) -> list:
+    """
+    Async version of reservoir_sample, for paginated iterators (like reaction.users()).
+    """
+    rng = rng or random.SystemRandom()
+    reservoir = []
+    i = 0
+
+    async for item in async_iterable:
+        if i < k:
+            reservoir.append(item)
+        else:
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = item
+
+        i += 1
+
+    return reservoir
+
+
 class TwitterSnowflake:
     def __init__(self):
         self.timestamp = None
@@ -401,12 +447,17 @@ class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
         os.makedirs(os.path.dirname(filename), exist_ok=True)  # Make logs if we need to
         logging.handlers.RotatingFileHandler.__init__(self, filename, **kws)
 
+        # Compressing a 5 MB log takes long enough to notice, so it's done in the background while logging carries on.
+        self._archiver = None  # type: threading.Thread
+
     @staticmethod
     def do_archive(old_log):
+        # Written under a temporary name, so a crash mid-compression never leaves a truncated archive behind.
         with open(old_log, 'rb') as log:
-            with gzip.open(old_log + '.gz', 'wb') as comp_log:
+            with gzip.open(old_log + '.gz.tmp', 'wb') as comp_log:
                 comp_log.writelines(log)
 
+        os.replace(old_log + '.gz.tmp', old_log + '.gz')
         os.remove(old_log)
 
     def doRollover(self):
@@ -414,6 +465,9 @@ class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
             self.stream.close()
             self.stream = None
 
+        # The previous archive has to be finished before the archives are shuffled along. At 5 MB a log, it always is.
+        self.wait_for_archive()
+
         if self.backup_count > 0:
             for i in range(self.backup_count - 1, 0, -1):
                 sfn = "%s.%d.gz" % (self.baseFilename, i)
@@ -430,11 +484,23 @@ class CompressingRotatingFileHandler(logging.handlers.RotatingFileHandler):
 
         if os.path.exists(self.baseFilename):
             os.rename(self.baseFilename, dfn)
-            self.do_archive(dfn)
+
+            # Not a daemon, so shutting down waits for the archive to finish rather than losing the log.
+            self._archiver = threading.Thread(target=self.do_archive, args=(dfn,), name="HuskyBot-LogArchiver")
+            self._archiver.start()
 
         if not self.delay:
             self.stream = self._open()
 
+    def wait_for_archive(self):
+        if self._archiver is not None:
+            self._archiver.join()
+            self._archiver = None
+
+    def close(self):
+        super().close()
+        self.wait_for_archive()
+
 
 class Singleton(type):
     # Borrowed from https://stackoverflow.com/a/6798042/1817097
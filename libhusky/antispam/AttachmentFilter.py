@@ -123,10 +123,11 @@ class AttachmentFilter(AntiSpamModule):
 
                 LOG.info(f"User {message.author} has been warned for posting too many attachments in a short while.")
             elif cooldown_record['offenseCount'] >= filter_config['banLimit']:
-                await message.author.ban(reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
-                                                f"{cooldown_record['offenseCount']} attachments in a "
-                                                f"{filter_config['seconds']} second period.",
-                                         delete_message_days=1)
+                await self.bot.mod_actions.ban(message.guild, message.author,
+                                               reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
+                                                      f"{cooldown_record['offenseCount']} attachments in a "
+                                                      f"{filter_config['seconds']} second period.",
+                                               delete_message_days=1)
                 del self._events[message.author.id]
                 LOG.info(f"User {message.author} has been banned for posting over {filter_config['banLimit']} "
                          f"attachments in a {filter_config['seconds']} period.")
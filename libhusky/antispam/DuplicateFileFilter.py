@@ -0,0 +1,396 @@
+#   This Source Code Form is "Incompatible With Secondary Licenses", as
+#   defined by the Mozilla Public License, v. 2.0.
+
+import asyncio
+import collections
+import datetime
+import logging
+
+import aiohttp
+import discord
+from discord.ext import commands
+
+from libhusky import HuskyMedia
+from libhusky.HuskyStatics import *
+from libhusky.antispam import AntiSpamModule
+
+LOG = logging.getLogger("HuskyBot.Plugin.AntiSpam." + __name__.split('.')[-1])
+
+defaults = {
+    'seconds': 120,  # How long a sighting of a file counts for
+    'postLimit': 4,  # Number of times a file may be posted (by anyone) before it's blocked
+    'minUsers': 2,  # Number of different users that must have posted it...
+    'minChannels': 2  # ...or the number of different channels it must have been posted in
+}
+
+
+class DuplicateFileFilter(AntiSpamModule):
+    """
+    The Duplicate File Filter is one of the modules that makes up the AntiSpam system.
+
+    It watches for the same file being posted over and over by different users, or in different channels - the
+    signature of a coordinated raid, which per-user filters like the Attachment Filter can't see. Files are identified
+    by their content (a fingerprint of the start of the file and its size), so re-uploading a file doesn't hide it.
+
+    Once a file is posted too many times in a short period, every recent post of it is deleted, and the file is
+    blocked. Later posts of a blocked file (by anyone, anywhere) are deleted as soon as they're fingerprinted, without
+    downloading the rest of the file. Files found to be malicious elsewhere (such as GIF bombs found by DirtyHacks) are
+    blocked the same way.
+
+    Blocks expire after a week.
+
+    Default Parameters:
+        Time to Cooldown: 120 Seconds
+        Post Limit: 4 Posts
+        Spread: 2 Users or 2 Channels
+    """
+
+    def __init__(self, plugin):
+        super().__init__(
+            self.base,
+            name="duplicateFileFilter",
+            brief="Control the duplicate file filter's settings",
+            checks=[super().has_permissions(manage_guild=True)],
+            help=self.classhelp(),
+            aliases=["dff"]
+        )
+
+        self.bot = plugin.bot
+        self._config = self.bot.config
+
+        # { fingerprint: deque((expiry, discord.Message)) }
+        self._sightings = {}
+
+        self.add_command(self.set_duplicate_config)
+        self.add_command(self.view_config)
+        self.add_command(self.list_blocked)
+        self.add_command(self.unblock_file)
+        self.add_command(self.clear_cooldown)
+        self.add_command(self.clear_all_cooldowns)
+        self.register_commands(plugin)
+
+        LOG.info("Filter initialized.")
+
+    def cleanup(self):
+        now = datetime.datetime.utcnow()
+
+        for fp in list(self._sightings.keys()):
+            self._expire(fp, now)
+
+    def clear_for_user(self, user: discord.Member):
+        found = False
+
+        for fp in list(self._sightings.keys()):
+            sightings = self._sightings[fp]
+            kept = [(expiry, m) for (expiry, m) in sightings if m.author.id != user.id]
+
+            if len(kept) != len(sightings):
+                found = True
+                self._sightings[fp] = collections.deque(kept)
+
+                if not kept:
+                    del self._sightings[fp]
+
+        if not found:
+            raise KeyError("The user requested does not have a record for this filter.")
+
+    def clear_all(self):
+        self._sightings = {}
+
+    def _expire(self, fp: str, now: datetime.datetime):
+        sightings = self._sightings.get(fp)
+
+        if sightings is None:
+            return
+
+        while sightings and sightings[0][0] < now:
+            sightings.popleft()
+
+        if not sightings:
+            del self._sightings[fp]
+
+    async def _get_fingerprint(self, attachment: discord.Attachment):
+        analysis_cache = HuskyMedia.get_analysis_cache()
+
+        (fp, verdict) = analysis_cache.lookup(attachment.url)
+
+        if fp is not None:
+            return fp, verdict
+
+        try:
+            fp = await HuskyMedia.fetch_fingerprint(self.bot.http_client, attachment.url, attachment.size)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+            LOG.warning(f"Could not fingerprint attachment {attachment.id} ({type(ex).__name__}).")
+            return None, None
+
+        if fp is None:
+            return None, None
+
+        analysis_cache.record(attachment.url, fp)
+
+        return fp, analysis_cache.lookup_fingerprint(fp)
+
+    async def process_message(self, message: discord.Message, context):
+        as_config = self._config.get('antiSpam', {})
+        filter_config = as_config.get('DuplicateFileFilter', {}).get('config', defaults)
+
+        if len(message.attachments) == 0:
+            return
+
+        # Users with MANAGE_MESSAGES are allowed to post the same file as often as they'd like.
+        if message.author.permissions_in(message.channel).manage_messages:
+            return
+
+        now = datetime.datetime.utcnow()
+
+        for attachment in message.attachments:  # type: discord.Attachment
+            (fp, verdict) = await self._get_fingerprint(attachment)
+
+            if fp is None:
+                continue
+
+            if verdict is not None and verdict.is_bad:
+                LOG.info(f"Deleting message {message.id} from {message.author}, as it contains blocked file {fp[:12]} "
+                         f"({verdict.reason}).")
+                await self.bot.mod_actions.delete_message(message)
+                return
+
+            self._expire(fp, now)
+            sightings = self._sightings.setdefault(fp, collections.deque())
+
+            # Edits are re-checked, but shouldn't count as another post of the same file.
+            if any(m.id == message.id for (_, m) in sightings):
+                continue
+
+            sightings.append((now + datetime.timedelta(seconds=filter_config['seconds']), message))
+
+            if len(sightings) < filter_config['postLimit']:
+                continue
+
+            users = set(m.author.id for (_, m) in sightings)
+            channels = set(m.channel.id for (_, m) in sightings)
+
+            if len(users) < filter_config['minUsers'] and len(channels) < filter_config['minChannels']:
+                continue
+
+            await self._block_file(fp, attachment.filename, sightings, users, channels, filter_config)
+            return
+
+    async def _block_file(self, fp: str, filename: str, sightings, users: set, channels: set, filter_config: dict):
+        reason = f"posted {len(sightings)} times by {len(users)} users in {len(channels)} channels within " \
+                 f"{filter_config['seconds']} seconds"
+
+        HuskyMedia.get_analysis_cache().block(fp, reason)
+        del self._sightings[fp]
+
+        LOG.info(f"Blocked file {fp[:12]}, as it was {reason}.")
+
+        messages = [m for (_, m) in sightings]
+        await asyncio.gather(*[self.bot.mod_actions.delete_message(m) for m in messages], return_exceptions=True)
+
+        log_embed = discord.Embed(
+            description=f"A file was {reason}, and has been blocked. All recent posts of it have been deleted, and "
+                        f"any further posts of it will be deleted automatically.",
+            color=Colors.WARNING
+        )
+
+        log_embed.set_author(name="Duplicate file spam blocked!")
+        log_embed.add_field(name="File", value=f"`{fp[:12]}` ({filename})", inline=True)
+        log_embed.add_field(name="Posted By", value=", ".join(list(set(str(m.author) for m in messages))[:10]),
+                            inline=True)
+        log_embed.add_field(name="Channels", value=", ".join(list(set(m.channel.mention for m in messages))[:10]),
+                            inline=False)
+        log_embed.set_footer(text=f"Run /as dff unblock {fp[:12]} if this file should be allowed.")
+
+        log_channel = self._config.get('specialChannels', {}).get(ChannelKeys.STAFF_LOG.value, None)
+        if log_channel is not None:
+            log_channel = messages[-1].guild.get_channel(log_channel)
+
+        if log_channel is not None:
+            await log_channel.send(embed=log_embed)
+
+    @commands.command(name="configure", brief="Configure thresholds for DuplicateFileFilter")
+    async def set_duplicate_config(self, ctx: commands.Context, cooldown_seconds: int, post_limit: int,
+                                   min_users: int, min_channels: int):
+        """
+        The duplicate file filter counts how often each file is posted. If a file is posted `post_limit` times within
+        `cooldown_seconds` seconds, by at least `min_users` different users or in at least `min_channels` different
+        channels, it is blocked, and all of those posts are deleted.
+
+        Parameters
+        ----------
+            ctx               :: Discord context <!nodoc>
+            cooldown_seconds  :: The number of seconds a post of a file counts for.
+            post_limit        :: The number of posts of a file before it is blocked.
+            min_users         :: The number of different users that must have posted a file for it to be blocked.
+            min_channels      :: The number of different channels a file must have been posted in for it to be
+                                 blocked (if it wasn't posted by enough different users).
+
+        Examples
+        --------
+            /as dff configure 120 4 2 2  :: Block files posted 4 times in 2 minutes by 2+ users or in 2+ channels.
+        """
+
+        as_config = self._config.get('antiSpam', {})
+        filter_config = as_config.setdefault('DuplicateFileFilter', {}).setdefault('config', defaults)
+
+        filter_config['seconds'] = cooldown_seconds
+        filter_config['postLimit'] = post_limit
+        filter_config['minUsers'] = min_users
+        filter_config['minChannels'] = min_channels
+
+        self._config.set('antiSpam', as_config)
+
+        await ctx.send(embed=discord.Embed(
+            title="AntiSpam Plugin",
+            description=f"The duplicate file module of AntiSpam will now block files posted **`{post_limit}`** times "
+                        f"in a **`{cooldown_seconds}` second** period by at least **`{min_users}`** users or in at "
+                        f"least **`{min_channels}`** channels.",
+            color=Colors.SUCCESS
+        ))
+
+    @commands.command(name="viewConfig", brief="See currently set configuration values for this plugin.")
+    async def view_config(self, ctx: commands.Context):
+        as_config = self._config.get('antiSpam', {})
+        filter_config = as_config.get('DuplicateFileFilter', {}).get('config', defaults)
+
+        embed = discord.Embed(
+            title="Duplicate File Filter Configuration",
+            description="The below settings are the current values for the duplicate file filter configuration.",
+            color=Colors.INFO
+        )
+
+        embed.add_field(name="Cooldown Timer", value=f"{filter_config['seconds']} seconds", inline=False)
+        embed.add_field(name="Post Limit", value=f"{filter_config['postLimit']} posts", inline=False)
+        embed.add_field(name="Minimum Users", value=f"{filter_config['minUsers']} users", inline=False)
+        embed.add_field(name="Minimum Channels", value=f"{filter_config['minChannels']} channels", inline=False)
+
+        await ctx.send(embed=embed)
+
+    @commands.command(name="blocked", brief="List files that are currently blocked")
+    async def list_blocked(self, ctx: commands.Context):
+        """
+        List every file that is currently blocked, either by this filter or because it was found to be malicious (like
+        a GIF bomb). The most recently seen files are listed first.
+
+        See Also
+        --------
+            /as dff unblock  :: Unblock a file.
+        """
+        blocked = HuskyMedia.get_analysis_cache().blocked()
+
+        if not blocked:
+            description = "No files are currently blocked."
+        else:
+            description = "\n".join(f"`{fp[:12]}`: {reason}" for (fp, reason) in blocked[:20])
+
+            if len(blocked) > 20:
+                description += f"\n\n...and {len(blocked) - 20} more."
+
+        await ctx.send(embed=discord.Embed(
+            title="Blocked Files",
+            description=description,
+            color=Colors.INFO
+        ))
+
+    @commands.command(name="unblock", brief="Unblock a blocked file")
+    async def unblock_file(self, ctx: commands.Context, file_id: str):
+        """
+        Allow a blocked file to be posted again. The file ID is shown in the staff log when a file is blocked, and in
+        `/as dff blocked`.
+
+        Parameters
+        ----------
+            ctx      :: Discord context <!nodoc>
+            file_id  :: The ID (or the start of the ID) of the file to unblock.
+
+        Examples
+        --------
+            /as dff unblock 3f2a9c01b7de  :: Unblock the file with ID 3f2a9c01b7de.
+
+        See Also
+        --------
+            /as dff blocked  :: List blocked files.
+        """
+        if len(file_id) < 8:
+            raise commands.BadArgument("File IDs must be at least eight characters long.")
+
+        count = HuskyMedia.get_analysis_cache().unblock(file_id.lower())
+
+        if count == 0:
+            await ctx.send(embed=discord.Embed(
+                title="Duplicate File Filter",
+                description=f"There is no blocked file with ID `{file_id}`.",
+                color=Colors.DANGER
+            ))
+            return
+
+        LOG.info(f"{ctx.author} unblocked {count} file(s) matching {file_id}.")
+
+        await ctx.send(embed=discord.Embed(
+            title=Emojis.UNLOCK + " Duplicate File Filter | File Unblocked",
+            description=f"The file `{file_id}` has been unblocked, and may be posted again.",
+            color=Colors.SUCCESS
+        ))
+
+    @commands.command(name="clear", brief="Clear a cooldown record for a specific user")
+    async def clear_cooldown(self, ctx: commands.Context, user: discord.Member):
+        """
+        This command allows moderators to override the antispam expiry system, and clear a user's cooldowns/strikes/
+        warnings early. Any posts of files by the selected user are forgotten, and no longer count towards blocking
+        those files.
+
+        Parameters
+        ----------
+            ctx   :: Discord context <!nodoc>
+            user  :: A user object (ID, mention, etc) to target for clearing.
+
+        See Also
+        --------
+            /as <filter_name> clearAll  :: Clear all cooldowns for all users for a single filter.
+            /as clear                   :: Clear cooldowns on all filters for a single user.
+            /as clearAll                :: Clear all cooldowns globally for all users (reset).
+        """
+
+        try:
+            self.clear_for_user(user)
+            LOG.info(f"The duplicate file records for {user} were cleared by {ctx.author}.")
+        except KeyError:
+            await ctx.send(embed=discord.Embed(
+                title="Duplicate File Filter",
+                description=f"There is no cooldown record present for `{user}`. Either this user does not exist, they "
+                            f"do not have a cooldown record, or it has already been cleared.",
+                color=Colors.DANGER
+            ))
+            return
+
+        await ctx.send(embed=discord.Embed(
+            title=Emojis.SPARKLES + " Duplicate File Filter | Cooldown Record Cleared!",
+            description=f"The duplicate file records for `{user}` have been cleared.",
+            color=Colors.SUCCESS
+        ))
+
+    @commands.command(name="clearAll", brief="Clear all cooldown records for this filter.")
+    @commands.has_permissions(administrator=True)
+    async def clear_all_cooldowns(self, ctx: commands.Context):
+        """
+        This command will clear all cooldowns for the current filter, effectively resetting its internal state. Blocked
+        files stay blocked - use `/as dff unblock` to unblock them.
+
+        See Also
+        --------
+            /as <filter_name> clear  :: Clear cooldowns on a single filter for a single user.
+            /as clear                :: Clear cooldowns on all filters for a single user.
+            /as clearAll             :: Clear all cooldowns globally for all users (reset).
+        """
+
+        record_count = len(self._sightings)
+
+        self.clear_all()
+        LOG.info(f"{ctx.author} cleared {record_count} file records from the duplicate file filter.")
+
+        await ctx.send(embed=discord.Embed(
+            title=Emojis.SPARKLES + " Duplicate File Filter | Cooldown Records Cleared!",
+            description="All cooldown records for the duplicate file filter have been successfully cleared.",
+            color=Colors.SUCCESS
+        ))
@@ -124,11 +124,7 @@ class InviteFilter(AntiSpamModule):
                 continue
 
             # The guild either is invalid or not on the whitelist - delete the message.
-            try:
-                await message.delete()
-            except discord.NotFound:
-                # Message not found, let's log this
-                LOG.warning(f"The message I was trying to delete does not exist! ID: {message.id}")
+            await self.bot.mod_actions.delete_message(message)
 
             # Grab the existing cooldown record, or make a new one if it doesn't exist.
             record = self._events.setdefault(message.author.id, {
@@ -156,13 +152,15 @@ class InviteFilter(AntiSpamModule):
 
             # Kick the user if necessary (performance)
             if new_user:
-                await message.author.kick(reason="New user (less than 60 seconds old) posted invite.")
+                await self.bot.mod_actions.kick(message.author,
+                                                reason="New user (less than 60 seconds old) posted invite.")
                 LOG.info(f"User {message.author} kicked for posting invite within 60 seconds of joining.")
                 user_fate = UserFate.KICK_NEW
 
             # Ban the user if necessary (performance)
             if filter_settings['banLimit'] > 0 and (record['offenseCount'] >= filter_settings['banLimit']):
-                await message.author.ban(
+                await self.bot.mod_actions.ban(
+                    message.guild, message.author,
                     reason=f"[AUTOMATIC BAN - AntiSpam Plugin] User sent {filter_settings['banLimit']} "
                            f"unauthorized invites in a {filter_settings['minutes']} minute period.",
                     delete_message_days=0)
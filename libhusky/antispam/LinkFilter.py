@@ -145,10 +145,11 @@ class LinkFilter(AntiSpamModule):
 
             # And then ban at max
             if cooldown_record['totalLinks'] >= cooldown_config['totalBeforeBan']:
-                await message.author.ban(reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
-                f"{cooldown_config['totalBeforeBan']} or more links in a "
-                f"{cooldown_config['minutes']} minute period.",
-                                         delete_message_days=1)
+                await self.bot.mod_actions.ban(message.guild, message.author,
+                                               reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
+                                                      f"{cooldown_config['totalBeforeBan']} or more links in a "
+                                                      f"{cooldown_config['minutes']} minute period.",
+                                               delete_message_days=1)
 
                 # And purge their record, it's not needed anymore
                 del self._events[message.author.id]
@@ -158,10 +159,7 @@ class LinkFilter(AntiSpamModule):
         if cooldown_config['linkWarnLimit'] > 0 and (len(regex_matches) > cooldown_config['linkWarnLimit']):
 
             # First and foremost, delete the message
-            try:
-                await message.delete()
-            except discord.NotFound:
-                LOG.warning("Message was deleted before AS could handle it.")
+            await self.bot.mod_actions.delete_message(message)
 
             # Add the user to the warning table if they're not already there
             if cooldown_record['offenseCount'] == 0:
@@ -196,11 +194,12 @@ class LinkFilter(AntiSpamModule):
 
             # If the user is over the ban limit, get rid of them.
             if cooldown_record['offenseCount'] >= cooldown_config['banLimit']:
-                await message.author.ban(reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
-                f"{cooldown_config['banLimit']} messages containing "
-                f"{cooldown_config['linkWarnLimit']} or more links in a "
-                f"{cooldown_config['minutes']} minute period.",
-                                         delete_message_days=1)
+                await self.bot.mod_actions.ban(message.guild, message.author,
+                                               reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
+                                                      f"{cooldown_config['banLimit']} messages containing "
+                                                      f"{cooldown_config['linkWarnLimit']} or more links in a "
+                                                      f"{cooldown_config['minutes']} minute period.",
+                                               delete_message_days=1)
 
                 # And purge their record, it's not needed anymore
                 del self._events[message.author.id]
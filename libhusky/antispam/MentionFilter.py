@@ -80,10 +80,7 @@ class MentionFilter(AntiSpamModule):
             cooldown_record['offenseCount'] += len(message.mentions)
 
         if ping_config['soft'] is not None and len(message.mentions) >= ping_config['soft']:
-            try:
-                await message.delete()
-            except discord.NotFound:
-                LOG.warning("Message already deleted before AS could handle it (censor?).")
+            await self.bot.mod_actions.delete_message(message)
 
             await message.channel.send(embed=discord.Embed(
                 title=Emojis.NO_ENTRY + " Mass Ping Blocked",
@@ -103,7 +100,8 @@ class MentionFilter(AntiSpamModule):
 
         if ping_config['hard'] is not None:
             if len(message.mentions) >= ping_config['hard']:
-                await message.author.ban(
+                await self.bot.mod_actions.ban(
+                    message.guild, message.author,
                     delete_message_days=0,
                     reason="[AUTOMATIC BAN - AntiSpam Module] Multi-pinged over guild ban limit."
                 )
@@ -112,7 +110,8 @@ class MentionFilter(AntiSpamModule):
 
             if cooldown_record:
                 if cooldown_record['offenseCount'] >= ping_config['hard']:
-                    await message.author.ban(
+                    await self.bot.mod_actions.ban(
+                        message.guild, message.author,
                         delete_message_days=0,
                         reason=f"[AUTOMATIC BAN - AntiSpam Module] Pinged over guild ban limit in "
                         f"{ping_config['seconds']} seconds."
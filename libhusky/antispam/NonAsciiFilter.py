@@ -99,7 +99,7 @@ class NonAsciiFilter(AntiSpamModule):
         if nonascii_percentage > check_config['nonAsciiDelete']:
             LOG.info(f"Deleted message containing non-ascii percentage over threshold of "
                      f"{check_config['nonAsciiDelete']}: {nonascii_percentage}")
-            await message.delete()
+            await self.bot.mod_actions.delete_message(message)
 
         # Message is now over threshold, get/create their cooldown record.
         cooldown_record = self._events.setdefault(message.author.id, {
@@ -143,10 +143,11 @@ class NonAsciiFilter(AntiSpamModule):
             await log_channel.send(embed=embed)
 
         if cooldown_record['offenseCount'] >= check_config['banLimit']:
-            await message.author.ban(reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent {check_config['banLimit']} "
-                                            f"messages over the non-ASCII threshold in a {check_config['minutes']} "
-                                            f"minute period.",
-                                     delete_message_days=1)
+            await self.bot.mod_actions.ban(message.guild, message.author,
+                                           reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
+                                                  f"{check_config['banLimit']} messages over the non-ASCII threshold "
+                                                  f"in a {check_config['minutes']} minute period.",
+                                           delete_message_days=1)
 
             # And purge their record, it's not needed anymore
             del self._events[message.author.id]
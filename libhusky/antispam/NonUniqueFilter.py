@@ -1,6 +1,7 @@
 #   This Source Code Form is "Incompatible With Secondary Licenses", as
 #   defined by the Mozilla Public License, v. 2.0.
 
+import asyncio
 import datetime
 import logging
 from difflib import SequenceMatcher
@@ -8,6 +9,7 @@ from difflib import SequenceMatcher
 import discord
 from discord.ext import commands
 
+from libhusky import HuskyCompute
 from libhusky import HuskyUtils
 from libhusky.HuskyStatics import *
 from libhusky.antispam.__init__ import AntiSpamModule
@@ -87,20 +89,33 @@ class NonUniqueFilter(AntiSpamModule):
         })
         message_cache = cooldown_record['messageCache']  # type: dict
 
-        for s_message in message_cache.keys():
-            diff = SequenceMatcher(None, s_message.lower(), message.content.lower()).ratio()
+        # Comparisons get expensive with long messages and big caches, so these may run off the loop. Keys are
+        # snapshotted, as other messages from this user can change the cache while this one waits.
+        content = message.content.lower()
+        candidates = list(message_cache.keys())
 
-            if diff >= nonunique_config['threshold']:
-                LOG.info(f"Message from {message.author} is too similar to past message, strike added. "
-                         f"Similarity = {diff:.3f}")
-                message_cache[s_message] += 1
-                break
+        try:
+            (index, diff) = await self.bot.compute.run(
+                HuskyCompute.best_sequence_match, candidates, content, nonunique_config['threshold'],
+                cost=HuskyCompute.estimate_best_sequence_match(candidates, content),
+                message=message
+            )
+        except asyncio.TimeoutError:
+            LOG.warning(f"Gave up comparing message {message.id} from {message.author} to past messages.")
+            return
+
+        if index is not None:
+            LOG.info(f"Message from {message.author} is too similar to past message, strike added. "
+                     f"Similarity = {diff:.3f}")
+
+            if candidates[index] in message_cache:
+                message_cache[candidates[index]] += 1
         else:
             while len(message_cache) >= nonunique_config['cacheSize']:
                 # Delete the first item in the cache, until the cache is under min size.
                 del message_cache[list(message_cache.keys())[0]]
 
-            message_cache[message.content.lower()] = 0
+            message_cache[content] = 0
 
         total_infractions = sum(message_cache.values())
 
@@ -134,10 +149,11 @@ class NonUniqueFilter(AntiSpamModule):
             cooldown_record['wasntWarned'] = False
 
         elif total_infractions == nonunique_config['banLimit']:
-            await message.author.ban(reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
-                                            f"{nonunique_config['banLimit']} nonunique messages in a "
-                                            f"{nonunique_config['minutes']} minute period.",
-                                     delete_message_days=1)
+            await self.bot.mod_actions.ban(message.guild, message.author,
+                                           reason=f"[AUTOMATIC BAN - AntiSpam Module] User sent "
+                                                  f"{nonunique_config['banLimit']} nonunique messages in a "
+                                                  f"{nonunique_config['minutes']} minute period.",
+                                           delete_message_days=1)
 
             del self._events[message.author.id]
 
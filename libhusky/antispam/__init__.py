@@ -1,4 +1,8 @@
+import collections
+import datetime
 import inspect
+import time
+import types
 from abc import abstractmethod
 
 import discord
@@ -6,6 +10,116 @@ from discord.ext import commands
 from discord.ext.commands import MissingPermissions, CogMeta
 
 
+class ModuleStats:
+    """
+    Rolling performance accounting for a single loaded AntiSpam module.
+
+    Every invocation of a module's `process_message` is recorded here with its wall-clock latency, the time it spent
+    actually holding the event loop (its "CPU" cost, excluding time spent awaiting I/O), and whether it raised. Only
+    the last `window` invocations are kept for percentile and error rate calculations, so a module that misbehaved an
+    hour ago does not stay penalized forever.
+
+    The circuit breaker state for the module also lives here. A tripped module is skipped by the AntiSpam plugin until
+    `tripped_until` has passed.
+    """
+
+    def __init__(self, window: int = 500):
+        self.calls = 0
+        self.errors = 0
+        self.trip_count = 0
+        self.tripped_until = None  # type: datetime.datetime
+        self.trip_reason = None
+
+        self._latencies = collections.deque(maxlen=window)
+        self._cpu_times = collections.deque(maxlen=window)
+        self._failures = collections.deque(maxlen=window)
+
+    def record(self, latency: float, cpu_time: float, errored: bool):
+        self.calls += 1
+        self.errors += int(errored)
+
+        self._latencies.append(latency)
+        self._cpu_times.append(cpu_time)
+        self._failures.append(errored)
+
+    @staticmethod
+    def _percentile(samples, pct: float):
+        if not samples:
+            return 0.0
+
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+    def latency_percentile(self, pct: float) -> float:
+        return self._percentile(self._latencies, pct)
+
+    def cpu_percentile(self, pct: float) -> float:
+        return self._percentile(self._cpu_times, pct)
+
+    def window_size(self) -> int:
+        return len(self._failures)
+
+    def error_rate(self) -> float:
+        if not self._failures:
+            return 0.0
+
+        return sum(self._failures) / len(self._failures)
+
+    def is_tripped(self) -> bool:
+        return self.tripped_until is not None and datetime.datetime.utcnow() < self.tripped_until
+
+    def trip(self, cooldown_seconds: int, reason: str):
+        self.trip_count += 1
+        self.trip_reason = reason
+        self.tripped_until = datetime.datetime.utcnow() + datetime.timedelta(seconds=cooldown_seconds)
+
+    def reset_breaker(self):
+        """
+        Close the breaker, and forget the rolling window so the module isn't immediately re-tripped by old samples.
+        """
+        self.tripped_until = None
+        self.trip_reason = None
+
+        self._latencies.clear()
+        self._cpu_times.clear()
+        self._failures.clear()
+
+
+@types.coroutine
+def measure_loop_time(coro, cell: list):
+    """
+    Drive a coroutine to completion, adding the time each step spends running on the event loop to cell[0].
+
+    Plain wall-clock timing of a coroutine counts time spent waiting on Discord, which says nothing about how much a
+    module is hurting everyone else. Timing each individual send() into the coroutine only counts the time it held the
+    loop, which is the cost that actually delays other events.
+
+    :param coro: The coroutine to run.
+    :param cell: A single-element list that will be incremented with the time (in seconds) spent on the loop.
+    :return: Returns whatever the coroutine returned.
+    """
+    iterator = coro.__await__()
+    send_value, throw_value = None, None
+
+    while True:
+        step_start = time.perf_counter()
+
+        try:
+            if throw_value is not None:
+                yielded = iterator.throw(throw_value)
+            else:
+                yielded = iterator.send(send_value)
+        except StopIteration as result:
+            return result.value
+        finally:
+            cell[0] += time.perf_counter() - step_start
+
+        try:
+            send_value, throw_value = (yield yielded), None
+        except BaseException as e:
+            send_value, throw_value = None, e
+
+
 class AntiSpamModule(commands.Group, metaclass=CogMeta):
     """
     Base module for AntiSpam Modules.
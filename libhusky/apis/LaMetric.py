@@ -1,16 +1,20 @@
+import asyncio
+import logging
+import time
+
 import aiohttp
 
-APP_BASE = "https://developer.lametric.com/api/v1/dev/widget/update/com.lametric.{app_id}"
+from libhusky import HuskyMetrics
+from libhusky.HuskyHTTPClient import HTTPClient
 
+LOG = logging.getLogger("HuskyBot.API.LaMetric")
 
-class LaMetricApi:
-    def __init__(self, loop):
-        self.__async_loop__ = loop
+APP_BASE = "https://developer.lametric.com/api/v1/dev/widget/update/com.lametric.{app_id}"
 
-        self._http_client = aiohttp.ClientSession(loop=loop)
 
-    def cleanup(self):
-        self.__async_loop__.create_task(self._http_client.close())
+class LaMetricApi:
+    def __init__(self, http_client: HTTPClient):
+        self._http_client = http_client
 
     async def push(self, app_id: str, data: dict, access_token: str):
         headers = {
@@ -19,7 +23,138 @@ class LaMetricApi:
             "Cache-Control": "no-cache"
         }
 
-        return await self._http_client.post(APP_BASE.format(app_id=app_id), json=data, headers=headers)
+        # Pushes replace the app's frames outright, so they're safe to retry.
+        async with self._http_client.request("POST", APP_BASE.format(app_id=app_id), json=data, headers=headers,
+                                             retries=2) as response:
+            await response.read()
+
+        return response
+
+
+PUSHES = HuskyMetrics.get_registry().counter(
+    "husky_lametric_pushes_total", "LaMetric device updates, by result (sent, failed, coalesced or unchanged).",
+    ("result",)
+)
+
+
+class _DevicePushState:
+    __slots__ = ('pending', 'last_data', 'last_sent', 'failures', 'retry_at', 'task')
+
+    def __init__(self):
+        # (app_id, access_token, data) for the newest update that hasn't been sent yet.
+        self.pending = None
+
+        # The last data the device accepted, so unchanged updates can be skipped.
+        self.last_data = None
+
+        # time.monotonic() of the last push attempt.
+        self.last_sent = 0
+
+        self.failures = 0
+        self.retry_at = 0
+
+        self.task = None  # type: asyncio.Task
+
+
+class PushCoalescer:
+    """
+    Pushes updates to many LaMetric devices without flooding any of them.
+
+    Updates are queued per device, and only the newest one is ever sent: a device gets at most one push per interval,
+    carrying whatever the latest value was by then. An update identical to the one the device already shows is dropped.
+    Every device is pushed to from its own task, so one slow device doesn't hold up the rest.
+
+    A device that fails (an error status, or no response at all) is backed off exponentially before it's tried again,
+    so a device with a revoked token doesn't get hammered on every update.
+    """
+
+    def __init__(self, api: LaMetricApi, loop: asyncio.AbstractEventLoop, interval: float = 10,
+                 backoff_base: float = 30, backoff_max: float = 1800):
+        """
+        :param api: The API to push through.
+        :param loop: The loop to run push tasks on.
+        :param interval: The minimum number of seconds between pushes to any one device.
+        :param backoff_base: How long to wait after a device's first failure, in seconds. Doubles with every failure.
+        :param backoff_max: The longest a failing device is ever backed off for, in seconds.
+        """
+        self._api = api
+        self._loop = loop
+        self._interval = interval
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+
+        # { device_id: _DevicePushState }
+        self._devices = {}
+
+    def submit(self, device_id: str, app_id: str, access_token: str, data: dict):
+        """
+        Queue an update for a device, replacing any update still waiting to be sent to it.
+        """
+        state = self._devices.setdefault(device_id, _DevicePushState())
+
+        if state.pending is not None:
+            PUSHES.labels("coalesced").inc()
+
+        state.pending = (app_id, access_token, data)
+
+        if state.task is None or state.task.done():
+            state.task = self._loop.create_task(self._run(device_id, state))
+
+    def forget(self, device_id: str):
+        """
+        Drop a device's queued update (and stop retrying it), such as when it's been removed.
+        """
+        state = self._devices.pop(device_id, None)
+
+        if state is not None and state.task is not None:
+            state.task.cancel()
+
+    def cancel(self):
+        for state in self._devices.values():
+            if state.task is not None:
+                state.task.cancel()
+
+        self._devices = {}
+
+    async def _run(self, device_id: str, state: _DevicePushState):
+        while state.pending is not None:
+            delay = max(state.last_sent + self._interval, state.retry_at) - time.monotonic()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            (app_id, access_token, data) = state.pending
+            state.pending = None
+
+            if data == state.last_data:
+                PUSHES.labels("unchanged").inc()
+                continue
+
+            state.last_sent = time.monotonic()
+
+            try:
+                response = await self._api.push(app_id, data, access_token)
+                error = None if 200 <= response.status < 300 else f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                error = type(ex).__name__
+
+            if error is None:
+                PUSHES.labels("sent").inc()
+                state.last_data = data
+                state.failures = 0
+                state.retry_at = 0
+                continue
+
+            PUSHES.labels("failed").inc()
+            state.failures += 1
+            backoff = min(self._backoff_max, self._backoff_base * (2 ** (state.failures - 1)))
+            state.retry_at = time.monotonic() + backoff
+
+            LOG.warning(f"Failed to push to LaMetric device {device_id} ({error}), backing off for {backoff} seconds.")
+
+            # Retry with this update, unless a newer one came in while it was being sent.
+            if state.pending is None:
+                state.pending = (app_id, access_token, data)
 
 
 def build_data(icon: str, text: str) -> dict:
@@ -0,0 +1,248 @@
+import asyncio
+import logging
+
+import discord
+from discord.ext import commands
+from discord.guild import BanEntry
+
+LOG = logging.getLogger("HuskyBot.Managers.BanManager")
+
+# How long to wait before trying again to load a guild's bans, after a failed load (in seconds).
+BAN_LOAD_RETRY_DELAY = 300
+
+
+class BanManager:
+    """
+    The Ban Manager keeps an in-memory index of every ban on every guild the bot can see bans for.
+
+    Asking Discord for a guild's ban list downloads the *entire* list every time (API v7 has no paging for bans), which
+    gets very expensive in guilds with tens of thousands of bans (especially during raid cleanup, where it'd be done
+    once per ban). Instead, the ban list is downloaded once at startup, and then kept current from the gateway's
+    ban/unban events. After that, checking whether a user is banned is a dictionary lookup.
+
+    Until a guild's ban list has loaded successfully, its index can't be trusted to be complete. Lookups for that guild
+    ask Discord about the single ban instead, and the load is retried every few minutes.
+
+    Bans that arrive over the gateway don't carry a reason. Those are looked up lazily from the audit log entry for
+    that specific ban, and cached once found.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self._bot = bot
+
+        # { guild_id: { user_id: BanEntry } }
+        self._bans = {}
+
+        # { guild_id: asyncio.Event } set once the initial load for that guild has been attempted.
+        self._load_attempted = {}
+
+        # Guilds whose index is complete, because their ban list was loaded successfully.
+        self._loaded = set()
+
+        # { guild_id: asyncio.Task } for loads waiting to be retried.
+        self._retries = {}
+
+        # { guild_id: set(user_id) } for bans whose reason hasn't been fetched from the audit log yet.
+        self._unresolved = {}
+
+        # { guild_id: set(user_id) } for users unbanned while the initial load was still running.
+        self._load_unbans = {}
+
+        self._bot.add_listener(self.on_member_ban, "on_member_ban")
+        self._bot.add_listener(self.on_member_unban, "on_member_unban")
+        self._bot.add_listener(self.on_guild_join, "on_guild_join")
+        self._bot.add_listener(self.on_guild_remove, "on_guild_remove")
+
+        self.__task__ = self._bot.loop.create_task(self.load_all())
+
+        LOG.info("Manager load complete.")
+
+    async def load_all(self):
+        await self._bot.wait_until_ready()
+
+        for guild in self._bot.guilds:
+            await self.load_guild(guild)
+
+    async def load_guild(self, guild: discord.Guild):
+        """
+        Download a guild's ban list into the index.
+
+        If the bot can't see bans on this guild, the guild is left out of the index. If the download fails, it's
+        retried later - until then, lookups for this guild go to Discord.
+
+        :param guild: The guild to load bans for.
+        """
+        attempted = self._load_attempted.setdefault(guild.id, asyncio.Event())
+
+        if guild.id in self._loaded or guild.id in self._load_unbans:
+            # Already loaded, or being loaded right now.
+            return
+
+        if not guild.me.guild_permissions.ban_members:
+            LOG.warning(f"Not loading bans for guild {guild.name}, as the bot is missing BAN_MEMBERS.")
+            attempted.set()
+            return
+
+        index = self._bans.setdefault(guild.id, {})
+        load_unbans = self._load_unbans.setdefault(guild.id, set())
+
+        try:
+            bans = await guild.bans()
+        except discord.HTTPException as e:
+            LOG.error(f"Failed to load bans for guild {guild.name}: {e}. Retrying in {BAN_LOAD_RETRY_DELAY} seconds.")
+            self._retries[guild.id] = self._bot.loop.create_task(self._retry_load(guild))
+            return
+        finally:
+            self._load_unbans.pop(guild.id, None)
+            attempted.set()
+
+        for entry in bans:
+            # Users unbanned while the list was downloading may still be on it.
+            if entry.user.id not in load_unbans:
+                index[entry.user.id] = entry
+
+        self._loaded.add(guild.id)
+        LOG.info(f"Loaded {len(index)} bans for guild {guild.name}.")
+
+    async def _retry_load(self, guild: discord.Guild):
+        await asyncio.sleep(BAN_LOAD_RETRY_DELAY)
+        self._retries.pop(guild.id, None)
+
+        if self._bot.get_guild(guild.id) is not None:
+            await self.load_guild(guild)
+
+    async def get(self, guild: discord.Guild, user_id: int):
+        """
+        Get the ban entry for a user, or None if they aren't banned.
+
+        If the index is still loading for this guild, this will wait for the load to complete. If the ban's reason
+        hasn't been looked up yet, it will be fetched before returning.
+
+        :param guild: The guild to check.
+        :param user_id: The ID of the user to check.
+        :return: A BanEntry, or None.
+        """
+        await self.wait_until_loaded(guild)
+
+        if guild.id not in self._loaded:
+            return await self._fetch_ban(guild, user_id)
+
+        entry = self._bans.get(guild.id, {}).get(user_id)
+
+        if entry is not None and user_id in self._unresolved.get(guild.id, set()):
+            entry = await self.resolve_reason(guild, entry.user)
+
+        return entry
+
+    async def is_banned(self, guild: discord.Guild, user_id: int) -> bool:
+        await self.wait_until_loaded(guild)
+
+        if guild.id not in self._loaded:
+            return await self._fetch_ban(guild, user_id) is not None
+
+        return user_id in self._bans.get(guild.id, {})
+
+    async def wait_until_loaded(self, guild: discord.Guild):
+        """
+        Wait until the first attempt to load a guild's bans has finished. The load may not have succeeded.
+        """
+        await self._load_attempted.setdefault(guild.id, asyncio.Event()).wait()
+
+    async def _fetch_ban(self, guild: discord.Guild, user_id: int):
+        """
+        Ask Discord for a single ban, for guilds whose index isn't complete.
+        """
+        try:
+            return await guild.fetch_ban(discord.Object(id=user_id))
+        except discord.NotFound:
+            return None
+
+    def ban_count(self, guild: discord.Guild) -> int:
+        return len(self._bans.get(guild.id, {}))
+
+    async def resolve_reason(self, guild: discord.Guild, user: discord.User):
+        """
+        Look up the reason for a specific ban from the guild's audit log, and store it in the index.
+
+        The audit log entry for a ban may not exist yet when the gateway event arrives, so this will retry briefly. If
+        the audit log can't be read (or never shows the ban), the single ban entry is requested directly instead.
+
+        :param guild: The guild the ban happened on.
+        :param user: The user that was banned.
+        :return: The (now resolved) BanEntry, or None if the user is not banned.
+        """
+        reason = None
+        found = False
+
+        try:
+            for attempt in range(3):
+                async for log_entry in guild.audit_logs(action=discord.AuditLogAction.ban, limit=10):
+                    if log_entry.target is not None and log_entry.target.id == user.id:
+                        reason = log_entry.reason
+                        found = True
+                        break
+
+                if found:
+                    break
+
+                await asyncio.sleep(0.5 * (attempt + 1))
+        except discord.Forbidden:
+            LOG.debug("Can't read the audit log to find a ban reason. Falling back to the ban entry.")
+
+        if not found:
+            try:
+                reason = (await guild.fetch_ban(user)).reason
+            except discord.NotFound:
+                self._discard(guild.id, user.id)
+                return None
+
+        self._unresolved.get(guild.id, set()).discard(user.id)
+
+        # The user may have been unbanned while we were looking.
+        if user.id not in self._bans.get(guild.id, {}):
+            return None
+
+        entry = BanEntry(reason=reason, user=user)
+        self._bans[guild.id][user.id] = entry
+
+        return entry
+
+    def _discard(self, guild_id: int, user_id: int):
+        self._bans.get(guild_id, {}).pop(user_id, None)
+        self._unresolved.get(guild_id, set()).discard(user_id)
+
+    async def on_member_ban(self, guild: discord.Guild, user: discord.User):
+        self._bans.setdefault(guild.id, {})[user.id] = BanEntry(reason=None, user=user)
+        self._unresolved.setdefault(guild.id, set()).add(user.id)
+        self._load_unbans.get(guild.id, set()).discard(user.id)
+
+    async def on_member_unban(self, guild: discord.Guild, user: discord.User):
+        self._discard(guild.id, user.id)
+
+        if guild.id in self._load_unbans:
+            self._load_unbans[guild.id].add(user.id)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        await self.load_guild(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._bans.pop(guild.id, None)
+        self._load_attempted.pop(guild.id, None)
+        self._loaded.discard(guild.id)
+        self._unresolved.pop(guild.id, None)
+
+        retry = self._retries.pop(guild.id, None)
+
+        if retry is not None:
+            retry.cancel()
+
+    def cleanup(self):
+        self.__task__.cancel()
+
+        for retry in self._retries.values():
+            retry.cancel()
+
+        self._bot.remove_listener(self.on_member_ban, "on_member_ban")
+        self._bot.remove_listener(self.on_member_unban, "on_member_unban")
+        self._bot.remove_listener(self.on_guild_join, "on_guild_join")
+        self._bot.remove_listener(self.on_guild_remove, "on_guild_remove")
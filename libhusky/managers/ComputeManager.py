@@ -0,0 +1,216 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import discord
+from discord.ext import commands
+
+from libhusky import HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.Managers.ComputeManager")
+
+JOB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1, 5)
+
+JOBS = HuskyMetrics.get_registry().counter(
+    "husky_compute_jobs_total", "CPU-bound jobs run by the compute manager, by job and result.", ("job", "result")
+)
+JOB_LATENCY = HuskyMetrics.get_registry().histogram(
+    "husky_compute_job_seconds", "Time taken to get the result of CPU-bound jobs, by job and where they ran.",
+    ("job", "mode"), JOB_BUCKETS
+)
+
+
+class ComputeManager:
+    """
+    The Compute Manager runs CPU-bound jobs (regex batches, fuzzy matching, ...) without stalling the event loop.
+
+    Jobs that are expected to be quick are just run inline, as sending them to another process would cost more than
+    running them. Anything bigger goes to a small pool of worker processes, which is only started the first time it's
+    needed. Callers estimate a job's cost themselves (see HuskyCompute for the jobs and their estimates).
+
+    Offloaded jobs have a timeout, after which the pool is torn down and rebuilt - a worker stuck on a pathological
+    input would otherwise hold its slot forever. Jobs can also be tied to a message, in which case they're cancelled if
+    that message is deleted while they're waiting, as nobody needs their result anymore.
+    """
+
+    def __init__(self, bot: commands.Bot, workers: int = 2, inline_below: float = 1, timeout: float = 5):
+        """
+        :param bot: The bot to attach to.
+        :param workers: The number of worker processes.
+        :param inline_below: Jobs estimated to take less than this (in milliseconds) are run inline.
+        :param timeout: The default time an offloaded job may take, in seconds.
+        """
+        self._bot = bot
+        self._workers = workers
+        self._inline_below = inline_below
+        self._timeout = timeout
+
+        self._executor = None  # type: concurrent.futures.ProcessPoolExecutor
+
+        # { message_id: set(asyncio.Future) }, for offloaded jobs working on a message.
+        self._message_jobs = {}
+
+        # { asyncio.Future: ProcessPoolExecutor }, for every offloaded job still waiting on its result.
+        self._in_flight = {}
+
+        # Jobs abandoned because their pool was recycled under them. They fail with BrokenProcessPool, and are retried.
+        self._orphaned = set()
+
+        self._listeners = [
+            (self.on_raw_message_delete, "on_raw_message_delete"),
+            (self.on_raw_bulk_message_delete, "on_raw_bulk_message_delete")
+        ]
+
+        for (func, name) in self._listeners:
+            self._bot.add_listener(func, name)
+
+        LOG.info("Manager load complete.")
+
+    async def run(self, func, *args, cost: float = None, timeout: float = None, message: discord.Message = None):
+        """
+        Run a CPU-bound job, either inline or in a worker process depending on its cost.
+
+        :param func: The job to run. Must be a module-level function, and its arguments and result must be picklable.
+        :param args: The arguments to the job.
+        :param cost: The job's estimated run time in milliseconds, or None to always offload it.
+        :param timeout: How long (in seconds) an offloaded job may take. Defaults to the manager's timeout.
+        :param message: The message this job is about, if any. The job is cancelled if the message is deleted.
+        :raises asyncio.TimeoutError: If an offloaded job took too long.
+        :raises asyncio.CancelledError: If the message was deleted before the job finished.
+        :return: Whatever the job returned.
+        """
+        job = func.__name__
+        start = time.perf_counter()
+
+        if cost is not None and cost < self._inline_below:
+            result = func(*args)
+
+            JOBS.labels(job, "inline").inc()
+            JOB_LATENCY.labels(job, "inline").observe(time.perf_counter() - start)
+            return result
+
+        try:
+            try:
+                result = await self._offload(func, args, timeout or self._timeout, message)
+            except BrokenProcessPool:
+                # Most likely, a worker was killed because some other job timed out. This job did nothing wrong, so it
+                # gets one more go on the new pool.
+                result = await self._offload(func, args, timeout or self._timeout, message)
+        except asyncio.TimeoutError:
+            LOG.warning(f"Compute job {job} timed out after {timeout or self._timeout} seconds. Restarted the pool.")
+            JOBS.labels(job, "timeout").inc()
+            raise
+        except asyncio.CancelledError:
+            JOBS.labels(job, "cancelled").inc()
+            raise
+        except Exception:
+            JOBS.labels(job, "error").inc()
+            raise
+
+        JOBS.labels(job, "offloaded").inc()
+        JOB_LATENCY.labels(job, "offloaded").observe(time.perf_counter() - start)
+        return result
+
+    async def _offload(self, func, args, timeout: float, message: discord.Message):
+        executor = self._get_executor()
+
+        try:
+            future = asyncio.wrap_future(executor.submit(func, *args))
+        except BrokenProcessPool:
+            self._recycle(executor)
+            raise
+
+        self._in_flight[future] = executor
+
+        if message is not None:
+            self._message_jobs.setdefault(message.id, set()).add(future)
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # The worker may be stuck on this job for good. Recycle the pool this job ran on (not whichever is current
+            # by now), so that nothing else is lost to the stuck worker.
+            self._recycle(executor)
+            raise
+        except BrokenProcessPool:
+            self._recycle(executor)
+            raise
+        except asyncio.CancelledError:
+            if future in self._orphaned:
+                raise BrokenProcessPool("The compute pool was restarted while this job was running.")
+
+            raise
+        finally:
+            del self._in_flight[future]
+            self._orphaned.discard(future)
+
+            if message is not None:
+                jobs = self._message_jobs.get(message.id)
+
+                if jobs is not None:
+                    jobs.discard(future)
+
+                    if not jobs:
+                        del self._message_jobs[message.id]
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawned rather than forked, so workers don't inherit the bot's sockets, threads, or event loop.
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+            LOG.info(f"Started a compute pool with {self._workers} workers.")
+
+        return self._executor
+
+    def _recycle(self, executor: concurrent.futures.ProcessPoolExecutor = None):
+        """
+        Throw away a pool (by default, the current one), killing its workers. The next job will start a new pool.
+        """
+        executor = executor or self._executor
+
+        if executor is None:
+            return
+
+        if executor is self._executor:
+            self._executor = None
+
+        # Every other job on this pool is about to lose its worker. Rather than wait for the executor to notice (it
+        # doesn't always), they're failed here with BrokenProcessPool, which `run` retries on the new pool.
+        for (future, owner) in list(self._in_flight.items()):
+            if owner is executor and not future.done():
+                self._orphaned.add(future)
+                future.cancel()
+
+        # There's no public way to stop a job that's already running, so the workers have to be killed outright.
+        for process in list((executor._processes or {}).values()):
+            process.terminate()
+
+        # Shutting down without waiting closes the pool's pipes under its management thread, which then crashes. So
+        # the old pool is waited on, but from another thread.
+        asyncio.get_event_loop().run_in_executor(None, executor.shutdown)
+
+    def _cancel_message_jobs(self, message_id: int):
+        for future in self._message_jobs.pop(message_id, ()):
+            # A job already running in a worker runs to completion, but nothing waits for (or uses) its result.
+            future.cancel()
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self._cancel_message_jobs(payload.message_id)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self._cancel_message_jobs(message_id)
+
+    def cleanup(self):
+        for (func, name) in self._listeners:
+            self._bot.remove_listener(func, name)
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -1,4 +1,3 @@
-import asyncio
 import datetime
 import logging
 import random
@@ -7,7 +6,7 @@ import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
-from libhusky import HuskyConfig, HuskyData, HuskyUtils
+from libhusky import HuskyConfig, HuskyData, HuskyScheduler, HuskyUtils
 from libhusky.HuskyStatics import *
 
 GIVEAWAY_CONFIG_KEY = 'giveaways'
@@ -35,13 +34,23 @@ class GiveawayManager:
         # Random number generator
         self._rng = random.SystemRandom()
 
-        # We store all giveaways in a time-ordered cache list. Reading and working with the file directly is
-        # *generally* a bad idea.
+        # We store all giveaways in a cache list. Reading and working with the file directly is *generally* a bad idea.
         self.__cache__ = []
 
+        # Pending scheduled giveaway ends, keyed by registration message ID.
+        self._scheduler = HuskyScheduler.get_scheduler()
+        self._finish_tasks = {}
+
+        # Entrants for giveaways we've watched since they started, keyed by giveaway message ID. Giveaways that were
+        # loaded from file (or whose events we may have missed) aren't in here, and get sampled from the API instead.
+        self._entrants = {}
+
         self.load_giveaways_from_file()
 
-        self.__task__ = self.bot.loop.create_task(self.process_giveaways())
+        self.bot.add_listener(self.on_raw_reaction_add, "on_raw_reaction_add")
+        self.bot.add_listener(self.on_raw_reaction_remove, "on_raw_reaction_remove")
+        self.bot.add_listener(self.on_raw_reaction_clear, "on_raw_reaction_clear")
+        self.bot.add_listener(self.on_ready, "on_ready")
 
         LOG.info("Manager load complete.")
 
@@ -56,31 +65,26 @@ class GiveawayManager:
             giveaway = HuskyData.GiveawayObject(data=giveaway_raw)
 
             self.__cache__.append(giveaway)
+            self._schedule_finish(giveaway)
 
-    async def process_giveaways(self) -> None:
+    def _schedule_finish(self, giveaway: HuskyData.GiveawayObject) -> None:
         """
-        Process all pending giveaways.
+        Register a giveaway's end with the shared scheduler. Giveaways without an end time are never scheduled.
 
-        Iterate through the cache looking for any expired giveaway. This method will run about once every 0.5 seconds
-        as part of the bot's event loop. As a result, care must be taken to make sure this code exits quickly if nothing
-        needs to be done.
-        :return: Doesn't return.
+        :param giveaway: The giveaway to schedule.
         """
+        self._scheduler.cancel(self._finish_tasks.pop(giveaway.register_message_id, None))
 
-        while not self.bot.is_closed():
-            # This is what peak performance looks like, kids.
-            for giveaway in self.__cache__:
-                if giveaway.is_over():
-                    LOG.info(f"Found a scheduled giveaway for {giveaway.name} ending. Triggering...")
-                    await self.finish_giveaway(giveaway)
+        if giveaway.end_time is None:
+            return
 
-                # Because giveaways are sorted by finish date, if we encounter a giveaway that *isn't* over, we can
-                # assume there's nothing more to do, so we can exit the for loop entirely.
-                else:
-                    break
+        async def scheduled_finish():
+            LOG.info(f"Found a scheduled giveaway for {giveaway.name} ending. Triggering...")
+            await self.finish_giveaway(giveaway)
 
-            # Check again every half second
-            await asyncio.sleep(0.5)
+        self._finish_tasks[giveaway.register_message_id] = self._scheduler.schedule(
+            giveaway.end_time, scheduled_finish, name=f"giveaway-{giveaway.register_message_id}"
+        )
 
     async def finish_giveaway(self, giveaway: HuskyData.GiveawayObject) -> None:
         """
@@ -95,6 +99,9 @@ class GiveawayManager:
 
         wcl = "\n\nWinners will be contacted shortly."
 
+        # If this giveaway was ended early, it shouldn't run again when its scheduled time comes.
+        self._scheduler.cancel(self._finish_tasks.pop(giveaway.register_message_id, None))
+
         try:
             channel: discord.TextChannel = self.bot.get_channel(giveaway.register_channel_id)
             message: discord.Message = await channel.fetch_message(giveaway.register_message_id)
@@ -108,32 +115,16 @@ class GiveawayManager:
             self._giveaway_config.set(GIVEAWAY_CONFIG_KEY, self.__cache__)
             return
 
-        contending_users = []
-
-        for reaction in message.reactions:
-            if reaction.emoji != Emojis.GIVEAWAY:
-                continue
-
-            contending_users += await reaction.users().flatten()
-
-        LOG.info(f"{len(contending_users)} users joined the giveaway {giveaway.name}")
-
-        # Remove the bot
-        try:
-            contending_users.remove(self.bot.user)
-        except ValueError as _:
-            pass
-
-        winning_users = self._rng.sample(contending_users, min(giveaway.winner_count, len(contending_users)))
+        winning_users = await self.select_winners(giveaway, message)
         LOG.info(f"Winners for \"{giveaway.name}\": {winning_users}")
 
         if len(winning_users) == 1:
-            win_text = f"{f'Congratulations to our winner, {winning_users[0].mention}!'}{wcl}"
+            win_text = f"{f'Congratulations to our winner, <@{winning_users[0]}>!'}{wcl}"
         elif len(winning_users) == 2:
-            mc = f'Congratulations to our winners, {winning_users[0].mention} and {winning_users[1].mention}!'
+            mc = f'Congratulations to our winners, <@{winning_users[0]}> and <@{winning_users[1]}>!'
             win_text = f"{mc}{wcl}"
         elif len(winning_users) > 2:
-            win_csb = [u.mention for u in winning_users]
+            win_csb = [f"<@{u}>" for u in winning_users]
 
             win_text = f"Congratulations to our winners: {', '.join(win_csb[:-1])}, and {win_csb[-1:][0]}! {wcl}"
         else:
@@ -151,8 +142,69 @@ class GiveawayManager:
         if giveaway in self.__cache__:
             self.__cache__.remove(giveaway)
 
+        self._entrants.pop(giveaway.register_message_id, None)
         self._giveaway_config.set(GIVEAWAY_CONFIG_KEY, self.__cache__)
 
+    async def select_winners(self, giveaway: HuskyData.GiveawayObject, message: discord.Message) -> list:
+        """
+        Pick the winners of a giveaway, returning a list of user IDs.
+
+        If we've watched this giveaway since it started, the winners are drawn from the entrants we've tracked, with no
+        API calls. Otherwise, the reaction's users are streamed from the API and sampled as they arrive, so only the
+        winners themselves are ever held in memory.
+
+        :param giveaway: The giveaway to select winners for.
+        :param message: The giveaway's registration message.
+        :return: A list of up to `giveaway.winner_count` user IDs.
+        """
+        entrants = self._entrants.get(giveaway.register_message_id)
+
+        if entrants is not None:
+            LOG.info(f"{len(entrants)} users joined the giveaway {giveaway.name}")
+            return HuskyUtils.reservoir_sample(entrants, giveaway.winner_count, self._rng)
+
+        reaction = discord.utils.get(message.reactions, emoji=Emojis.GIVEAWAY)
+
+        if reaction is None:
+            return []
+
+        async def entrant_ids():
+            async for user in reaction.users():
+                if user.id != self.bot.user.id:
+                    yield user.id
+
+        LOG.info(f"Entrants for giveaway {giveaway.name} weren't tracked. Sampling ~{reaction.count} users from the "
+                 f"API instead.")
+        return await HuskyUtils.reservoir_sample_async(entrant_ids(), giveaway.winner_count, self._rng)
+
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        entrants = self._entrants.get(payload.message_id)
+
+        if entrants is None or str(payload.emoji) != Emojis.GIVEAWAY or payload.user_id == self.bot.user.id:
+            return
+
+        entrants.add(payload.user_id)
+
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        entrants = self._entrants.get(payload.message_id)
+
+        if entrants is None or str(payload.emoji) != Emojis.GIVEAWAY:
+            return
+
+        entrants.discard(payload.user_id)
+
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        entrants = self._entrants.get(payload.message_id)
+
+        if entrants is not None:
+            entrants.clear()
+
+    async def on_ready(self):
+        # A fresh READY (rather than a RESUME) means we may have missed reaction events. Stop trusting our counts.
+        if self._entrants:
+            LOG.warning("Gateway re-identified, so tracked giveaway entrants may be stale. Falling back to sampling.")
+            self._entrants.clear()
+
     async def start_giveaway(self, ctx: commands.Context, title: str, end_time: datetime.datetime,
                              winners: int) -> HuskyData.GiveawayObject:
 
@@ -184,6 +236,10 @@ class GiveawayManager:
         )
 
         message = await ctx.send(embed=giveaway_embed)
+
+        # Start tracking before anyone can possibly react.
+        self._entrants[message.id] = set()
+
         await message.add_reaction(Emojis.GIVEAWAY)
 
         giveaway = HuskyData.GiveawayObject()
@@ -193,12 +249,8 @@ class GiveawayManager:
         giveaway.register_channel_id = channel.id
         giveaway.register_message_id = message.id
 
-        pos = HuskyUtils.get_sort_index(self.__cache__, giveaway, 'end_time')
-
-        # note, we insert the giveaway, and sort. this is a rare operation, so a sort is "acceptable"
-        # Null-ending giveaways (usually impossible) will be placed at the very end.
-        self.__cache__.insert(pos, giveaway)
-        self.__cache__.sort(key=lambda g: g.end_time if g.end_time else 10 * 100)
+        self.__cache__.append(giveaway)
+        self._schedule_finish(giveaway)
         self._giveaway_config.set(GIVEAWAY_CONFIG_KEY, self.__cache__)
 
         return giveaway
@@ -230,8 +282,17 @@ class GiveawayManager:
         """
 
         self.__cache__.remove(giveaway)
+        self._scheduler.cancel(self._finish_tasks.pop(giveaway.register_message_id, None))
+        self._entrants.pop(giveaway.register_message_id, None)
         self._giveaway_config.set(GIVEAWAY_CONFIG_KEY, self.__cache__)
 
     def cleanup(self):
-        if self.__task__ is not None:
-            self.__task__.cancel()
+        for task in self._finish_tasks.values():
+            self._scheduler.cancel(task)
+
+        self._finish_tasks.clear()
+
+        self.bot.remove_listener(self.on_raw_reaction_add, "on_raw_reaction_add")
+        self.bot.remove_listener(self.on_raw_reaction_remove, "on_raw_reaction_remove")
+        self.bot.remove_listener(self.on_raw_reaction_clear, "on_raw_reaction_clear")
+        self.bot.remove_listener(self.on_ready, "on_ready")
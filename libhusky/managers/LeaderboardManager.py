@@ -0,0 +1,266 @@
+import asyncio
+import datetime
+import logging
+
+import discord
+
+from HuskyBot import HuskyBot
+from libhusky import HuskyConfig, HuskyUtils
+
+LEADERBOARD_CONFIG_KEY = 'ledgers'
+LOG = logging.getLogger("HuskyBot.Managers.LeaderboardManager")
+
+# Every window a member is ranked in. "day" and "week" reset at midnight UTC (weeks start on Monday).
+WINDOWS = ("day", "week", "all")
+
+
+def get_period(window: str, now: datetime.datetime = None) -> int:
+    """
+    Get an identifier for the period a window is currently in. When this changes, the window starts over.
+    """
+    today = (now or datetime.datetime.utcnow()).date()
+
+    if window == "day":
+        return today.toordinal()
+
+    if window == "week":
+        return today.toordinal() - today.weekday()
+
+    return 0
+
+
+class RankedCounter:
+    """
+    A set of per-user scores that can be ranked without sorting.
+
+    Alongside the scores themselves, this keeps a Fenwick tree of how many users hold each score. Incrementing a score,
+    finding a user's rank, and stepping down to the next score for a top-N listing are all O(log m), where m is the
+    highest score held (the tree doubles in size when it needs to).
+
+    Ranks are competition-style: users on the same score share a rank.
+    """
+    __slots__ = ('_scores', '_buckets', '_tree', '_size')
+
+    def __init__(self, scores: dict = None):
+        # { user_id: score }
+        self._scores = {}
+
+        # { score: set(user_id) }
+        self._buckets = {}
+
+        self._size = 64
+        self._tree = [0] * (self._size + 1)
+
+        for (user_id, score) in (scores or {}).items():
+            self.add(int(user_id), score)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def get(self, user_id: int) -> int:
+        return self._scores.get(user_id, 0)
+
+    def add(self, user_id: int, amount: int = 1):
+        old_score = self._scores.get(user_id, 0)
+        new_score = old_score + amount
+
+        if old_score:
+            self._remove_from_bucket(user_id, old_score)
+
+        if new_score <= 0:
+            self._scores.pop(user_id, None)
+            return
+
+        if new_score > self._size:
+            self._grow(new_score)
+
+        self._scores[user_id] = new_score
+        self._buckets.setdefault(new_score, set()).add(user_id)
+        self._update(new_score, 1)
+
+    def rank(self, user_id: int):
+        """
+        Get a user's rank (1 being the highest score), or None if they have no score.
+        """
+        score = self._scores.get(user_id)
+
+        if score is None:
+            return None
+
+        # Everyone with a strictly higher score is ahead of this user.
+        return len(self._scores) - self._prefix(score) + 1
+
+    def top(self, count: int) -> list:
+        """
+        Get the highest scoring users.
+
+        :param count: The number of users to return. Ties at the cutoff may push this over slightly.
+        :return: A list of (rank, user_id, score) tuples, highest score first. Ties are ordered by user ID.
+        """
+        results = []
+        remaining = len(self._scores)
+
+        while remaining > 0 and len(results) < count:
+            score = self._find(remaining)
+            users = self._buckets[score]
+            rank = len(results) + 1
+
+            for user_id in sorted(users):
+                results.append((rank, user_id, score))
+
+            remaining -= len(users)
+
+        return results
+
+    def to_data(self) -> dict:
+        return {str(user_id): score for (user_id, score) in self._scores.items()}
+
+    def _remove_from_bucket(self, user_id: int, score: int):
+        bucket = self._buckets[score]
+        bucket.discard(user_id)
+
+        if not bucket:
+            del self._buckets[score]
+
+        self._update(score, -1)
+
+    def _grow(self, score: int):
+        while self._size < score:
+            self._size *= 2
+
+        # Rebuild the tree in O(m) from the bucket sizes.
+        self._tree = [0] * (self._size + 1)
+
+        for (bucket_score, users) in self._buckets.items():
+            self._tree[bucket_score] += len(users)
+
+        for i in range(1, self._size + 1):
+            parent = i + (i & -i)
+
+            if parent <= self._size:
+                self._tree[parent] += self._tree[i]
+
+    def _update(self, score: int, delta: int):
+        while score <= self._size:
+            self._tree[score] += delta
+            score += score & -score
+
+    def _prefix(self, score: int) -> int:
+        """
+        Count users with a score of at most `score`.
+        """
+        total = 0
+
+        while score > 0:
+            total += self._tree[score]
+            score -= score & -score
+
+        return total
+
+    def _find(self, k: int) -> int:
+        """
+        Find the lowest score s such that at least k users have a score of at most s.
+        """
+        position = 0
+        step = self._size
+
+        while step:
+            if position + step <= self._size and self._tree[position + step] < k:
+                position += step
+                k -= self._tree[position]
+
+            step >>= 1
+
+        return position + 1
+
+
+class LeaderboardManager:
+    """
+    The Leaderboard Manager keeps a running ledger of how many messages each member has sent, for each leaderboard
+    window (see `WINDOWS`).
+
+    The ledger is updated as messages arrive, and kept ranked as it goes, so leaderboards never need to look at message
+    history. Writes to disk are batched: the ledger is only saved every so often (and on unload), no matter how busy
+    the guild gets.
+    """
+
+    def __init__(self, bot: HuskyBot, save_interval: int = 60):
+        self.bot = bot
+        self._leaderboard_config = HuskyConfig.get_config('leaderboards', create_if_nonexistent=True)
+        self._save_interval = save_interval
+
+        # { guild_id: { window: RankedCounter } }
+        self._ledgers = {}
+
+        # { guild_id: { window: period } } - the period each window's counter belongs to.
+        self._periods = {}
+
+        self._dirty = False
+
+        self.load_ledgers()
+
+        self.bot.add_listener(self.on_message, "on_message")
+        self.__task__ = self.bot.loop.create_task(self.autosave())
+
+        LOG.info("Manager load complete.")
+
+    def load_ledgers(self):
+        for (guild_id, windows) in self._leaderboard_config.get(LEADERBOARD_CONFIG_KEY, {}).items():
+            for (window, data) in windows.items():
+                if window not in WINDOWS:
+                    continue
+
+                self._ledgers.setdefault(int(guild_id), {})[window] = RankedCounter(data['scores'])
+                self._periods.setdefault(int(guild_id), {})[window] = data['period']
+
+    def save_ledgers(self):
+        self._dirty = False
+
+        self._leaderboard_config.set(LEADERBOARD_CONFIG_KEY, {
+            str(guild_id): {
+                window: {"period": self._periods[guild_id][window], "scores": counter.to_data()}
+                for (window, counter) in windows.items()
+            } for (guild_id, windows) in self._ledgers.items()
+        })
+
+    async def autosave(self):
+        while not self.bot.is_closed():
+            await asyncio.sleep(self._save_interval)
+
+            if self._dirty:
+                self.save_ledgers()
+
+    def get_ledger(self, guild_id: int, window: str) -> RankedCounter:
+        """
+        Get the ranked counter for a guild's leaderboard window, starting it over if its period has ended.
+
+        :param guild_id: The guild to get a ledger for.
+        :param window: One of `WINDOWS`.
+        :return: The window's RankedCounter.
+        """
+        period = get_period(window)
+        ledgers = self._ledgers.setdefault(guild_id, {})
+        periods = self._periods.setdefault(guild_id, {})
+
+        if periods.get(window) != period or window not in ledgers:
+            ledgers[window] = RankedCounter()
+            periods[window] = period
+            self._dirty = True
+
+        return ledgers[window]
+
+    async def on_message(self, message: discord.Message):
+        if not HuskyUtils.should_process_message(message):
+            return
+
+        for window in WINDOWS:
+            self.get_ledger(message.guild.id, window).add(message.author.id)
+
+        self._dirty = True
+
+    def cleanup(self):
+        self.__task__.cancel()
+        self.bot.remove_listener(self.on_message, "on_message")
+
+        if self._dirty:
+            self.save_ledgers()
@@ -0,0 +1,165 @@
+import asyncio
+import collections
+import logging
+
+import discord
+from discord.ext import commands
+
+LOG = logging.getLogger("HuskyBot.Managers.MemberCountManager")
+
+
+class MemberCountManager:
+    """
+    The Member Count Manager keeps running counts of every guild's members, broken down by status and by role.
+
+    Counts are taken once when a guild becomes available, and then kept current from member join, leave, and update
+    events, so reading them never involves walking the member list. Every so often, each guild is recounted from
+    scratch to correct any drift (from missed events, for example), and any drift found is logged.
+
+    These counts only cover members the bot has cached. For a guild's total, use `guild.member_count`, which comes
+    from Discord and is exact even when the member list isn't fully loaded.
+    """
+
+    def __init__(self, bot: commands.Bot, reconcile_interval: int = 600):
+        self._bot = bot
+        self._reconcile_interval = reconcile_interval
+
+        # { guild_id: Counter(discord.Status) }
+        self._statuses = {}
+
+        # { guild_id: Counter(role_id) }
+        self._roles = {}
+
+        self._listeners = [
+            (self.on_ready, "on_ready"),
+            (self.on_guild_available, "on_guild_available"),
+            (self.on_guild_join, "on_guild_join"),
+            (self.on_guild_remove, "on_guild_remove"),
+            (self.on_guild_role_delete, "on_guild_role_delete"),
+            (self.on_member_join, "on_member_join"),
+            (self.on_member_remove, "on_member_remove"),
+            (self.on_member_update, "on_member_update")
+        ]
+
+        for (func, name) in self._listeners:
+            self._bot.add_listener(func, name)
+
+        self.__task__ = self._bot.loop.create_task(self.reconcile_loop())
+
+        LOG.info("Manager load complete.")
+
+    def status_count(self, guild: discord.Guild, status: discord.Status) -> int:
+        return self._statuses.get(guild.id, {}).get(status, 0)
+
+    def get_status_counts(self, guild: discord.Guild) -> dict:
+        """
+        Get the number of members on a guild with each status. Every status is present, even if nobody has it.
+
+        :param guild: The guild to get counts for.
+        :return: A dict of discord.Status to member count.
+        """
+        statuses = self._statuses.get(guild.id, {})
+
+        return {status: statuses.get(status, 0) for status in discord.Status}
+
+    def role_count(self, guild: discord.Guild, role: discord.Role) -> int:
+        return self._roles.get(guild.id, {}).get(role.id, 0)
+
+    def count_guild(self, guild: discord.Guild):
+        """
+        (Re)count a guild's members from scratch.
+
+        :param guild: The guild to count.
+        :return: True if the new counts differ from the running counts, False otherwise.
+        """
+        statuses = collections.Counter()
+        roles = collections.Counter()
+
+        for member in guild.members:  # type: discord.Member
+            statuses[member.status] += 1
+
+            for role in member.roles:
+                roles[role.id] += 1
+
+        drifted = False
+        if guild.id in self._statuses:
+            # Unary plus drops zeroed entries, so buckets that have emptied out don't count as drift.
+            drifted = statuses != +self._statuses[guild.id] or roles != +self._roles[guild.id]
+
+        self._statuses[guild.id] = statuses
+        self._roles[guild.id] = roles
+
+        return drifted
+
+    async def reconcile_loop(self):
+        await self._bot.wait_until_ready()
+
+        while not self._bot.is_closed():
+            await asyncio.sleep(self._reconcile_interval)
+
+            for guild in self._bot.guilds:
+                if self.count_guild(guild):
+                    LOG.warning(f"Member counts for guild {guild.name} had drifted, and have been corrected.")
+
+                # Give everything else a turn between guilds.
+                await asyncio.sleep(0)
+
+    async def on_ready(self):
+        for guild in self._bot.guilds:
+            self.count_guild(guild)
+
+    async def on_guild_available(self, guild: discord.Guild):
+        self.count_guild(guild)
+
+    async def on_guild_join(self, guild: discord.Guild):
+        self.count_guild(guild)
+
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._statuses.pop(guild.id, None)
+        self._roles.pop(guild.id, None)
+
+    async def on_guild_role_delete(self, role: discord.Role):
+        self._roles.get(role.guild.id, {}).pop(role.id, None)
+
+    async def on_member_join(self, member: discord.Member):
+        statuses = self._statuses.get(member.guild.id)
+
+        # Guilds that haven't been counted yet will pick this member up when they are.
+        if statuses is None:
+            return
+
+        statuses[member.status] += 1
+        self._roles[member.guild.id].update(role.id for role in member.roles)
+
+    async def on_member_remove(self, member: discord.Member):
+        statuses = self._statuses.get(member.guild.id)
+
+        if statuses is None:
+            return
+
+        statuses[member.status] -= 1
+        self._roles[member.guild.id].subtract(role.id for role in member.roles)
+
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        statuses = self._statuses.get(after.guild.id)
+
+        if statuses is None:
+            return
+
+        if before.status != after.status:
+            statuses[before.status] -= 1
+            statuses[after.status] += 1
+
+        if before.roles != after.roles:
+            before_roles = set(role.id for role in before.roles)
+            after_roles = set(role.id for role in after.roles)
+
+            roles = self._roles[after.guild.id]
+            roles.subtract(before_roles - after_roles)
+            roles.update(after_roles - before_roles)
+
+    def cleanup(self):
+        self.__task__.cancel()
+
+        for (func, name) in self._listeners:
+            self._bot.remove_listener(func, name)
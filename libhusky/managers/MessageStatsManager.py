@@ -0,0 +1,345 @@
+import array
+import asyncio
+import bisect
+import datetime
+import json
+import logging
+import os
+
+import discord
+from discord.ext import commands
+
+LOG = logging.getLogger("HuskyBot.Managers.MessageStatsManager")
+
+DISCORD_EPOCH_MS = 1420070400000
+MS_PER_HOUR = 3600 * 1000
+
+
+def snowflake_to_hour(snowflake: int) -> int:
+    """
+    Get the hour (since the Unix epoch) a Discord snowflake was created in.
+    """
+    return ((snowflake >> 22) + DISCORD_EPOCH_MS) // MS_PER_HOUR
+
+
+def datetime_to_hour(dt: datetime.datetime) -> int:
+    """
+    Get the hour (since the Unix epoch) of a naive UTC datetime.
+    """
+    return int((dt - datetime.datetime(1970, 1, 1)).total_seconds() // 3600)
+
+
+def hour_to_snowflake(hour: int) -> int:
+    """
+    Get the lowest possible snowflake for a given hour. Useful as an `after`/`before` bound for history queries.
+    """
+    return max(0, (hour * MS_PER_HOUR - DISCORD_EPOCH_MS) << 22)
+
+
+class HourlySeries:
+    """
+    A sparse, compact series of hourly counters.
+
+    Only hours with at least one event are stored, as two parallel arrays (hour number, count) kept sorted by hour.
+    New events almost always land in the latest hour, so adding is usually an O(1) increment or append. Summing any
+    time range is two binary searches and a slice sum.
+    """
+    __slots__ = ('hours', 'counts')
+
+    def __init__(self, data: list = None):
+        self.hours = array.array('I')
+        self.counts = array.array('I')
+
+        if data is not None:
+            self.hours.extend(data[0])
+            self.counts.extend(data[1])
+
+    def add(self, hour: int, count: int = 1):
+        if self.hours and self.hours[-1] == hour:
+            self.counts[-1] += count
+        elif not self.hours or self.hours[-1] < hour:
+            self.hours.append(hour)
+            self.counts.append(count)
+        else:
+            # Backfilled history lands in the middle of the series.
+            i = bisect.bisect_left(self.hours, hour)
+
+            if i < len(self.hours) and self.hours[i] == hour:
+                self.counts[i] += count
+            else:
+                self.hours.insert(i, hour)
+                self.counts.insert(i, count)
+
+    def total(self, start_hour: int, end_hour: int) -> int:
+        """
+        Sum all events in [start_hour, end_hour).
+        """
+        i = bisect.bisect_left(self.hours, start_hour)
+        j = bisect.bisect_left(self.hours, end_hour, lo=i)
+
+        return sum(self.counts[i:j])
+
+    def to_data(self) -> list:
+        return [self.hours.tolist(), self.counts.tolist()]
+
+
+class MessageStatsManager:
+    """
+    The Message Stats Manager keeps hourly message counts for every channel, and for every (non-bot) author in every
+    channel.
+
+    Counts are taken from messages as they arrive. Each channel is backfilled from history once (up to a configurable
+    number of days back), and caught up from where it left off whenever the bot starts, so the counters stay complete
+    over restarts. Counters are saved to disk periodically.
+
+    This lets "how many messages" and "how many active users" questions be answered for any time range without having
+    to page through message history.
+    """
+
+    def __init__(self, bot: commands.Bot, path: str = "config/messageStats.json", save_interval: int = 300):
+        self._bot = bot
+        self._config = bot.config
+        self._path = path
+        self._save_interval = save_interval
+
+        # { channel_id: HourlySeries }
+        self._channels = {}
+
+        # { channel_id: { author_id: HourlySeries } }
+        self._authors = {}
+
+        # { channel_id: message ID } - every message up to and including this one has been counted.
+        self._watermarks = {}
+
+        # { channel_id: the first hour we have complete data for }
+        self._coverage = {}
+
+        # { channel_id: first message ID counted live this session } - backfill stops here, so nothing counts twice.
+        self._session_start = {}
+
+        # { channel_id: newest message ID counted live this session }
+        self._session_latest = {}
+
+        # Channels that have been backfilled this session, and whose watermark now follows live messages.
+        self._caught_up = set()
+
+        # Anything newer than this will be counted live.
+        self._backfill_snowflake = discord.utils.time_snowflake(datetime.datetime.utcnow())
+        self._dirty = False
+
+        # Held for the whole of a save, so two saves (autosave and the end of a backfill) never write at once.
+        self._save_lock = asyncio.Lock()
+
+        self.load()
+
+        self._bot.add_listener(self.on_message, "on_message")
+
+        self.__tasks__ = [
+            self._bot.loop.create_task(self.backfill_all()),
+            self._bot.loop.create_task(self.autosave())
+        ]
+
+        LOG.info("Manager load complete.")
+
+    def load(self):
+        if not os.path.exists(self._path):
+            return
+
+        with open(self._path, 'r') as f:
+            data = json.load(f)
+
+        for (channel_id, series) in data.get('channels', {}).items():
+            self._channels[int(channel_id)] = HourlySeries(series)
+
+        for (channel_id, authors) in data.get('authors', {}).items():
+            self._authors[int(channel_id)] = {int(a): HourlySeries(s) for (a, s) in authors.items()}
+
+        self._watermarks = {int(k): v for (k, v) in data.get('watermarks', {}).items()}
+        self._coverage = {int(k): v for (k, v) in data.get('coverage', {}).items()}
+
+        LOG.info(f"Loaded message statistics for {len(self._channels)} channels.")
+
+    def _snapshot(self) -> dict:
+        return {
+            "channels": {str(c): s.to_data() for (c, s) in self._channels.items()},
+            "authors": {str(c): {str(a): s.to_data() for (a, s) in authors.items()}
+                        for (c, authors) in self._authors.items()},
+            "watermarks": {str(k): v for (k, v) in self._watermarks.items()},
+            "coverage": {str(k): v for (k, v) in self._coverage.items()}
+        }
+
+    def _write(self, snapshot: dict):
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp_path = self._path + ".tmp"
+
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+
+        os.replace(temp_path, self._path)
+
+    async def save(self):
+        """
+        Save all counters to disk. The (potentially large) file write happens off the event loop.
+        """
+        async with self._save_lock:
+            self._dirty = False
+            snapshot = self._snapshot()
+
+            await self._bot.loop.run_in_executor(None, self._write, snapshot)
+
+    async def autosave(self):
+        while not self._bot.is_closed():
+            await asyncio.sleep(self._save_interval)
+
+            if self._dirty:
+                await self.save()
+
+    def record(self, message: discord.Message):
+        channel_id = message.channel.id
+        hour = snowflake_to_hour(message.id)
+
+        self._channels.setdefault(channel_id, HourlySeries()).add(hour)
+
+        if not message.author.bot:
+            self._authors.setdefault(channel_id, {}).setdefault(message.author.id, HourlySeries()).add(hour)
+
+        self._dirty = True
+
+    async def on_message(self, message: discord.Message):
+        if not isinstance(message.channel, discord.TextChannel):
+            return
+
+        channel_id = message.channel.id
+        self._session_start.setdefault(channel_id, message.id)
+        self._session_latest[channel_id] = message.id
+
+        # Until a channel is caught up, its watermark has to stay behind the gap backfill is still filling.
+        if channel_id in self._caught_up:
+            self._watermarks[channel_id] = message.id
+
+        self.record(message)
+
+    async def backfill_all(self):
+        await self._bot.wait_until_ready()
+
+        for guild in self._bot.guilds:
+            for channel in guild.text_channels:
+                if not channel.permissions_for(guild.me).read_message_history:
+                    continue
+
+                try:
+                    await self.backfill_channel(channel)
+                except discord.HTTPException as e:
+                    LOG.warning(f"Failed to backfill message statistics for #{channel}: {e}")
+
+        await self.save()
+
+    async def backfill_channel(self, channel: discord.TextChannel):
+        """
+        Count all messages in a channel that we haven't seen yet.
+
+        For channels we've never seen, this goes back `messageStats.backfillDays` days (default 30). For channels we
+        have, it picks up from the newest message counted before the bot last stopped.
+
+        :param channel: The channel to backfill.
+        """
+        watermark = self._watermarks.get(channel.id)
+
+        if watermark is None:
+            backfill_days = self._config.get('messageStats', {}).get('backfillDays', 30)
+            start = datetime.datetime.utcnow() - datetime.timedelta(days=backfill_days)
+            watermark = hour_to_snowflake(datetime_to_hour(start))
+            self._coverage[channel.id] = snowflake_to_hour(watermark)
+
+        # Stop where live counting started, so nothing is counted twice.
+        stop = self._session_start.get(channel.id, self._backfill_snowflake)
+        stop = min(stop, self._backfill_snowflake)
+
+        if watermark < stop:
+            count = 0
+
+            # History after a given message comes oldest first, so the watermark can follow along.
+            async for message in channel.history(limit=None, after=discord.Object(id=watermark),
+                                                 before=discord.Object(id=stop)):
+                self.record(message)
+                self._watermarks[channel.id] = message.id
+                count += 1
+
+            if count:
+                LOG.info(f"Backfilled {count} messages of statistics for #{channel}.")
+
+        # Messages may have been deleted, so always move the watermark up to where we stopped (or past anything we've
+        # counted live since).
+        self._watermarks[channel.id] = max(watermark, stop - 1, self._session_latest.get(channel.id, 0))
+        self._caught_up.add(channel.id)
+
+    def is_complete(self, channel_id: int, start: datetime.datetime) -> bool:
+        """
+        Check whether the statistics for a channel are complete from a given time until now.
+        """
+        if channel_id not in self._caught_up:
+            return False
+
+        return self._coverage.get(channel_id, float('inf')) <= datetime_to_hour(start)
+
+    def get_coverage_start(self, channel_ids: list):
+        """
+        Get the earliest time for which statistics are complete for all given channels, or None if unknown.
+        """
+        starts = [self._coverage[c] for c in channel_ids if c in self._coverage]
+
+        if not starts:
+            return None
+
+        return datetime.datetime.utcfromtimestamp(max(starts) * 3600)
+
+    def count_messages(self, channel_ids: list, start: datetime.datetime, end: datetime.datetime = None) -> int:
+        """
+        Count messages sent in a set of channels over a time range.
+
+        :param channel_ids: The channel IDs to count messages in.
+        :param start: The (naive UTC) start of the range.
+        :param end: The (naive UTC) end of the range. Defaults to now.
+        :return: The number of messages.
+        """
+        (start_hour, end_hour) = self._to_hours(start, end)
+
+        return sum(self._channels[c].total(start_hour, end_hour) for c in channel_ids if c in self._channels)
+
+    def count_by_author(self, channel_ids: list, start: datetime.datetime, end: datetime.datetime = None) -> dict:
+        """
+        Count messages sent by each (non-bot) author in a set of channels over a time range.
+
+        :return: A dict of author ID to message count. Authors with no messages in range are omitted.
+        """
+        (start_hour, end_hour) = self._to_hours(start, end)
+        totals = {}
+
+        for channel_id in channel_ids:
+            for (author_id, series) in self._authors.get(channel_id, {}).items():
+                count = series.total(start_hour, end_hour)
+
+                if count:
+                    totals[author_id] = totals.get(author_id, 0) + count
+
+        return totals
+
+    def count_active_users(self, channel_ids: list, start: datetime.datetime, end: datetime.datetime = None,
+                           threshold: int = 1) -> int:
+        return sum(1 for count in self.count_by_author(channel_ids, start, end).values() if count >= threshold)
+
+    @staticmethod
+    def _to_hours(start: datetime.datetime, end: datetime.datetime = None):
+        end = end or datetime.datetime.utcnow()
+
+        # Include the partial hour at the end of the range.
+        return datetime_to_hour(start), datetime_to_hour(end) + 1
+
+    def cleanup(self):
+        for task in self.__tasks__:
+            task.cancel()
+
+        self._bot.remove_listener(self.on_message, "on_message")
+
+        if self._dirty:
+            self._write(self._snapshot())
@@ -0,0 +1,465 @@
+import asyncio
+import collections
+import contextvars
+import datetime
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+from libhusky import HuskyConfig, HuskyMetrics
+
+LOG = logging.getLogger("HuskyBot.Managers.ModActionManager")
+
+# What's asking for the current action, for metrics. Callers (such as AntiSpam) set this around their own work.
+action_source = contextvars.ContextVar('action_source', default="other")
+
+ACTIONS = HuskyMetrics.get_registry().counter(
+    "husky_mod_actions_total", "Moderation actions requested, by action and source.", ("action", "source")
+)
+
+# Discord refuses to bulk delete messages older than this.
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)
+BULK_DELETE_MAX_COUNT = 100
+
+# How many completed bans a bulk ban job makes between saves of its progress to disk.
+BULK_BAN_CHECKPOINT_INTERVAL = 25
+
+
+class ModActionManager:
+    """
+    The Moderation Action Manager is a central queue for destructive moderation actions (deletes, kicks and bans).
+
+    During spam waves, many modules (AntiSpam filters, Censor, the UBL) will all try to act on the same messages and
+    users at the same time. Rather than every module making its own REST call per message, deletions are queued up per
+    channel and flushed as bulk deletes on a short interval. Kicks and bans are deduplicated per user, so only one
+    request is ever made for a user at a time.
+
+    discord.py already waits out rate limit buckets (using the X-RateLimit headers) before making a request. If a
+    request still comes back with a 429, the affected batch is re-queued and the queue backs off for the time Discord
+    asked for.
+
+    All methods return awaitables that resolve when the action has actually been performed. Kicks and bans resolve to
+    True if they happened, False if the user couldn't be found, or None if they were skipped because the user was
+    banned moments ago.
+    """
+
+    def __init__(self, bot: commands.Bot, flush_interval: float = 0.5, ban_memory: int = 60):
+        self._bot = bot
+        self._flush_interval = flush_interval
+        self._ban_memory = ban_memory
+
+        # { channel_id: { message_id: (message, future, enqueue_time, quiet) } }
+        self._pending_deletes = {}
+        self._flush_handle = None
+        self._backoff_until = 0
+
+        # { (guild_id, user_id): {"action": str, "future": Future} }
+        self._pending_removals = {}
+
+        # { (guild_id, user_id): monotonic expiry time } for users we have banned recently.
+        self._recent_bans = {}
+
+        # Bulk ban jobs are persisted here as they run, so they can be resumed after a restart.
+        self._bulk_ban_config = HuskyConfig.get_config('bulkbans', create_if_nonexistent=True)
+
+        self._latencies = collections.deque(maxlen=500)
+        self.stats = {
+            "deleteRequests": 0,
+            "deleteCalls": 0,
+            "removalRequests": 0,
+            "removalCalls": 0,
+            "rateLimited": 0
+        }
+
+    def get_stats(self) -> dict:
+        """
+        Get a snapshot of queue statistics.
+
+        :return: A dict of raw counters, plus the number of REST calls saved and queue latency percentiles (seconds).
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(pct):
+            if not latencies:
+                return 0.0
+
+            return latencies[min(len(latencies) - 1, int(round(pct * (len(latencies) - 1))))]
+
+        return {
+            **self.stats,
+            "callsSaved": ((self.stats['deleteRequests'] - self.stats['deleteCalls'])
+                           + (self.stats['removalRequests'] - self.stats['removalCalls'])),
+            "pendingDeletes": sum(len(c) for c in self._pending_deletes.values()),
+            "latencyP50": percentile(0.5),
+            "latencyP99": percentile(0.99)
+        }
+
+    def delete_message(self, message: discord.Message, quiet: bool = False) -> asyncio.Future:
+        """
+        Queue a message for deletion.
+
+        The returned future resolves to True once the message is deleted, or False if the message was already gone.
+        Queueing the same message more than once returns the same future.
+
+        Discord doesn't send on_message_delete for messages removed by a bulk delete. So that loggers still see each
+        deletion, as they would have before it was queued, on_message_delete is dispatched for every bulk deleted
+        message - unless the deletion is `quiet`, as for cleanups (which have always been bulk deletes).
+
+        :param message: The message to delete.
+        :param quiet: Don't dispatch on_message_delete if the message is bulk deleted.
+        :return: A future tracking the deletion.
+        """
+        self.stats['deleteRequests'] += 1
+        ACTIONS.labels("delete", action_source.get()).inc()
+
+        channel_queue = self._pending_deletes.setdefault(message.channel.id, {})
+        entry = channel_queue.get(message.id)
+
+        if entry is not None:
+            if entry[3] and not quiet:
+                channel_queue[message.id] = entry[:3] + (False,)
+
+            return entry[1]
+
+        future = self._bot.loop.create_future()
+        channel_queue[message.id] = (message, future, time.perf_counter(), quiet)
+        self._schedule_flush(self._flush_interval)
+
+        return future
+
+    def ban(self, guild: discord.Guild, user: discord.abc.Snowflake, reason: str = None,
+            delete_message_days: int = 1) -> asyncio.Future:
+        """
+        Ban a user from a guild, unless they are already being (or were just) banned.
+
+        :param guild: The guild to ban the user from.
+        :param user: The user (or Member, or discord.Object) to ban.
+        :param reason: The reason to record in the audit log.
+        :param delete_message_days: Days of message history to delete.
+        :return: A future tracking the ban. It resolves to True once the user is banned, False if they couldn't be
+                 found, or None if they were banned moments ago (so the ban was skipped).
+        """
+        ACTIONS.labels("ban", action_source.get()).inc()
+
+        async def do_ban():
+            await guild.ban(user, reason=reason, delete_message_days=delete_message_days)
+
+            now = time.monotonic()
+            self._forget_old_bans(now)
+            self._recent_bans[(guild.id, user.id)] = now + self._ban_memory
+
+        return self._queue_removal(guild, user, "ban", do_ban)
+
+    def kick(self, member: discord.Member, reason: str = None) -> asyncio.Future:
+        """
+        Kick a member from their guild, unless they are already being removed.
+
+        :param member: The member to kick.
+        :param reason: The reason to record in the audit log.
+        :return: A future tracking the kick.
+        """
+        ACTIONS.labels("kick", action_source.get()).inc()
+
+        async def do_kick():
+            await member.guild.kick(member, reason=reason)
+
+        return self._queue_removal(member.guild, member, "kick", do_kick)
+
+    def softban(self, member: discord.Member, reason: str = None, delete_message_days: int = 1) -> asyncio.Future:
+        """
+        Ban and immediately unban a member, purging their recent messages.
+
+        If a real ban for this member is already in progress, the unban is skipped entirely.
+
+        :param member: The member to softban.
+        :param reason: The reason to record in the audit log.
+        :param delete_message_days: Days of message history to delete.
+        :return: A future tracking the softban.
+        """
+        ACTIONS.labels("softban", action_source.get()).inc()
+
+        async def do_softban():
+            await member.guild.ban(member, reason=reason, delete_message_days=delete_message_days)
+            await member.guild.unban(member, reason="Softban reversal")
+
+        return self._queue_removal(member.guild, member, "softban", do_softban)
+
+    async def bulk_ban(self, guild: discord.Guild, user_ids: list, reason: str, job_id: str = None,
+                       progress_callback=None, concurrency: int = 5, reasons: dict = None) -> dict:
+        """
+        Ban a large list of users, with at most `concurrency` bans in flight.
+
+        Users are banned by ID (as discord.Objects), so no lookups are required. Every ban goes through the same
+        deduplicating queue as everything else, so users that are already being banned aren't hit twice.
+
+        The job's remaining users are checkpointed to disk as it runs. If the bot is interrupted, the job can be picked
+        back up with `get_interrupted_bulk_bans` and `resume_bulk_ban`.
+
+        :param guild: The guild to ban users from.
+        :param user_ids: A list of user IDs to ban.
+        :param reason: The audit log reason for every ban.
+        :param job_id: A unique ID for this job. Required for the job to be resumable.
+        :param progress_callback: An optional coroutine function, called as (completed, total) after each ban.
+        :param concurrency: The maximum number of bans to run at once.
+        :param reasons: Audit log reasons for particular users (by ID), overriding `reason`.
+        :return: A dict of "succeeded" (list of IDs) and "failed" (list of (ID, error string)).
+        """
+        job = {
+            "guild": guild.id,
+            "reason": reason,
+            # Keyed by string, as the job goes through JSON when it's checkpointed.
+            "reasons": {str(user_id): user_reason for (user_id, user_reason) in (reasons or {}).items()},
+            "pending": list(dict.fromkeys(user_ids)),
+            "succeeded": [],
+            "failed": []
+        }
+
+        return await self._run_bulk_ban(guild, job_id, job, progress_callback, concurrency)
+
+    def get_interrupted_bulk_bans(self) -> dict:
+        """
+        Get all bulk ban jobs that were interrupted before they finished.
+
+        :return: A dict of job ID to job state (guild, reason, pending, succeeded, failed).
+        """
+        return self._bulk_ban_config.get('jobs', {})
+
+    async def resume_bulk_ban(self, guild: discord.Guild, job_id: str, progress_callback=None,
+                              concurrency: int = 5) -> dict:
+        """
+        Resume an interrupted bulk ban job. See `bulk_ban`.
+        """
+        job = self.get_interrupted_bulk_bans().get(job_id)
+
+        if job is None:
+            raise KeyError(f"No interrupted bulk ban with ID {job_id} exists.")
+
+        return await self._run_bulk_ban(guild, job_id, job, progress_callback, concurrency)
+
+    async def _run_bulk_ban(self, guild: discord.Guild, job_id, job: dict, progress_callback, concurrency: int):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        # Anything finished after the last checkpoint may still be listed as pending.
+        finished = set(job['succeeded']) | set(f[0] for f in job['failed'])
+        job['pending'] = [user_id for user_id in job['pending'] if user_id not in finished]
+
+        remaining = set(job['pending'])
+        total = len(job['pending']) + len(finished)
+        since_checkpoint = 0
+
+        def checkpoint(finished: bool = False):
+            if job_id is None:
+                return
+
+            jobs = self._bulk_ban_config.get('jobs', {})
+
+            if finished:
+                jobs.pop(job_id, None)
+            else:
+                job['pending'] = list(remaining)
+                jobs[job_id] = job
+
+            self._bulk_ban_config.set('jobs', jobs)
+
+        async def ban_one(user_id: int):
+            nonlocal since_checkpoint
+
+            async with semaphore:
+                try:
+                    result = await self.ban(guild, discord.Object(id=user_id),
+                                            reason=job.get('reasons', {}).get(str(user_id), reason),
+                                            delete_message_days=1)
+
+                    if result is False:
+                        job['failed'].append((user_id, "not found"))
+                    else:
+                        # None means the user was banned moments ago (possibly by this job, before it was
+                        # interrupted). Either way, they're banned.
+                        job['succeeded'].append(user_id)
+                except discord.HTTPException as e:
+                    job['failed'].append((user_id, f"{e.status} {e.text}".strip()))
+
+            remaining.discard(user_id)
+            since_checkpoint += 1
+
+            if since_checkpoint >= BULK_BAN_CHECKPOINT_INTERVAL:
+                since_checkpoint = 0
+                checkpoint()
+
+            if progress_callback is not None:
+                await progress_callback(total - len(remaining), total)
+
+        reason = job['reason']
+        checkpoint()
+
+        await asyncio.gather(*[ban_one(user_id) for user_id in job['pending']])
+
+        checkpoint(finished=True)
+        LOG.info(f"Bulk ban {job_id} finished: {len(job['succeeded'])} banned, {len(job['failed'])} failed.")
+
+        return {"succeeded": job['succeeded'], "failed": job['failed']}
+
+    def _forget_old_bans(self, now: float):
+        for (key, expiry) in list(self._recent_bans.items()):
+            if expiry <= now:
+                del self._recent_bans[key]
+
+    def _queue_removal(self, guild: discord.Guild, user: discord.abc.Snowflake, action: str, func):
+        self.stats['removalRequests'] += 1
+        key = (guild.id, user.id)
+
+        ban_expiry = self._recent_bans.get(key)
+        if ban_expiry is not None:
+            if ban_expiry > time.monotonic():
+                LOG.debug(f"Suppressed {action} for user {user.id}, as they were banned recently.")
+                future = self._bot.loop.create_future()
+                future.set_result(None)
+                return future
+
+            del self._recent_bans[key]
+
+        existing = self._pending_removals.get(key)
+
+        if existing is not None and existing['action'] in ["ban", action]:
+            LOG.debug(f"Coalesced {action} for user {user.id} into an in-flight {existing['action']}.")
+            return existing['future']
+
+        future = self._bot.loop.create_future()
+        self._pending_removals[key] = {"action": action, "future": future}
+        self._bot.loop.create_task(self._run_removal(key, existing, action, func, future))
+
+        return future
+
+    async def _run_removal(self, key, previous, action: str, func, future: asyncio.Future):
+        start = time.perf_counter()
+
+        # Something else (a kick, for example) is still in flight for this user. Let it finish first.
+        if previous is not None:
+            try:
+                await asyncio.shield(previous['future'])
+            except Exception:
+                pass
+
+        try:
+            self.stats['removalCalls'] += 1
+            await func()
+            result = True
+        except discord.NotFound:
+            LOG.info(f"Could not {action} user {key[1]}, as they no longer exist.")
+            result = False
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        finally:
+            self._latencies.append(time.perf_counter() - start)
+
+            if self._pending_removals.get(key, {}).get('future') is future:
+                del self._pending_removals[key]
+
+        if not future.done():
+            future.set_result(result)
+
+    def _schedule_flush(self, delay: float):
+        if self._flush_handle is not None:
+            return
+
+        delay = max(delay, self._backoff_until - time.monotonic())
+        self._flush_handle = self._bot.loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+
+        pending = self._pending_deletes
+        self._pending_deletes = {}
+
+        for channel_queue in pending.values():
+            self._bot.loop.create_task(self._flush_channel(channel_queue))
+
+    async def _flush_channel(self, channel_queue: dict):
+        bulk_cutoff = datetime.datetime.utcnow() - BULK_DELETE_MAX_AGE
+
+        bulk_entries = []
+        single_entries = []
+
+        for entry in channel_queue.values():
+            if entry[0].created_at > bulk_cutoff:
+                bulk_entries.append(entry)
+            else:
+                single_entries.append(entry)
+
+        for i in range(0, len(bulk_entries), BULK_DELETE_MAX_COUNT):
+            chunk = bulk_entries[i:i + BULK_DELETE_MAX_COUNT]
+
+            if len(chunk) == 1:
+                single_entries.append(chunk[0])
+                continue
+
+            channel = chunk[0][0].channel
+
+            try:
+                self.stats['deleteCalls'] += 1
+                await channel.delete_messages([e[0] for e in chunk])
+                LOG.debug(f"Bulk deleted {len(chunk)} messages from #{channel}.")
+                self._resolve(chunk, True)
+
+                for (message, _, _, quiet) in chunk:
+                    if not quiet:
+                        self._bot.dispatch('message_delete', message)
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self._requeue(chunk, e)
+                    continue
+
+                # One of the messages may have been deleted out from under us. Fall back to deleting individually.
+                LOG.warning(f"Bulk delete of {len(chunk)} messages in #{channel} failed ({e}). Deleting singly.")
+                single_entries += chunk
+
+        for entry in single_entries:
+            await self._delete_single(entry)
+
+    async def _delete_single(self, entry):
+        (message, future, enqueued, _) = entry
+
+        try:
+            self.stats['deleteCalls'] += 1
+            await message.delete()
+            self._resolve([entry], True)
+        except discord.NotFound:
+            LOG.info(f"Message {message.id} was already deleted before the queue could get to it.")
+            self._resolve([entry], False)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                self._requeue([entry], e)
+                return
+
+            self._latencies.append(time.perf_counter() - enqueued)
+            if not future.done():
+                future.set_exception(e)
+
+    def _resolve(self, entries, result: bool):
+        now = time.perf_counter()
+
+        for (_, future, enqueued, _) in entries:
+            self._latencies.append(now - enqueued)
+
+            if not future.done():
+                future.set_result(result)
+
+    def _requeue(self, entries, error: discord.HTTPException):
+        self.stats['rateLimited'] += 1
+
+        try:
+            retry_after = float(error.response.headers.get('Retry-After', 1))
+        except (AttributeError, ValueError):
+            retry_after = 1
+
+        LOG.warning(f"Rate limited while deleting {len(entries)} messages. Backing off for {retry_after} seconds.")
+        self._backoff_until = max(self._backoff_until, time.monotonic() + retry_after)
+
+        for entry in entries:
+            self._pending_deletes.setdefault(entry[0].channel.id, {})[entry[0].id] = entry
+
+        self._schedule_flush(retry_after)
@@ -6,22 +6,34 @@ import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
-from libhusky import HuskyConfig, HuskyData, HuskyUtils
+from libhusky import HuskyConfig, HuskyData, HuskyScheduler, HuskyUtils
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Managers.MuteManager")
 
+# Scheduled unmutes that fail (Discord errors, guild not ready, ...) are retried after this many seconds, doubling
+# every attempt up to UNMUTE_RETRY_MAX.
+UNMUTE_RETRY_BASE = 60
+UNMUTE_RETRY_MAX = 60 * 60
+
 
 class MuteManager:
     def __init__(self, bot: HuskyBot):
         self._bot = bot
         self._bot_config = HuskyConfig.get_config()
         self._mute_config = HuskyConfig.get_config('mutes', create_if_nonexistent=True)
-        self.__cache__ = []
 
-        self.read_mutes_from_file()
+        # All active mutes, keyed by Mute.key() - (guild, user_id, channel).
+        self._mutes = {}
+
+        # Secondary index of { user_id: { mute_key: Mute } }, so rejoining users can be checked without a full scan.
+        self._mutes_by_user = {}
 
-        self.__task__ = self._bot.loop.create_task(self.check_mutes())
+        # Pending scheduled unmutes (the expiry-ordered view of all mutes), keyed by Mute.key().
+        self._scheduler = HuskyScheduler.get_scheduler()
+        self._unmute_tasks = {}
+
+        self.read_mutes_from_file()
 
         LOG.info("Manager load complete.")
 
@@ -29,26 +41,65 @@ class MuteManager:
         disk_mutes = self._mute_config.get("mutes", [])
 
         for raw_mute in disk_mutes:
-            mute = HuskyData.Mute(raw_mute)
+            self._add_mute(HuskyData.Mute(raw_mute))
+
+        self._save_mutes()
+
+    def _save_mutes(self):
+        self._mute_config.set("mutes", list(self._mutes.values()))
+
+    def _add_mute(self, mute: HuskyData.Mute):
+        key = mute.key()
+
+        self._mutes[key] = mute
+        self._mutes_by_user.setdefault(mute.user_id, {})[key] = mute
+        self._schedule_unmute(mute)
+
+    def _remove_mute(self, mute: HuskyData.Mute):
+        key = mute.key()
+
+        self._mutes.pop(key, None)
+        self._cancel_unmute(mute)
+
+        user_mutes = self._mutes_by_user.get(mute.user_id, {})
+        user_mutes.pop(key, None)
+
+        if not user_mutes:
+            self._mutes_by_user.pop(mute.user_id, None)
+
+    def get_mutes(self) -> list:
+        return list(self._mutes.values())
+
+    def _schedule_unmute(self, mute: HuskyData.Mute, deadline: float = None, attempt: int = 0):
+        key = mute.key()
+
+        self._scheduler.cancel(self._unmute_tasks.pop(key, None))
+
+        if mute.expiry is None:
+            return
+
+        async def scheduled_unmute():
+            self._unmute_tasks.pop(key, None)
 
-            self.__cache__.append(mute)
+            LOG.info(f"Found a scheduled unmute - [user_id={mute.user_id}, channel_id={mute.channel}]. Triggering...")
 
-        self._mute_config.set("mutes", self.__cache__)
+            try:
+                await self.unmute_user(mute, "System - Scheduled")
+            except Exception:
+                # Only retry if the mute is still on record - if it's gone, the unmute itself went through.
+                if self._mutes.get(key) is not mute:
+                    raise
 
-    async def check_mutes(self):
-        while not self._bot.is_closed():
-            for mute in self.__cache__:
-                if mute.is_expired():
-                    LOG.info(f"Found a scheduled unmute - [user_id={mute.user_id}, channel_id={mute.channel}]. "
-                             f"Triggering...")
-                    await self.unmute_user(mute, "System - Scheduled")
+                delay = min(UNMUTE_RETRY_BASE * (2 ** attempt), UNMUTE_RETRY_MAX)
+                LOG.exception(f"Scheduled unmute for user {mute.user_id} (channel {mute.channel}) failed. Retrying "
+                              f"in {delay} seconds.")
+                self._schedule_unmute(mute, HuskyScheduler.utc_timestamp() + delay, attempt + 1)
 
-                # Because mutes are sorted by expiry, we can just exit the loop if we encounter a mute that's not yet
-                # over.
-                else:
-                    break
+        self._unmute_tasks[key] = self._scheduler.schedule(deadline or mute.expiry, scheduled_unmute,
+                                                           name=f"unmute-{mute.user_id}-{mute.channel}")
 
-            await asyncio.sleep(0.5)
+    def _cancel_unmute(self, mute: HuskyData.Mute):
+        self._scheduler.cancel(self._unmute_tasks.pop(mute.key(), None))
 
     async def mute_user_by_object(self, mute: HuskyData.Mute, staff_member: str = "System"):
         guild = self._bot.get_guild(mute.guild)
@@ -77,11 +128,11 @@ class MuteManager:
                                           send_messages=False,
                                           add_reactions=False)
 
-        if mute not in self.__cache__:
-            pos = HuskyUtils.get_sort_index(self.__cache__, mute, 'expiry')
-            self.__cache__.insert(pos, mute)
-            self.__cache__.sort(key=lambda m: m.expiry if m.expiry else 10 * 100)
-            self._mute_config.set("mutes", self.__cache__)
+        existing_mute = self._mutes.get(mute.key())
+
+        if existing_mute is None or existing_mute != mute:
+            self._add_mute(mute)
+            self._save_mutes()
 
             # Inform the guild logs
             alert_channel = self._bot_config.get('specialChannels', {}).get(ChannelKeys.STAFF_LOG.value, None)
@@ -105,6 +156,90 @@ class MuteManager:
 
                 await alert_channel.send(embed=embed)
 
+    async def mute_users_bulk(self, guild: discord.Guild, members: list, reason: str, expiry: int,
+                              staff_member: str = "System", progress_callback=None, concurrency: int = 5) -> dict:
+        """
+        Guild mute a large number of members at once.
+
+        Role changes are applied with at most `concurrency` requests in flight (discord.py's rate limiter handles the
+        rest). All resulting mute records are written to disk in a single save, and a single summary is posted to the
+        staff log rather than one embed per member.
+
+        :param guild: The guild to mute members in.
+        :param members: A list of Members to mute.
+        :param reason: The reason for all mutes.
+        :param expiry: A UTC timestamp for mutes to expire at, or None for permanent mutes.
+        :param staff_member: The name of the responsible staff member.
+        :param progress_callback: An optional coroutine function, called as (completed, total) after each member.
+        :param concurrency: The maximum number of role changes to run at once.
+        :return: A dict with lists of "succeeded", "skipped" and "failed" (member, error) results.
+        """
+        mute_role = guild.get_role(self._bot_config.get("specialRoles", {}).get(SpecialRoleKeys.MUTED.value))
+
+        if mute_role is None:
+            raise ValueError("A muted role is not set!")
+
+        expiry_string = ""
+        if expiry is not None:
+            expiry_string = f" (muted until {datetime.datetime.fromtimestamp(expiry).strftime(DATETIME_FORMAT)})"
+
+        report = {"succeeded": [], "skipped": [], "failed": []}
+        semaphore = asyncio.Semaphore(concurrency)
+        completed = 0
+
+        async def mute_one(member: discord.Member):
+            nonlocal completed
+
+            if (guild.id, member.id, None) in self._mutes:
+                report['skipped'].append(member)
+            else:
+                async with semaphore:
+                    try:
+                        await member.add_roles(mute_role, reason=f"Bulk muted by {staff_member} for reason "
+                                                                 f"{reason}{expiry_string}")
+                    except discord.HTTPException as e:
+                        report['failed'].append((member, e))
+                    else:
+                        mute = HuskyData.Mute()
+                        mute.guild = guild.id
+                        mute.user_id = member.id
+                        mute.reason = reason
+                        mute.expiry = expiry
+
+                        self._add_mute(mute)
+                        report['succeeded'].append(member)
+
+            completed += 1
+            if progress_callback is not None:
+                await progress_callback(completed, len(members))
+
+        await asyncio.gather(*[mute_one(m) for m in members])
+
+        # One write for the whole batch.
+        self._save_mutes()
+
+        LOG.info(f"Bulk muted {len(report['succeeded'])} users ({len(report['skipped'])} already muted, "
+                 f"{len(report['failed'])} failed) on behalf of {staff_member}.")
+
+        if report['succeeded']:
+            embed = discord.Embed(
+                description=f"{len(report['succeeded'])} users were muted from the guild in a bulk mute.",
+                color=Colors.WARNING
+            )
+
+            embed.set_author(name="Bulk mute performed!")
+            embed.add_field(name="Muted Users", value=HuskyUtils.trim_string(
+                ", ".join(f"{m} (`{m.id}`)" for m in report['succeeded']), 1000, True, "..."), inline=False)
+            embed.add_field(name="Responsible User", value=staff_member, inline=True)
+            embed.add_field(name="Timestamp", value=HuskyUtils.get_timestamp(), inline=True)
+            embed.add_field(name="Expires At", value=datetime.datetime.fromtimestamp(expiry)
+                            .strftime(DATETIME_FORMAT) if expiry is not None else "Never", inline=True)
+            embed.add_field(name="Reason", value=reason, inline=False)
+
+            await HuskyUtils.send_to_keyed_channel(self._bot, ChannelKeys.STAFF_LOG, embed)
+
+        return report
+
     async def mute_user(self, ctx: commands.Context, member: discord.Member, channel,
                         reason: str, expiry: int, staff_member: discord.Member):
 
@@ -134,12 +269,15 @@ class MuteManager:
         guild = self._bot.get_guild(mute.guild)
         member = guild.get_member(mute.user_id)
 
+        # Manual unmutes shouldn't leave a scheduled unmute behind.
+        self._cancel_unmute(mute)
+
         # Member is no longer on the guild, so their perms are cleared. Delete their records once their mute
         # is up.
         if member is None:
             LOG.info(f"Left user ID {mute.user_id} has had their mute expire. Removing it.")
-            self.__cache__.remove(mute)
-            self._mute_config.set("mutes", self.__cache__)
+            self._remove_mute(mute)
+            self._save_mutes()
 
             return
 
@@ -161,8 +299,8 @@ class MuteManager:
                                       reason=f"User's guild mute has been lifted by {unmute_reason}")
 
         # Remove from the disk
-        self.__cache__.remove(mute)
-        self._mute_config.set("mutes", self.__cache__)
+        self._remove_mute(mute)
+        self._save_mutes()
 
         # Inform the guild logs
         alert_channel = self._bot_config.get('specialChannels', {}).get(ChannelKeys.STAFF_LOG.value, None)
@@ -183,33 +321,24 @@ class MuteManager:
             await alert_channel.send(embed=embed)
 
     async def restore_user_mute(self, member: discord.Member):
-        for mute in self.__cache__:
-            if (mute.user_id == member.id) and not mute.is_expired():
+        for mute in list(self._mutes_by_user.get(member.id, {}).values()):
+            if (mute.guild == member.guild.id) and not mute.is_expired():
                 LOG.info(f"Restoring mute state for left user {member} in channel")
                 await self.mute_user_by_object(mute, "System - ReJoin")
 
     async def find_user_mute_record(self, member: discord.Member, channel):
-        result = None
-
         channel_id = None
         if channel is not None:
             channel_id = channel.id
 
-        for mute in self.__cache__:
-            if member.id == mute.user_id and channel_id == mute.channel:
-                result = mute
-
-        if result is None:
-            return None
-
-        return result
+        return self._mutes.get((member.guild.id, member.id, channel_id))
 
     async def update_mute_record(self, mute: HuskyData.Mute, reason: str = None, expiry: int = None):
 
-        if mute not in self.__cache__:
+        if self._mutes.get(mute.key()) is not mute:
             raise KeyError("This record doesn't exist in the cache!")
 
-        self.__cache__.remove(mute)
+        self._remove_mute(mute)
 
         old_reason = mute.reason
         old_expiry = mute.expiry
@@ -220,11 +349,9 @@ class MuteManager:
         if expiry is not None:
             mute.expiry = expiry
 
-        # Update cache and disk
-        pos = HuskyUtils.get_sort_index(self.__cache__, mute, 'expiry')
-        self.__cache__.insert(pos, mute)
-        self.__cache__.sort(key=lambda m: m.expiry if m.expiry else 10 * 100)
-        self._mute_config.set("mutes", self.__cache__)
+        # Update cache, scheduler, and disk
+        self._add_mute(mute)
+        self._save_mutes()
 
         alert_channel = self._bot_config.get('specialChannels', {}).get(ChannelKeys.STAFF_LOG.value, None)
         if alert_channel is not None:
@@ -255,5 +382,7 @@ class MuteManager:
             await alert_channel.send(embed=embed)
 
     def cleanup(self):
-        if self.__task__ is not None:
-            self.__task__.cancel()
+        for task in self._unmute_tasks.values():
+            self._scheduler.cancel(task)
+
+        self._unmute_tasks.clear()
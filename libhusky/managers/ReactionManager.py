@@ -0,0 +1,198 @@
+import asyncio
+import collections
+import logging
+
+import discord
+from discord.ext import commands
+
+from libhusky.HuskyResponseCache import CACHE_REQUESTS
+
+LOG = logging.getLogger("HuskyBot.Managers.ReactionManager")
+
+
+def emoji_key(emoji):
+    """
+    Get a stable key for an emoji, regardless of whether it came from a Reaction, an Emoji, or a raw event.
+    """
+    if isinstance(emoji, str):
+        return emoji
+
+    if getattr(emoji, 'id', None) is not None:
+        return emoji.id
+
+    return emoji.name
+
+
+class ReactionManager:
+    """
+    The Reaction Manager keeps an index of who has reacted to a message, and with what.
+
+    Discord only reports reaction counts on a message - finding out *who* reacted means paging through the users for
+    that reaction over HTTP. Rather than doing that on every reaction event, each message is seeded from the API once
+    (the first time something asks about it), and then kept current from the raw reaction gateway events.
+
+    Only the most recently used messages are kept, so memory stays bounded no matter how many messages get reactions.
+    """
+
+    def __init__(self, bot: commands.Bot, max_messages: int = 2500):
+        self._bot = bot
+        self._max_messages = max_messages
+
+        # { message_id: { emoji_key: set(user_id) } }, in least to most recently used order.
+        self._index = collections.OrderedDict()
+
+        # { message_id: Future } for messages currently being seeded from the API.
+        self._seeding = {}
+
+        # { message_id: [(op, emoji_key, user_id)] } for events received while a message was being seeded.
+        self._backlog = {}
+
+        self.stats = {"hits": 0, "seeds": 0, "evictions": 0}
+
+        self._listeners = [
+            (self.on_raw_reaction_add, "on_raw_reaction_add"),
+            (self.on_raw_reaction_remove, "on_raw_reaction_remove"),
+            (self.on_raw_reaction_clear, "on_raw_reaction_clear"),
+            (self.on_raw_message_delete, "on_raw_message_delete"),
+            (self.on_raw_bulk_message_delete, "on_raw_bulk_message_delete")
+        ]
+
+        for (func, name) in self._listeners:
+            self._bot.add_listener(func, name)
+
+        LOG.info("Manager load complete.")
+
+    async def get_reactors(self, message: discord.Message, emoji) -> set:
+        """
+        Get the IDs of every user that reacted to a message with a specific emoji.
+
+        The returned set is live, and should not be modified by the caller.
+
+        :param message: The message to look up.
+        :param emoji: The emoji to get reactors for.
+        :return: A set of user IDs.
+        """
+        reactions = await self._get_message_reactions(message)
+
+        return reactions.get(emoji_key(emoji), set())
+
+    async def count(self, message: discord.Message, emoji, exclude: list = None) -> int:
+        """
+        Count the number of users that reacted to a message with a specific emoji.
+
+        :param message: The message to look up.
+        :param emoji: The emoji to count.
+        :param exclude: A list of user IDs to not count, if they've reacted.
+        :return: The number of reactors, less any excluded users.
+        """
+        reactors = await self.get_reactors(message, emoji)
+
+        return len(reactors) - sum(1 for user_id in set(exclude or []) if user_id in reactors)
+
+    async def has_reacted(self, message: discord.Message, emoji, user_id: int) -> bool:
+        return user_id in await self.get_reactors(message, emoji)
+
+    async def _get_message_reactions(self, message: discord.Message) -> dict:
+        reactions = self._index.get(message.id)
+
+        if reactions is not None:
+            self.stats['hits'] += 1
+            CACHE_REQUESTS.labels("reactions", "hit").inc()
+            self._index.move_to_end(message.id)
+            return reactions
+
+        seed_future = self._seeding.get(message.id)
+
+        if seed_future is not None:
+            return await asyncio.shield(seed_future)
+
+        seed_future = self._bot.loop.create_future()
+        self._seeding[message.id] = seed_future
+        self._backlog[message.id] = []
+
+        try:
+            reactions = await self._seed(message)
+        except Exception as e:
+            seed_future.set_exception(e)
+            # Nobody else may be waiting, so don't let the loop complain about an unretrieved exception.
+            seed_future.exception()
+            raise
+        finally:
+            del self._seeding[message.id]
+            backlog = self._backlog.pop(message.id)
+
+        for (op, key, user_id) in backlog:
+            self._apply(reactions, op, key, user_id)
+
+        self._store(message.id, reactions)
+        seed_future.set_result(reactions)
+
+        return reactions
+
+    async def _seed(self, message: discord.Message) -> dict:
+        self.stats['seeds'] += 1
+        CACHE_REQUESTS.labels("reactions", "miss").inc()
+        reactions = {}
+
+        for reaction in message.reactions:
+            users = reactions.setdefault(emoji_key(reaction.emoji), set())
+
+            async for user in reaction.users():
+                users.add(user.id)
+
+        LOG.debug(f"Seeded reaction index for message {message.id} with {len(reactions)} emoji.")
+        return reactions
+
+    def _store(self, message_id: int, reactions: dict):
+        self._index[message_id] = reactions
+        self._index.move_to_end(message_id)
+
+        while len(self._index) > self._max_messages:
+            self._index.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    @staticmethod
+    def _apply(reactions: dict, op: str, key, user_id: int):
+        if op == "add":
+            reactions.setdefault(key, set()).add(user_id)
+        elif op == "remove":
+            users = reactions.get(key)
+
+            if users is not None:
+                users.discard(user_id)
+
+                if not users:
+                    del reactions[key]
+        elif op == "clear":
+            reactions.clear()
+
+    def _handle_event(self, message_id: int, op: str, key=None, user_id: int = None):
+        if message_id in self._backlog:
+            self._backlog[message_id].append((op, key, user_id))
+            return
+
+        reactions = self._index.get(message_id)
+
+        # Messages nobody has asked about yet will be seeded fresh when they're needed.
+        if reactions is not None:
+            self._apply(reactions, op, key, user_id)
+
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        self._handle_event(payload.message_id, "add", emoji_key(payload.emoji), payload.user_id)
+
+    async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
+        self._handle_event(payload.message_id, "remove", emoji_key(payload.emoji), payload.user_id)
+
+    async def on_raw_reaction_clear(self, payload: discord.RawReactionClearEvent):
+        self._handle_event(payload.message_id, "clear")
+
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self._index.pop(payload.message_id, None)
+
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self._index.pop(message_id, None)
+
+    def cleanup(self):
+        for (func, name) in self._listeners:
+            self._bot.remove_listener(func, name)
@@ -4,17 +4,38 @@
 import asyncio
 import importlib
 import logging
+import time
 
 import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
+from libhusky import HuskyMetrics
 from libhusky import HuskyUtils
 from libhusky import antispam
 from libhusky.HuskyStatics import *
+from libhusky.managers.ModActionManager import action_source
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
 
+MODULE_LATENCY = HuskyMetrics.get_registry().histogram(
+    "husky_antispam_module_seconds", "Time taken by each AntiSpam module to process a message.", ("module",)
+)
+MODULE_ERRORS = HuskyMetrics.get_registry().counter(
+    "husky_antispam_module_errors_total", "Exceptions raised by each AntiSpam module.", ("module",)
+)
+MODULE_TRIPS = HuskyMetrics.get_registry().counter(
+    "husky_antispam_breaker_trips_total", "Times each AntiSpam module's circuit breaker has tripped.", ("module",)
+)
+
+breaker_defaults = {
+    'latencyBudgetMs': 5000,  # p99 wall-clock latency (ms) before a module is tripped
+    'cpuBudgetMs': 50,  # p99 time (ms) a module may hold the event loop before being tripped
+    'errorRate': 0.25,  # Rolling error rate (0 to 1) before a module is tripped
+    'minCalls': 20,  # Calls needed in the rolling window before the breaker may trip
+    'cooldownSeconds': 300  # Seconds a tripped module stays disabled
+}
+
 
 # noinspection PyMethodMayBeStatic
 class AntiSpam(commands.Cog):
@@ -32,6 +53,7 @@ class AntiSpam(commands.Cog):
 
         # AS Modules
         self.__modules__ = {}
+        self.__stats__ = {}  # type: dict[str, antispam.ModuleStats]
 
         # Tasks
         self.__cleanup_task__ = self.bot.loop.create_task(self.run_scheduled_cleanups())
@@ -61,11 +83,13 @@ class AntiSpam(commands.Cog):
 
         impl = clazz(self)
         self.__modules__[module_name] = impl
+        self.__stats__[module_name] = antispam.ModuleStats()
         self.asp.add_command(impl)
 
     def unload_module(self, module_name):
         self.asp.remove_command(self.__modules__[module_name])
         del self.__modules__[module_name]
+        self.__stats__.pop(module_name, None)
 
     async def run_scheduled_cleanups(self):
         """
@@ -97,8 +121,110 @@ class AntiSpam(commands.Cog):
         if exemption_config and HuskyUtils.member_has_any_role(message.author, exemption_config):
             return
 
-        for module in self.__modules__.values():
-            asyncio.ensure_future(module.process_message(message, context))
+        # A copy, as modules may be loaded or unloaded while their tasks are being started.
+        for (module_name, module) in list(self.__modules__.items()):
+            stats = self.__stats__.get(module_name)
+
+            if stats is None:
+                continue
+
+            if stats.tripped_until is not None:
+                if stats.is_tripped():
+                    continue
+
+                self.close_breaker(module_name, stats)
+
+            asyncio.ensure_future(self.run_module(module_name, module, message, context))
+
+    async def run_module(self, module_name: str, module: antispam.AntiSpamModule, message: discord.Message,
+                         context: str):
+        """
+        Run a single module against a message, accounting for its cost and any errors it raises.
+
+        Exceptions are caught and logged here, instead of being left for asyncio to complain about when the future is
+        garbage collected.
+        """
+        loop_time = [0.0]
+        errored = False
+        start = time.perf_counter()
+
+        # Each module runs in its own task, so this only tags the moderation actions this module takes.
+        action_source.set(f"antispam:{module_name}")
+
+        try:
+            await antispam.measure_loop_time(module.process_message(message, context), loop_time)
+        except asyncio.CancelledError:
+            # The module's work on this message was cancelled (usually as the message was deleted, often by another
+            # module). Not an error, and it's checked before Exception, as CancelledError is one on Python 3.7.
+            return
+        except Exception:
+            errored = True
+            MODULE_ERRORS.labels(module_name).inc()
+            LOG.exception("AntiSpam module %s raised an exception processing message %s (context %s).",
+                          module_name, message.id, context)
+
+        stats = self.__stats__.get(module_name)
+
+        # The module may have been unloaded while we were running.
+        if stats is None:
+            return
+
+        latency = time.perf_counter() - start
+        MODULE_LATENCY.labels(module_name).observe(latency)
+
+        stats.record(latency, loop_time[0], errored)
+        await self.check_breaker(module_name, stats)
+
+    async def check_breaker(self, module_name: str, stats: antispam.ModuleStats):
+        breaker_config = {**breaker_defaults,
+                          **self._config.get('antiSpam', {}).get('__global__', {}).get('circuitBreaker', {})}
+
+        if stats.is_tripped() or stats.window_size() < breaker_config['minCalls']:
+            return
+
+        p99_latency = stats.latency_percentile(0.99) * 1000
+        p99_cpu = stats.cpu_percentile(0.99) * 1000
+        error_rate = stats.error_rate()
+
+        if error_rate >= breaker_config['errorRate']:
+            reason = f"Error rate of {error_rate * 100:.1f}% exceeds the limit of " \
+                     f"{breaker_config['errorRate'] * 100:.1f}%"
+        elif p99_cpu > breaker_config['cpuBudgetMs']:
+            reason = f"p99 CPU time of {p99_cpu:.1f} ms exceeds the budget of {breaker_config['cpuBudgetMs']} ms"
+        elif p99_latency > breaker_config['latencyBudgetMs']:
+            reason = f"p99 latency of {p99_latency:.1f} ms exceeds the budget of " \
+                     f"{breaker_config['latencyBudgetMs']} ms"
+        else:
+            return
+
+        stats.trip(breaker_config['cooldownSeconds'], reason)
+        MODULE_TRIPS.labels(module_name).inc()
+        LOG.warning("Circuit breaker tripped for AntiSpam module %s: %s. Disabled until %s.",
+                    module_name, reason, stats.tripped_until.strftime(DATETIME_FORMAT))
+
+        embed = discord.Embed(
+            description=f"The AntiSpam module `{module_name}` has been temporarily disabled, as it exceeded its "
+                        f"configured budget. It will be re-enabled automatically.",
+            color=Colors.DANGER
+        )
+
+        embed.set_author(name=f"AntiSpam module {module_name} tripped!")
+        embed.add_field(name="Reason", value=reason, inline=False)
+        embed.add_field(name="Disabled Until", value=stats.tripped_until.strftime(DATETIME_FORMAT), inline=True)
+        embed.add_field(name="Times Tripped", value=str(stats.trip_count), inline=True)
+
+        await HuskyUtils.send_to_keyed_channel(self.bot, ChannelKeys.STAFF_LOG, embed)
+
+    def close_breaker(self, module_name: str, stats: antispam.ModuleStats):
+        # Reset right away (the notice is sent in the background), so the next message can't close it a second time.
+        stats.reset_breaker()
+
+        LOG.info("Circuit breaker cooldown for AntiSpam module %s has expired. Module re-enabled.", module_name)
+
+        asyncio.ensure_future(HuskyUtils.send_to_keyed_channel(self.bot, ChannelKeys.STAFF_LOG, discord.Embed(
+            description=f"The AntiSpam module `{module_name}` has finished its cooldown, and has been re-enabled.",
+            color=Colors.SUCCESS
+        ).set_author(name=f"AntiSpam module {module_name} re-enabled")))
 
     @commands.group(name="antispam", aliases=['as'], brief="Manage the Antispam configuration for the bot")
     @commands.has_permissions(manage_messages=True)
@@ -123,12 +249,14 @@ class AntiSpam(commands.Cog):
 
         Available Modules:
         ------------------
-            AttachmentFilter  :: Restrict the number of attachments/files a user can post in a certain time
-            InviteFilter      :: Block unauthorized Discord invites to other guilds
-            LinkFilter        :: Block messages that contain excessive links, or link-spamming users.
-            MentionFilter     :: Block users from "mention-spamming" over set thresholds.
-            NonAsciiFilter    :: Block messages composed of non-ASCII characters, like Zalgo
-            NonUniqueFilter   :: Monitor and take action against users who post the same messages over and over again.
+            AttachmentFilter     :: Restrict the number of attachments/files a user can post in a certain time
+            DuplicateFileFilter  :: Block the same file being spammed across many users or channels.
+            InviteFilter         :: Block unauthorized Discord invites to other guilds
+            LinkFilter           :: Block messages that contain excessive links, or link-spamming users.
+            MentionFilter        :: Block users from "mention-spamming" over set thresholds.
+            NonAsciiFilter       :: Block messages composed of non-ASCII characters, like Zalgo
+            NonUniqueFilter      :: Monitor and take action against users who post the same messages over and over
+                                    again.
 
         Parameters
         ----------
@@ -274,6 +402,76 @@ class AntiSpam(commands.Cog):
             color=Colors.SUCCESS
         ))
 
+    @asp.command(name="stats", brief="Show performance statistics for loaded AntiSpam modules")
+    async def module_stats(self, ctx: commands.Context):
+        """
+        Every loaded AntiSpam module is timed and accounted for as it processes messages. This command shows the call
+        count, error rate, latency percentiles and circuit breaker state for each module.
+
+        Latency is wall-clock time (including time spent waiting on Discord), while CPU is the time the module spent
+        actually holding the bot's event loop. Percentiles and error rates are calculated over a rolling window of
+        recent calls.
+
+        If a module exceeds its configured budget or error rate, it is temporarily disabled (tripped), and will
+        automatically re-enable after a cooldown.
+
+        The final field reports on the shared moderation queue that modules use to delete messages and remove users,
+        including how long actions wait in the queue and how many API calls were saved by batching.
+
+        See Also
+        --------
+            /as enable   :: Enable an AntiSpam Module.
+            /as disable  :: Disable a loaded module.
+        """
+
+        if not self.__stats__:
+            await ctx.send(embed=discord.Embed(
+                title="AntiSpam Module Statistics",
+                description="There are no AntiSpam modules loaded.",
+                color=Colors.WARNING
+            ))
+            return
+
+        embed = discord.Embed(
+            title="AntiSpam Module Statistics",
+            description="Performance over the rolling window of recent calls for each loaded module.",
+            color=Colors.INFO
+        )
+
+        for (module_name, stats) in self.__stats__.items():
+            if stats.is_tripped():
+                status = f"**Tripped** until {stats.tripped_until.strftime(DATETIME_FORMAT)}\n{stats.trip_reason}"
+            else:
+                status = "Running"
+
+            embed.add_field(
+                name=module_name,
+                value=f"**Calls:** {stats.calls} ({stats.errors} errors, {stats.error_rate() * 100:.1f}% recent)\n"
+                      f"**Latency:** p50 {stats.latency_percentile(0.5) * 1000:.1f} ms, "
+                      f"p99 {stats.latency_percentile(0.99) * 1000:.1f} ms\n"
+                      f"**CPU:** p50 {stats.cpu_percentile(0.5) * 1000:.2f} ms, "
+                      f"p99 {stats.cpu_percentile(0.99) * 1000:.2f} ms\n"
+                      f"**Status:** {status} (tripped {stats.trip_count} times)",
+                inline=False
+            )
+
+        queue_stats = self.bot.mod_actions.get_stats()
+        embed.add_field(
+            name="Moderation Queue",
+            value=f"**Deletes:** {queue_stats['deleteRequests']} requested, {queue_stats['deleteCalls']} API calls "
+                  f"({queue_stats['pendingDeletes']} pending)\n"
+                  f"**Kicks/Bans:** {queue_stats['removalRequests']} requested, "
+                  f"{queue_stats['removalCalls']} API calls\n"
+                  f"**Calls Saved:** {queue_stats['callsSaved']} ({queue_stats['rateLimited']} rate limits hit)\n"
+                  f"**Queue Latency:** p50 {queue_stats['latencyP50'] * 1000:.1f} ms, "
+                  f"p99 {queue_stats['latencyP99'] * 1000:.1f} ms",
+            inline=False
+        )
+
+        embed.set_footer(text=f"Report generated at {HuskyUtils.get_timestamp()}")
+
+        await ctx.send(embed=embed)
+
     @asp.group(name="exemptions", brief="Manage exemptions to the AntiSpam plugin")
     @commands.has_permissions(manage_guild=True)
     async def exemptions(self, ctx: commands.Context):
@@ -7,6 +7,7 @@ from discord.ext import commands
 
 from HuskyBot import HuskyBot
 from libhusky import HuskyChecks
+from libhusky import HuskyCompute
 from libhusky import HuskyUtils
 from libhusky.HuskyStatics import *
 
@@ -48,31 +49,46 @@ class AutoFlag(commands.Cog):
         if message.author.permissions_in(message.channel).manage_messages:
             return
 
-        for flag_term in flag_regexes:
-            if re.search(flag_term, message.content, re.IGNORECASE) is not None:
-                embed = discord.Embed(
-                    title=Emojis.RED_FLAG + " Message autoflag raised!",
-                    description=f"A message matching term `{flag_term}` was detected and has been raised to staff. "
-                                f"Please investigate.",
-                    color=Colors.WARNING
-                )
-
-                embed.add_field(name="Message Content", value=HuskyUtils.trim_string(message.content, 1000),
-                                inline=False)
-                embed.add_field(name="Message ID", value=message.id, inline=True)
-                embed.add_field(name="Channel", value=message.channel.mention, inline=True)
-                embed.add_field(name="User", value=message.author.mention, inline=True)
-                embed.add_field(name="Message Timestamp", value=message.created_at.strftime(DATETIME_FORMAT),
-                                inline=True)
-
-                if alert_channel is not None:
-                    await alert_channel.send(embed=embed, delete_after=self._delete_time)
-
-                if log_channel is not None:
-                    await log_channel.send(embed=embed)
-
-                LOG.info("Got flagged message (context %s, key %s, from %s in %s): %s", context,
-                         message.author, flag_term, message.channel, message.content)
+        if not flag_regexes:
+            return
+
+        # Not tied to the message, so staff still hear about flagged messages that were quickly deleted.
+        try:
+            matched = await self.bot.compute.run(
+                HuskyCompute.search_patterns, flag_regexes, message.content, re.IGNORECASE,
+                cost=HuskyCompute.estimate_search_patterns(flag_regexes, message.content)
+            )
+        except asyncio.TimeoutError:
+            LOG.warning("Timed out checking message %s (context %s, from %s in %s) against the flag list. Is one of "
+                        "the flags too expensive?", message.id, context, message.author, message.channel)
+            return
+
+        for index in matched:
+            flag_term = flag_regexes[index]
+
+            embed = discord.Embed(
+                title=Emojis.RED_FLAG + " Message autoflag raised!",
+                description=f"A message matching term `{flag_term}` was detected and has been raised to staff. "
+                            f"Please investigate.",
+                color=Colors.WARNING
+            )
+
+            embed.add_field(name="Message Content", value=HuskyUtils.trim_string(message.content, 1000),
+                            inline=False)
+            embed.add_field(name="Message ID", value=message.id, inline=True)
+            embed.add_field(name="Channel", value=message.channel.mention, inline=True)
+            embed.add_field(name="User", value=message.author.mention, inline=True)
+            embed.add_field(name="Message Timestamp", value=message.created_at.strftime(DATETIME_FORMAT),
+                            inline=True)
+
+            if alert_channel is not None:
+                await alert_channel.send(embed=embed, delete_after=self._delete_time)
+
+            if log_channel is not None:
+                await log_channel.send(embed=embed)
+
+            LOG.info("Got flagged message (context %s, key %s, from %s in %s): %s", context,
+                     message.author, flag_term, message.channel, message.content)
 
     async def user_filter(self, message: discord.Message):
         flag_users = self._config.get("flaggedUsers", [])
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 
@@ -6,6 +7,7 @@ from discord.ext import commands
 
 from HuskyBot import HuskyBot
 from libhusky import HuskyChecks
+from libhusky import HuskyCompute
 from libhusky import HuskyUtils
 from libhusky.HuskyStatics import Colors
 
@@ -60,12 +62,25 @@ class Censor(commands.Cog):
             else:
                 return
 
-        if any((re.search(censor_term, message.content, re.IGNORECASE) is not None) for censor_term in censor_list):
-            try:
-                await message.delete()
+        if not censor_list:
+            return
+
+        try:
+            matched = await self.bot.compute.run(
+                HuskyCompute.search_patterns, censor_list, message.content, re.IGNORECASE, True,
+                cost=HuskyCompute.estimate_search_patterns(censor_list, message.content),
+                message=message
+            )
+        except asyncio.TimeoutError:
+            LOG.warning("Timed out checking message %s (ctx %s, from %s in %s) against the censor list. Is one of "
+                        "the censors too expensive?", message.id, context, message.author, message.channel)
+            return
+
+        if matched:
+            if await self.bot.mod_actions.delete_message(message):
                 LOG.info("Deleted censored message (context %s, from %s in %s): %s", context, message.author,
                          message.channel, message.content)
-            except discord.NotFound:
+            else:
                 LOG.warning("I tried to delete a censored message (ID %s, ctx %s, from %s in %s), but I couldn't find "
                             "it. Was it already deleted?", message.id, context, message.author, message.channel)
 
@@ -37,9 +37,6 @@ class Debug(commands.Cog):
         self._session_store = bot.session_store
         LOG.info("Loaded plugin!")
 
-    def cog_unload(self):
-        HuskyHTTP.get_router().unload_plugin(self)
-
     @commands.group(name="debug")
     @commands.has_permissions(administrator=True)
     async def debug(self, ctx: discord.ext.commands.Context):
@@ -125,6 +122,38 @@ class Debug(commands.Cog):
 
         raise Exception("Random exception that was requested!")
 
+    @debug.command(name="loop", brief="Show event loop lag, and what last blocked the loop")
+    async def loop_lag(self, ctx: commands.Context, stall_index: int = 1):
+        """
+        Help documentation is not available for this plugin.
+        """
+        monitor = self.bot.loop_monitor
+        lag = monitor.lag_percentiles()
+
+        embed = discord.Embed(
+            title=Emojis.TIMER + " Event Loop Lag",
+            description=f"Based on the last {monitor.sample_count()} samples.",
+            color=Colors.INFO
+        )
+
+        embed.add_field(name="p50", value=f"{lag[0.5] * 1000:.1f} ms", inline=True)
+        embed.add_field(name="p95", value=f"{lag[0.95] * 1000:.1f} ms", inline=True)
+        embed.add_field(name="p99", value=f"{lag[0.99] * 1000:.1f} ms", inline=True)
+        embed.add_field(name="Max", value=f"{lag['max'] * 1000:.1f} ms", inline=True)
+        embed.add_field(name="Recent Stalls", value=str(len(monitor.stalls)), inline=True)
+
+        stalls = list(monitor.stalls)
+        if 0 < stall_index <= len(stalls):
+            stall = stalls[-stall_index]
+            started = datetime.datetime.utcfromtimestamp(stall.started).strftime(DATETIME_FORMAT)
+            duration = f"{stall.duration * 1000:.0f} ms" if stall.duration is not None else "still blocked"
+
+            # Field values are capped at 1024 characters, so keep the innermost (most relevant) frames.
+            embed.add_field(name=f"Stall #{stall_index} ({started}, {duration})",
+                            value=f"```{stall.stack[-950:]}```", inline=False)
+
+        await ctx.send(embed=embed)
+
     @debug.command(name="ping", brief="Get the latency (in ms) to the Discord servers")
     async def ping(self, ctx: commands.Context):
         """
@@ -326,7 +355,7 @@ class Debug(commands.Cog):
             return
 
         try:
-            async with aiohttp.client.request(method, url, data=data) as response:
+            async with self.bot.http_client.request(method, url, data=data, retries=0) as response:
                 if 100 <= response.status <= 199:
                     color = Colors.INFO
                 elif 200 <= response.status <= 299:
@@ -1,17 +1,15 @@
+import asyncio
 import json
 import logging
-import os
 import random
 import re
-import tempfile
 
 import aiohttp
 import discord
-from PIL import Image, ImageSequence
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
-from libhusky import HuskyUtils
+from libhusky import HuskyMedia, HuskyUtils
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
@@ -24,52 +22,24 @@ class DirtyHacks(commands.Cog):
 
     Discord is dumb.
     """
+    # The most of any one GIF to download while checking it. Bombs give themselves away in their first few kilobytes.
+    GIF_BYTE_BUDGET = 8 * 1024 * 1024
 
     def __init__(self, bot: HuskyBot):
         self.bot = bot
         self._config = bot.config
 
-        self._http_session = aiohttp.ClientSession(loop=bot.loop)
-
         LOG.info("Loaded plugin!")
 
-    def cog_unload(self):
-        self.bot.loop.create_task(self._http_session.close())
-
     @commands.Cog.listener(name="on_message")
     async def kill_abusive_gifs(self, message: discord.Message):
-        def undersized_gif_check(file) -> bool:
-            # Try to see if this gif is too big for its size (over 5000px^2, but less than 1mb)
-            (width, height) = HuskyUtils.get_image_size(file.name)
-
-            if (width > 5000) and (height > 5000) and os.path.getsize(file.name) < 1000000:
-                LOG.info("Found a GIF that exceeds sane size limits (over 5000px^2, but under 1mb)")
-                return True
-
-            return False
-
-        def too_large_frame_check(file) -> bool:
-            # Try to see if this gif has a too big frame
-            im = Image.open(file.name)
-            frames = ImageSequence.Iterator(im)
-            mx, my = im.size
-            for frame in frames:
-                x, y = frame.tile[0][1][2:]
-
-                if (mx + my) > 0 and ((x > 2 * mx) or (y > 2 * my)):
-                    # We found a frame that's way too big
-                    LOG.info("Found a GIF with an obscenely large frame.")
-                    return True
-
-            return False
-
         if not HuskyUtils.should_process_message(message):
             return
 
         matches = re.findall(Regex.URL_REGEX, message.content, re.IGNORECASE)
 
+        # The proxy URL serves the same file, so there's no need to check both.
         for attach in message.attachments:  # type: discord.Attachment
-            matches.append(attach.proxy_url)
             matches.append(attach.url)
 
         # If a message has no links, abort right now.
@@ -79,30 +49,70 @@ class DirtyHacks(commands.Cog):
         # deduplicate the list
         matches = list(set(matches))
 
+        analysis_cache = HuskyMedia.get_analysis_cache()
+
         for match in matches:  # type: str
             match = ''.join(match)
 
             if not match.endswith('.gif'):
-                return
+                continue
+
+            # Clean verdicts only come back for Discord attachments. Links elsewhere may point at a different file by
+            # now, so they're fetched again, and only reuse a verdict if their fingerprint identifies the whole file.
+            (_, verdict) = analysis_cache.lookup(match)
+
+            if verdict is None:
+                try:
+                    verdict = await self.check_gif(match)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as ex:
+                    LOG.warning(f"Failed to check GIF, because it couldn't be downloaded ({type(ex).__name__})")
+                    continue
+
+            if verdict is not None and verdict.is_bad:
+                LOG.info(f"Found an abusive GIF in message {message.id}: {verdict.reason}")
+                await self.bot.mod_actions.delete_message(message)
+                break
+
+    async def check_gif(self, url: str):
+        """
+        Download (as much as needed of) a GIF and check it for bombs, recording the verdict in the analysis cache.
+
+        A GIF already known to be bad is recognized from its fingerprint, without downloading any more of it.
+
+        :param url: The URL of the GIF to check.
+        :return: A MediaVerdict, or None if the URL couldn't be checked.
+        """
+        analysis_cache = HuskyMedia.get_analysis_cache()
+
+        async with self.bot.http_client.get(url) as r:  # type: aiohttp.ClientResponse
+            if r.status != 200:
+                LOG.warning("Failed to check GIF, because status code was not 200")
+                return None
+
+            if not r.headers.get('content-type', 'application/octet-stream').startswith('image'):
+                LOG.warning("Failed to check GIF, because content type was not image")
+                return None
+
+            head = await HuskyMedia.read_head(r)
+            size = r.content_length
+
+            if size is None and r.content.at_eof():
+                size = len(head)
 
-            with tempfile.NamedTemporaryFile(suffix=".gif") as f:
-                async with self._http_session.get(match) as r:  # type: aiohttp.ClientResponse
-                    if r.status != 200:
-                        LOG.warning("Failed to check GIF, because status code was not 200")
-                        return
+            fp = HuskyMedia.fingerprint(head, size) if size is not None else None
 
-                    if not r.headers.get('content-type', 'application/octet-stream').startswith('image'):
-                        LOG.warning("Failed to check GIF, because content type was not image")
-                        return
+            verdict = analysis_cache.lookup_fingerprint(fp) if fp is not None else None
 
-                    img_data = await r.read()
+            if verdict is None:
+                inspection = await HuskyMedia.inspect_gif(r, self.GIF_BYTE_BUDGET, head=head)
+                verdict = HuskyMedia.MediaVerdict(inspection.is_bomb, inspection.bomb_reason)
+            elif not r.content.at_eof():
+                r.close()
 
-                f.write(img_data)
-                f.flush()
+        if fp is not None:
+            analysis_cache.record(url, fp, verdict, size)
 
-                if undersized_gif_check(f) or too_large_frame_check(f):
-                    await message.delete()
-                    break
+        return verdict
 
     # @commands.Cog.listener(name="on_message")
 
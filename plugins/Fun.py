@@ -4,12 +4,11 @@ import random
 import re
 from datetime import datetime
 
-import aiohttp
 import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
-from libhusky import HuskyUtils, HuskyChecks
+from libhusky import HuskyUtils, HuskyChecks, HuskyResponseCache
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
@@ -21,21 +20,20 @@ class Fun(commands.Cog):
 
     ToDo: Delete this. And for the open release, don't judge me :(
     """
+    # A batch of random dogs, so one API call (cached for a few minutes) covers many /dog commands.
+    DOG_API_URL = "https://dog.ceo/api/breeds/image/random/50"
 
     def __init__(self, bot: HuskyBot):
         self.bot = bot
         self._config = bot.config
 
-        self._http_session = aiohttp.ClientSession(loop=bot.loop)
-
         # For those reading this code and wondering about the significance of 736580, it is a very important
         # number relating to someone I loved. </3
         self._master_rng_seed = 736580
 
-        LOG.info("Loaded plugin!")
+        self._dog_cache = HuskyResponseCache.get_cache("dog.ceo", ttl=10 * 60)
 
-    def cog_unload(self):
-        self.bot.loop.create_task(self._http_session.close())
+        LOG.info("Loaded plugin!")
 
     @commands.command(name="slap", brief="Slap a user silly!")
     @commands.guild_only()
@@ -214,16 +212,20 @@ class Fun(commands.Cog):
 
         await ctx.send(embed=embed)
 
+    async def _fetch_dogs(self):
+        async with self.bot.http_client.get(self.DOG_API_URL) as resp:
+            return await resp.json()
+
     @commands.command(name="dog", brief="Get a photo of a dog. Woof.", aliases=["getdog"])
     @commands.cooldown(1, 3, commands.BucketType.user)
     async def get_dog(self, ctx: commands.Context):
         """
         Dog.
         """
-        async with self._http_session.get("https://dog.ceo/api/breeds/image/random") as resp:
-            dog = await resp.json()
+        dogs = await self._dog_cache.get(HuskyResponseCache.make_key("GET", self.DOG_API_URL), self._fetch_dogs,
+                                         ttl=lambda d: self._dog_cache.ttl if d.get('status') == "success" else 0)
 
-        if dog.get('status') != "success":
+        if dogs.get('status') != "success":
             await ctx.send("Error getting dog. Why not play with a husky?")
             return
 
@@ -231,7 +233,7 @@ class Fun(commands.Cog):
             title="Dog."
         )
 
-        embed.set_image(url=dog.get('message'))
+        embed.set_image(url=random.choice(dogs.get('message')))
 
         await ctx.send(embed=embed)
 
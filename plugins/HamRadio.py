@@ -2,11 +2,11 @@ import datetime
 import logging
 import re
 
-import aiohttp
 import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
+from libhusky import HuskyResponseCache
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
@@ -16,16 +16,36 @@ LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
 class HamRadio(commands.Cog):
     CALLSIGN_LOOKUP_URL = "https://callook.info/{callsign}/json"
 
+    # How long callook.info results are cached for, by result status. Callook only picks up FCC changes daily, but new
+    # callsigns shouldn't stay invalid for long once they show up. Anything else (like UPDATING) isn't cached.
+    CALLSIGN_TTLS = {
+        "VALID": 6 * 60 * 60,
+        "INVALID": 60 * 60
+    }
+
     def __init__(self, bot: HuskyBot):
         self.bot = bot
         self._config = bot.config
 
-        self._http_session = aiohttp.ClientSession(loop=bot.loop)
+        self._callsign_cache = HuskyResponseCache.get_cache("callook", ttl=60 * 60, stale_ttl=24 * 60 * 60,
+                                                            disk_path="config/cache/callook")
 
         LOG.info("Loaded plugin!")
 
-    def cog_unload(self):
-        self.bot.loop.create_task(self._http_session.close())
+    async def _fetch_callsign(self, callsign: str):
+        async with self.bot.http_client.get(self.CALLSIGN_LOOKUP_URL.format(callsign=callsign)) as r:
+            if r.status != 200:
+                return r.status, None
+
+            return r.status, await r.json()
+
+    def _callsign_ttl(self, result) -> int:
+        (status_code, callsign_data) = result
+
+        if status_code != 200:
+            return 0
+
+        return self.CALLSIGN_TTLS.get(callsign_data['status'], 0)
 
     @commands.command(name="callsign", brief="Get information about a callsign")
     @commands.cooldown(1, 10, commands.BucketType.user)
@@ -33,7 +53,7 @@ class HamRadio(commands.Cog):
         """
         This command allows radio amateurs to query the FCC callsign database (via callook.info) to get basic
         information about radio amateurs. It only works (for now) for US callsigns, and is slightly delayed from the
-        official FCC record due to download and processing times.
+        official FCC record due to download and processing times. Lookups are cached for up to a few hours.
 
         In order to prevent API abuse, this command is restricted to one lookup every ten seconds.
 
@@ -58,17 +78,20 @@ class HamRadio(commands.Cog):
             ))
             return
 
-        async with self._http_session.get(self.CALLSIGN_LOOKUP_URL.format(callsign=callsign)) as r:
-            if r.status != 200:
-                await ctx.send(embed=discord.Embed(
-                    title="Callsign Server Error",
-                    description=f"The callsign lookup server responded with HTTP status code {r.status}. Please try "
-                                f"your query again later.",
-                    color=Colors.ERROR
-                ))
-                return
-
-            callsign_data = await r.json()
+        (status_code, callsign_data) = await self._callsign_cache.get(
+            HuskyResponseCache.make_key("GET", self.CALLSIGN_LOOKUP_URL, callsign=callsign),
+            lambda: self._fetch_callsign(callsign),
+            ttl=self._callsign_ttl
+        )
+
+        if status_code != 200:
+            await ctx.send(embed=discord.Embed(
+                title="Callsign Server Error",
+                description=f"The callsign lookup server responded with HTTP status code {status_code}. Please try "
+                            f"your query again later.",
+                color=Colors.ERROR
+            ))
+            return
 
         if callsign_data['status'] == "UPDATING":
             await ctx.send(embed=discord.Embed(
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import logging
 
@@ -7,8 +8,10 @@ from discord.http import Route
 
 from HuskyBot import HuskyBot
 from libhusky import HuskyConverters
+from libhusky import HuskyHistory
 from libhusky import HuskyUtils
 from libhusky.HuskyStatics import *
+from libhusky.managers.MessageStatsManager import MessageStatsManager
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
 
@@ -26,8 +29,67 @@ class Intelligence(commands.Cog):
 
     def __init__(self, bot: HuskyBot):
         self.bot = bot
+        self._message_stats = MessageStatsManager(bot)
         LOG.info("Loaded plugin!")
 
+    def cog_unload(self):
+        self._message_stats.cleanup()
+
+    async def _scan_history(self, ctx: commands.Context, channels: list, after: datetime.datetime, reducer, initial,
+                            title: str) -> HuskyHistory.HistoryScan:
+        """
+        Scan the history of channels that message statistics can't answer for, reporting progress to the invoking
+        channel. The invoker can cancel the scan by reacting to the progress message.
+        """
+        status_message = None
+        cancel_listener = None
+
+        async def wait_for_cancel(scan: HuskyHistory.HistoryScan):
+            def check(reaction: discord.Reaction, user: discord.User):
+                return reaction.message.id == status_message.id and user.id == ctx.author.id \
+                       and str(reaction.emoji) == Emojis.X
+
+            await self.bot.wait_for('reaction_add', check=check)
+            scan.cancel()
+
+        async def report_progress(scan: HuskyHistory.HistoryScan):
+            nonlocal status_message, cancel_listener
+
+            embed = discord.Embed(
+                title=title,
+                description=f"Scanned {scan.scanned} messages so far, in {scan.channels_done} of {len(channels)} "
+                            f"channels.\n\n{HuskyUtils.progress_bar(scan.channels_done, len(channels))}\n\n"
+                            f"React with {Emojis.X} to stop early.",
+                color=Colors.INFO
+            )
+
+            # Quick scans finish before ever needing a status message.
+            if status_message is None:
+                status_message = await ctx.send(embed=embed)
+                await status_message.add_reaction(Emojis.X)
+                cancel_listener = asyncio.ensure_future(wait_for_cancel(scan))
+            else:
+                await status_message.edit(embed=embed)
+
+        history_scan = HuskyHistory.HistoryScan(
+            channels, reducer, initial,
+            concurrency=self.bot.config.get('messageStats', {}).get('scanConcurrency', 4),
+            progress_callback=report_progress,
+            after=after
+        )
+
+        try:
+            async with ctx.typing():
+                await history_scan.run()
+        finally:
+            if cancel_listener is not None:
+                cancel_listener.cancel()
+
+            if status_message is not None:
+                await status_message.delete()
+
+        return history_scan
+
     @commands.command(name="guildinfo", aliases=["sinfo", "ginfo"], brief="Get information about the current guild")
     @commands.guild_only()
     async def guild_info(self, ctx: commands.Context):
@@ -201,7 +263,6 @@ class Intelligence(commands.Cog):
 
     @commands.command(name="msgcount", brief="Get a count of messages in a given context")
     @commands.has_permissions(manage_messages=True)
-    @commands.cooldown(1, 60, commands.BucketType.user)
     async def message_count(self, ctx: commands.Context,
                             search_context: HuskyConverters.ChannelContextConverter = "public",
                             timedelta: HuskyConverters.DateDiffConverter = "24h"):
@@ -214,10 +275,10 @@ class Intelligence(commands.Cog):
 
         Caveats
         -------
-          * It is important to know that this is a *slow* command, because it needs to iterate over every message
-            in the search channels in order to successfully operate. Because of this, the "Typing" indicator will
-            display. Also note that this command may not return accurate results due to the nature of the search system.
-            It should be used for approximation only.
+          * Counts are kept per hour, so the search start is rounded down to the start of its hour. Results should
+            be used for approximation only.
+          * Channels (or time ranges) that message statistics don't cover yet are scanned from history instead,
+            which is much slower. A progress message will be shown for long scans, which may be stopped early.
 
         Parameters
         ----------
@@ -243,41 +304,41 @@ class Intelligence(commands.Cog):
         if timedelta == "24h":
             timedelta = datetime.timedelta(hours=24)
 
-        message_count = 0
-
         now = datetime.datetime.utcnow()
         search_start = now - timedelta
 
-        async with ctx.typing():
-            for channel in search_context['channels']:
-                if not channel.permissions_for(ctx.me).read_message_history:
-                    LOG.info("I don't have permission to get information for channel %s", channel)
-                    continue
+        channels = search_context['channels']
+        complete = [c.id for c in channels if self._message_stats.is_complete(c.id, search_start)]
+        message_count = self._message_stats.count_messages(complete, search_start, now)
 
-                LOG.info("Getting history for %s", channel)
-                hist = channel.history(limit=None, after=search_start)
+        # Anything statistics don't cover yet has to be counted the slow way.
+        uncovered = [c for c in channels if c.id not in complete]
+        partial = False
 
-                async for _ in hist:
-                    message_count += 1
+        if uncovered:
+            history_scan = await self._scan_history(ctx, uncovered, search_start, lambda count, _: count + 1, 0,
+                                                    "Counting Messages...")
+            message_count += history_scan.result
+            partial = history_scan.cancelled
 
-            await ctx.send(embed=discord.Embed(
-                title="Message Count Report",
-                description=f"Since `{search_start.strftime(DATETIME_FORMAT)}`, the channel context "
-                            f"`{search_context['name']}` has seen about **{message_count} messages**.",
-                color=Colors.INFO
-            ))
+        await ctx.send(embed=discord.Embed(
+            title="Message Count Report",
+            description=f"Since `{search_start.strftime(DATETIME_FORMAT)}`, the channel context "
+                        f"`{search_context['name']}` has seen {'at least' if partial else 'about'} "
+                        f"**{message_count} messages**.",
+            color=Colors.INFO
+        ))
 
     @commands.command(name="activeusercount", brief="Get a count of active users on the guild", aliases=["auc"])
     @commands.has_permissions(view_audit_log=True)
-    @commands.cooldown(1, 60, commands.BucketType.user)
     async def active_user_count(self, ctx: commands.Context,
                                 search_context: HuskyConverters.ChannelContextConverter = "all",
                                 delta: HuskyConverters.DateDiffConverter = "24h",
                                 threshold: int = 10):
         """
-        This command will look back through message history and attempt to find the number of active users in the guild.
-        By default, it will look for all users that spoke in the specified search context. By default, it will only find
-        users who have sent at least ten messages in the specified search time
+        This command will look back through message statistics and attempt to find the number of active users in the
+        guild. By default, it will look for all users that spoke in the specified search context. By default, it will
+        only find users who have sent at least ten messages in the specified search time
 
         This command operates on "context" logic, much like /msgcount. Context are the same as there - either a channel,
         the word "public", or the word "all".
@@ -286,10 +347,10 @@ class Intelligence(commands.Cog):
 
         Caveats
         -------
-          * It is important to know that this is a *slow* command, because it needs to iterate over every message
-            in the search channels in order to successfully operate. Because of this, the "Typing" indicator will
-            display. Also note that this command may not return accurate results due to the nature of the search system.
-            It should be used for approximation only.
+          * Counts are kept per hour, so the search start is rounded down to the start of its hour. Results should
+            be used for approximation only.
+          * Channels (or time ranges) that message statistics don't cover yet are scanned from history instead,
+            which is much slower. A progress message will be shown for long scans, which may be stopped early.
 
         Parameters
         ----------
@@ -311,30 +372,25 @@ class Intelligence(commands.Cog):
         if delta == "24h":
             delta = datetime.timedelta(hours=24)
 
-        message_counts = {}
-        active_user_count = 0
-
         now = datetime.datetime.utcnow()
         search_start = now - delta
 
-        async with ctx.typing():
-            for channel in search_context['channels']:
-                if not channel.permissions_for(ctx.me).read_message_history:
-                    LOG.info("I don't have permission to get information for channel %s", channel)
-                    continue
+        channels = search_context['channels']
+        complete = [c.id for c in channels if self._message_stats.is_complete(c.id, search_start)]
+        message_counts = self._message_stats.count_by_author(complete, search_start, now)
+
+        uncovered = [c for c in channels if c.id not in complete]
 
-                LOG.info("Getting history for %s", channel)
-                hist = channel.history(limit=None, after=search_start)
+        if uncovered:
+            def tally(counts: dict, message: discord.Message):
+                if not message.author.bot:
+                    counts[message.author.id] = counts.get(message.author.id, 0) + 1
 
-                async for m in hist:  # type: discord.Message
-                    if m.author.bot:
-                        continue
+                return counts
 
-                    message_counts[m.author.id] = message_counts.get(m.author.id, 0) + 1
+            await self._scan_history(ctx, uncovered, search_start, tally, message_counts, "Counting Active Users...")
 
-            for user in message_counts:
-                if message_counts[user] >= threshold:
-                    active_user_count += 1
+        active_user_count = sum(1 for count in message_counts.values() if count >= threshold)
 
         await ctx.send(embed=discord.Embed(
             title="Active User Count Report",
@@ -395,14 +451,11 @@ class Intelligence(commands.Cog):
             /help activeusercount  :: Get a count of active users on the guild.
         """
 
-        breakdown = {}
-
-        for u in ctx.guild.members:  # type: discord.Member
-            breakdown[u.status] = breakdown.get(u.status, 0) + 1
+        breakdown = self.bot.member_counts.get_status_counts(ctx.guild)
 
         embed = discord.Embed(
             title=Emojis.WAVE + " User Count Report",
-            description=f"{ctx.guild.name} currently has **{sum(breakdown.values())} total users**.\n\n"
+            description=f"{ctx.guild.name} currently has **{ctx.guild.member_count} total users**.\n\n"
                         f"**Online Users:** {breakdown[discord.Status.online]}\n"
                         f"**Idle Users:** {breakdown[discord.Status.idle]}\n"
                         f"**DND Users:** {breakdown[discord.Status.dnd]}\n"
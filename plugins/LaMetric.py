@@ -43,7 +43,10 @@ class LaMetric(commands.Cog):
         self.bot = bot
         self._config = bot.config
 
-        self._api = LaMetricApi.LaMetricApi(loop=bot.loop)
+        self._api = LaMetricApi.LaMetricApi(bot.http_client)
+
+        # Member counts change on every join and leave, so pushes are coalesced rather than sent for each one.
+        self._pusher = LaMetricApi.PushCoalescer(self._api, loop=bot.loop)
 
         self._pending_registrations = {}
         '''
@@ -53,8 +56,8 @@ class LaMetric(commands.Cog):
 
         LOG.info("Loaded plugin!")
 
-    def __cleanup(self):
-        self._api.cleanup()
+    def cog_unload(self):
+        self._pusher.cancel()
 
     async def update_lametric_counts(self, guild: discord.Guild):
         lametric_conf = self._config.get('lametric', {})
@@ -71,8 +74,9 @@ class LaMetric(commands.Cog):
             if "userCount" not in device.get("enabledTasks", []):
                 continue
 
-            LOG.info(f"Updating usercount for LaMetric device ID {device_id}")
-            await self._api.push(device['appId'], LaMetricApi.build_data(icon, new_count), device['authToken'])
+            LOG.debug(f"Queueing usercount update for LaMetric device ID {device_id}")
+            self._pusher.submit(device_id, device['appId'], device['authToken'],
+                                LaMetricApi.build_data(icon, new_count))
 
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
@@ -255,6 +259,7 @@ class LaMetric(commands.Cog):
             raise commands.BadArgument("This Device ID is not known.")
 
         del devices[device_id.lower()]
+        self._pusher.forget(device_id.lower())
 
         self._config.set('lametric', lametric_conf)
 
@@ -1,17 +1,142 @@
 import logging
 
+import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
+from libhusky.HuskyStatics import *
+from libhusky.managers.LeaderboardManager import LeaderboardManager, WINDOWS
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
 
+WINDOW_ALIASES = {
+    "day": "day", "today": "day", "daily": "day", "d": "day",
+    "week": "week", "weekly": "week", "w": "week",
+    "all": "all", "alltime": "all", "forever": "all", "a": "all"
+}
+
+WINDOW_NAMES = {
+    "day": "Today",
+    "week": "This Week",
+    "all": "All Time"
+}
+
 
-# noinspection PyMethodMayBeStatic
 class Leaderboards(commands.Cog):
-    def __init__(self):
-        raise Exception("Module borked. DISABLE ME.")
+    """
+    The Leaderboards plugin ranks guild members by how active they are.
+
+    Every message sent on the guild (by a non-bot) counts as one point on each of the daily, weekly, and all-time
+    leaderboards. The daily and weekly leaderboards start over at midnight UTC and on Mondays respectively.
+    """
+
+    def __init__(self, bot: HuskyBot):
+        self.bot = bot
+        self._leaderboard_manager = LeaderboardManager(bot)
+        LOG.info("Loaded plugin!")
+
+    def cog_unload(self):
+        self._leaderboard_manager.cleanup()
+
+    @commands.group(name="leaderboard", brief="See the most active members of the guild", aliases=["lb", "top"],
+                    usage="[day|week|all|subcommand]", invoke_without_command=True)
+    @commands.guild_only()
+    async def leaderboard(self, ctx: commands.Context, window: str = "week"):
+        """
+        This command shows the ten most active members of the guild, ranked by the number of messages they've sent.
+
+        Leaderboards are kept for three windows: "day" (since midnight UTC), "week" (since Monday), and "all" (since the
+        leaderboard was enabled).
+
+        Parameters
+        ----------
+            ctx     :: Command context <!nodoc>
+            window  :: The leaderboard to show - "day", "week", or "all". Defaults to "week".
+
+        Examples
+        --------
+            /leaderboard      :: Show this week's leaderboard
+            /leaderboard day  :: Show today's leaderboard
+            /leaderboard all  :: Show the all-time leaderboard
+
+        See Also
+        --------
+            /leaderboard rank  :: See where a member ranks on every leaderboard
+        """
+        window_key = WINDOW_ALIASES.get(window.lower())
+
+        if window_key is None:
+            await ctx.send(embed=discord.Embed(
+                title="Unknown leaderboard",
+                description=f"There is no leaderboard called `{window}`. Please use one of: "
+                            f"{', '.join(f'`{w}`' for w in WINDOWS)}.",
+                color=Colors.DANGER
+            ))
+            return
+
+        ledger = self._leaderboard_manager.get_ledger(ctx.guild.id, window_key)
+        entries = ledger.top(10)
+
+        if not entries:
+            await ctx.send(embed=discord.Embed(
+                title=f"{Emojis.CROWN} Leaderboard: {WINDOW_NAMES[window_key]}",
+                description="Nobody has said anything yet!",
+                color=Colors.INFO
+            ))
+            return
+
+        lines = []
+        for (rank, user_id, score) in entries:
+            lines.append(f"**#{rank}** - <@{user_id}> ({score} {'message' if score == 1 else 'messages'})")
+
+        embed = discord.Embed(
+            title=f"{Emojis.CROWN} Leaderboard: {WINDOW_NAMES[window_key]}",
+            description="\n".join(lines),
+            color=Colors.INFO
+        )
+
+        own_rank = ledger.rank(ctx.author.id)
+        if own_rank is not None:
+            embed.set_footer(text=f"You are ranked #{own_rank} of {len(ledger)} with "
+                                  f"{ledger.get(ctx.author.id)} messages.")
+
+        await ctx.send(embed=embed)
+
+    @leaderboard.command(name="rank", brief="See where a member ranks on the leaderboards")
+    async def rank(self, ctx: commands.Context, member: discord.Member = None):
+        """
+        This command shows a member's rank and message count on every leaderboard.
+
+        Parameters
+        ----------
+            ctx     :: Command context <!nodoc>
+            member  :: The member to look up. Defaults to yourself.
+
+        Examples
+        --------
+            /leaderboard rank            :: See your own ranks
+            /leaderboard rank @Dog#4171  :: See the ranks of a user named Dog
+        """
+        member = member or ctx.author
+
+        embed = discord.Embed(
+            title=f"{Emojis.CROWN} Leaderboard ranks for {member}",
+            color=Colors.INFO
+        )
+
+        for window in WINDOWS:
+            ledger = self._leaderboard_manager.get_ledger(ctx.guild.id, window)
+            rank = ledger.rank(member.id)
+
+            if rank is None:
+                value = "Unranked"
+            else:
+                value = f"#{rank} of {len(ledger)} ({ledger.get(member.id)} messages)"
+
+            embed.add_field(name=WINDOW_NAMES[window], value=value, inline=True)
+
+        await ctx.send(embed=embed)
 
 
 def setup(bot: HuskyBot):
-    bot.add_cog(Leaderboards())
+    bot.add_cog(Leaderboards(bot))
@@ -1,11 +1,11 @@
 import json
 import logging
 
-import aiohttp
 import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
+from libhusky import HuskyResponseCache
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
@@ -17,12 +17,20 @@ class Math(commands.Cog):
         self.bot = bot
         self._config = bot.config
 
-        self._http_session = aiohttp.ClientSession(loop=bot.loop)
+        # rtex keeps rendered images around for a while, so identical TeX can reuse the last render instead of
+        # rendering it again.
+        self._render_cache = HuskyResponseCache.get_cache("rtex", ttl=30 * 60)
 
         LOG.info("Loaded plugin!")
 
-    def cog_unload(self):
-        self.bot.loop.create_task(self._http_session.close())
+    def _render_ttl(self, result) -> int:
+        (status_code, response_data) = result
+
+        # Failed renders aren't cached, as they may just be the service having a bad moment.
+        if status_code != 200 or response_data.get('status') != 'success':
+            return 0
+
+        return self._render_cache.ttl
 
     @commands.command(name="latex", brief="Generate and render some LaTeX code [EXPERIMENTAL]")
     @commands.cooldown(1, 10, commands.BucketType.user)
@@ -61,15 +69,17 @@ class Math(commands.Cog):
                         f"\\pagenumbering{{gobble}}\n" \
                         f" \\end{{document}}"
 
-        response = await self._http_session.post(api_url, data={
-            "code": latex_wrapped,
-            "format": "png"
-        })
+        async def render():
+            async with self.bot.http_client.post(api_url, data={"code": latex_wrapped, "format": "png"}) as response:
+                return response.status, json.loads(await response.text())
 
-        response_data = json.loads(await response.text())
-        was_successful = response.status == 200 and response_data.get('status') == 'success'
+        (status_code, response_data) = await self._render_cache.get(
+            HuskyResponseCache.make_key("POST", api_url, code=latex_wrapped, format="png"),
+            render,
+            ttl=self._render_ttl
+        )
 
-        response.close()
+        was_successful = status_code == 200 and response_data.get('status') == 'success'
 
         embed = discord.Embed(
             title="Rendered LaTeX",
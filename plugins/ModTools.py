@@ -1,4 +1,6 @@
+import asyncio
 import datetime
+import io
 import logging
 import re
 
@@ -84,9 +86,15 @@ class ModTools(commands.Cog):
         --------
             /help ban  :: Command to ban users from the guild.
         """
+        is_banned = await self.bot.ban_index.is_banned(ctx.guild, user.id)
+
         try:
-            await ctx.guild.unban(user, reason=f"Unbanned by {ctx.author}")
+            if is_banned:
+                await ctx.guild.unban(user, reason=f"Unbanned by {ctx.author}")
         except discord.NotFound:
+            is_banned = False
+
+        if not is_banned:
             await ctx.send(embed=discord.Embed(
                 title="Mod Toolkit",
                 description=f"User `{user}` is not banned on this guild, so they can not be unbanned.",
@@ -167,9 +175,7 @@ class ModTools(commands.Cog):
             ))
             return
 
-        ban_entry = discord.utils.get(await ctx.guild.bans(), user=user)
-
-        if ban_entry is not None:
+        if await self.bot.ban_index.is_banned(ctx.guild, user.id):
             await ctx.send(embed=discord.Embed(
                 title="Moderator Toolkit",
                 description=f"How can one kill which is already dead? User `{user}` was already banned from the guild.",
@@ -191,7 +197,8 @@ class ModTools(commands.Cog):
     async def warn(self, ctx: discord.ext.commands.Context, target: discord.Member, *, reason: str):
         pass
 
-    @commands.command(name="mute", brief="Temporarily mute a user from the current channel")
+    @commands.group(name="mute", brief="Temporarily mute a user from the current channel",
+                    invoke_without_command=True)
     @commands.has_permissions(manage_messages=True)
     async def mute(self, ctx: discord.ext.commands.Context, target: discord.Member,
                    time: HuskyConverters.DateDiffConverter, *, reason: str):
@@ -273,6 +280,100 @@ class ModTools(commands.Cog):
             color=Colors.WARNING
         ))
 
+    @mute.command(name="bulk", brief="Mute a large number of users from the guild at once")
+    @commands.has_permissions(ban_members=True)
+    async def mute_bulk(self, ctx: commands.Context, time: HuskyConverters.DateDiffConverter, reason: str, *users):
+        """
+        During a raid, it may be necessary to silence a large number of accounts at once. This command will guild mute
+        (see /globalmute) every listed user, and post a single summary to the staff log instead of one per user.
+
+        Users that are already guild muted are skipped, as are users at or above you in the role hierarchy. Progress is
+        reported as the mutes are applied.
+
+        Parameters
+        ----------
+            ctx     :: Discord context <!nodoc>
+            time    :: A ##d##h##m##s string to represent mute time, or 0/perm/- for a permanent mute
+            reason  :: The reason for the mutes, must be "in quotes" if containing spaces.
+            users   :: A list of users (space separated) to mute.
+
+        Examples
+        --------
+            /mute bulk 1d "raid accounts" 123 345 SomeUser  :: Mute three users from the guild for a day
+
+        See Also
+        --------
+            /globalmute    :: Mute a single user across all channels
+            /globalunmute  :: Reverse an active standing global mute
+        """
+        converter = commands.MemberConverter()
+        targets = {}
+        rejected = []
+
+        for user_selector in users:
+            try:
+                member = await converter.convert(ctx, user_selector)
+            except commands.BadArgument:
+                rejected.append(f"{user_selector} - NOT_FOUND")
+                continue
+
+            if member == ctx.bot.user or member.top_role.position >= ctx.author.top_role.position:
+                rejected.append(f"{user_selector} - IS_ABOVE_USER")
+                continue
+
+            targets[member.id] = member
+
+        if time is None:
+            mute_until = None
+        else:
+            mute_until = int((datetime.datetime.utcnow() + time).timestamp())
+
+        status_message = await ctx.send(embed=discord.Embed(
+            title=Emojis.MUTE + " Bulk Mute In Progress",
+            description=f"Muting {len(targets)} users...\n\n{HuskyUtils.progress_bar(0, len(targets))}",
+            color=Colors.INFO
+        ))
+
+        last_update = datetime.datetime.utcnow()
+
+        async def progress(completed, total):
+            nonlocal last_update
+
+            # Don't let progress edits compete with the mutes themselves for rate limit.
+            if completed < total and (datetime.datetime.utcnow() - last_update).total_seconds() < 2:
+                return
+
+            last_update = datetime.datetime.utcnow()
+            await status_message.edit(embed=discord.Embed(
+                title=Emojis.MUTE + " Bulk Mute In Progress",
+                description=f"Muting {total} users...\n\n{HuskyUtils.progress_bar(completed, total)}",
+                color=Colors.INFO
+            ))
+
+        report = await self._mute_manager.mute_users_bulk(ctx.guild, list(targets.values()), reason, mute_until,
+                                                          str(ctx.author), progress_callback=progress)
+
+        failed = rejected + [f"{m} - {e.text or e.status}" for (m, e) in report['failed']]
+
+        embed = discord.Embed(
+            title=Emojis.MUTE + " Bulk Mute Complete",
+            description=f"{len(report['succeeded'])} users muted from the guild.\n"
+                        f"{len(report['skipped'])} users were already muted.\n"
+                        f"{len(failed)} users could not be muted.\n\n"
+                        f"{HuskyUtils.progress_bar(len(targets), len(targets))}",
+            color=Colors.SUCCESS if not failed else Colors.WARNING
+        )
+
+        if report['succeeded']:
+            embed.add_field(name="Muted Users", value=HuskyUtils.trim_string(
+                ", ".join(str(m) for m in report['succeeded']), 1000, True, "..."), inline=False)
+
+        if failed:
+            embed.add_field(name="Failed Mutes", value=HuskyUtils.trim_string("\n".join(failed), 1000, True, "\n..."),
+                            inline=False)
+
+        await status_message.edit(embed=embed)
+
     @commands.command(name="globalmute", aliases=["gmute"],
                       brief="Temporarily mute a user from the guild")
     @commands.has_permissions(ban_members=True)
@@ -454,6 +555,7 @@ class ModTools(commands.Cog):
 
             --[user|member|author] <user reference>  :: Filter by a specific user
             --[regex] <regex>                        :: Filter by a regular expression
+            --[channel|in] <channel context>         :: Clean up a different channel (or channels)
 
         If multiple filters of the same type are used, *any* will match to delete the message. For example, running
         "/cleanup 100 --user 123 --user 456" will delete all messages posted by users 123 and 456 that it finds in the
@@ -465,20 +567,28 @@ class ModTools(commands.Cog):
         These can be combined, so "/cleanup 100 --user 123 --user 456 --regex cat" will delete any mention of regex
         `cat` by users 123 or 456 in the last 100 messages.
 
+        The channel flag takes a channel context (see /help msgcount) - a channel, a comma-separated list of channels,
+        or the words "public" or "all". If it's not given, only the current channel is cleaned up. Lookback applies to
+        each channel separately.
+
         The "lookback" value is the number of messages to search for messages that match the defined filters. If no
         filters are defined, then *all* messages match, and lookback will be the total number of messages to delete.
+
+        Progress is reported periodically for large cleanups.
         """
 
         # BE VERY CAREFUL TOUCHING THIS METHOD!
-        def generate_cleanup_filter():
+        async def generate_cleanup_filter():
+            channels = []
+
             if filter_def is None:
-                return None
+                return None, channels
 
             content_list = filter_def.split('--')
 
             # Filter types
             regex_list = []
-            user_list = []
+            user_set = set()
 
             for filter_candidate in content_list:
                 if filter_candidate is None or filter_candidate == '':
@@ -489,25 +599,148 @@ class ModTools(commands.Cog):
 
                 if filter_candidate[0] in ["user", "author", "member"]:
                     user_id = HuskyUtils.get_user_id_from_arbitrary_str(ctx.guild, filter_candidate[1])
-                    user_list.append(user_id)
+                    user_set.add(user_id)
                 elif filter_candidate[0] in ["regex"]:
-                    regex_list.append(filter_candidate[1])
+                    try:
+                        regex_list.append(re.compile(filter_candidate[1]))
+                    except re.error as e:
+                        raise commands.BadArgument(f"The regex `{filter_candidate[1]}` is invalid: {e}")
+                elif filter_candidate[0] in ["channel", "in"]:
+                    context = await HuskyConverters.ChannelContextConverter().convert(ctx, filter_candidate[1])
+                    channels += context['channels']
                 else:
                     raise KeyError(f"Filter {filter_candidate[0]} is not valid!")
 
+            if not user_set and not regex_list:
+                return None, channels
+
             def dynamic_check(message: discord.Message):
-                if len(user_list) > 0 and message.author.id not in user_list:
+                if user_set and message.author.id not in user_set:
                     return False
 
                 for regex in regex_list:
-                    if len(regex_list) > 0 and re.search(regex, message.content) is None:
+                    if regex.search(message.content) is None:
                         return False
 
                 return True
 
-            return dynamic_check
+            return dynamic_check, channels
+
+        check, channels = await generate_cleanup_filter()
+
+        await self._run_cleanup(ctx, channels or [ctx.channel], lookback, check)
+
+    async def _run_cleanup(self, ctx: commands.Context, channels: list, lookback: int, check):
+        """
+        Stream history for each channel, and hand matching messages to the moderation queue to be deleted.
+
+        The queue takes care of batching deletes into bulk deletes of up to 100 messages (and falling back to single
+        deletes for messages too old to bulk delete). Only one batch per channel is held in memory at a time.
+
+        The command's permission check only covers the channel it was run in, so every other channel is checked here -
+        channels the invoking moderator can't read or manage messages in are skipped (and reported).
+        """
+        allowed = []
+        skipped = []
+
+        for channel in channels:  # type: discord.TextChannel
+            mod_permissions = channel.permissions_for(ctx.author)
+
+            if not (mod_permissions.read_messages and mod_permissions.manage_messages):
+                skipped.append(channel)
+            else:
+                allowed.append(channel)
+
+        if skipped:
+            LOG.info(f"Cleanup by {ctx.author} skipped {len(skipped)} channels they can't manage messages in.")
 
-        await ctx.channel.purge(limit=lookback + 1, check=generate_cleanup_filter(), bulk=True)
+            await ctx.send(embed=discord.Embed(
+                title="Cleanup Channels Skipped" if allowed else "Cleanup Refused",
+                description=f"You can't manage messages in {len(skipped)} of the requested channels, so "
+                            f"{'they will be skipped' if allowed else 'nothing will be cleaned up'}:\n\n"
+                            + ", ".join(c.mention for c in skipped[:50])
+                            + (f" and {len(skipped) - 50} more" if len(skipped) > 50 else ""),
+                color=(Colors.WARNING if allowed else Colors.DANGER)
+            ))
+
+            if not allowed:
+                return
+
+        channels = allowed
+
+        stats = {"scanned": 0, "deleted": 0, "channels": 0}
+        status_message = None
+        last_update = datetime.datetime.utcnow()
+
+        async def report_progress(final: bool = False):
+            nonlocal status_message, last_update
+
+            if not final and (datetime.datetime.utcnow() - last_update).total_seconds() < 5:
+                return
+
+            last_update = datetime.datetime.utcnow()
+            embed = discord.Embed(
+                title=("Cleanup Complete" if final else "Cleanup In Progress"),
+                description=f"Scanned {stats['scanned']} messages in {stats['channels']} of {len(channels)} channels, "
+                            f"and deleted {stats['deleted']}.",
+                color=(Colors.SUCCESS if final else Colors.INFO)
+            )
+
+            if status_message is None:
+                # Small cleanups finish before ever needing a status message, so they stay quiet like they used to.
+                if final:
+                    return
+
+                status_message = await ctx.send(embed=embed)
+            else:
+                await status_message.edit(embed=embed, delete_after=(10 if final else None))
+
+        async def delete_batch(batch: list):
+            results = await asyncio.gather(*[self.bot.mod_actions.delete_message(m, quiet=True) for m in batch],
+                                           return_exceptions=True)
+            stats['deleted'] += sum(1 for r in results if r is True)
+
+        for channel in channels:  # type: discord.TextChannel
+            if not channel.permissions_for(ctx.me).manage_messages:
+                LOG.info("Skipping cleanup of %s, as I can't manage messages there.", channel)
+                continue
+
+            pending_delete = None
+            batch = []
+
+            # The command message itself is counted in the lookback for the current channel, as it always has been.
+            limit = lookback + 1 if channel == ctx.channel else lookback
+
+            async for message in channel.history(limit=limit):
+                stats['scanned'] += 1
+
+                if status_message is not None and message.id == status_message.id:
+                    continue
+
+                if check is None or check(message):
+                    batch.append(message)
+
+                if len(batch) >= 100:
+                    # Keep one batch deleting while the next is being collected.
+                    if pending_delete is not None:
+                        await pending_delete
+
+                    pending_delete = asyncio.ensure_future(delete_batch(batch))
+                    batch = []
+
+                await report_progress()
+
+            if pending_delete is not None:
+                await pending_delete
+
+            if batch:
+                await delete_batch(batch)
+
+            stats['channels'] += 1
+
+        LOG.info(f"Cleanup by {ctx.author} scanned {stats['scanned']} messages in {len(channels)} channels and "
+                 f"deleted {stats['deleted']}.")
+        await report_progress(final=True)
 
     @commands.command(name="editban", brief="Edit a banned user's reason")
     @commands.has_permissions(ban_members=True)
@@ -534,7 +767,7 @@ class ModTools(commands.Cog):
         # noinspection PyTypeChecker
         user: discord.User = user
 
-        ban_entry = discord.utils.get(await ctx.guild.bans(), user=user)
+        ban_entry = await self.bot.ban_index.get(ctx.guild, user.id)
 
         if ban_entry is None:
             await ctx.send(embed=discord.Embed(
@@ -782,12 +1015,19 @@ class ModTools(commands.Cog):
 
         await HuskyUtils.send_to_keyed_channel(ctx.bot, ChannelKeys.STAFF_LOG, log_entry)
 
-    @commands.command(name="massban", brief="Ban a large number of users at once", aliases=["mban"])
+    @commands.group(name="massban", brief="Ban a large number of users at once", aliases=["mban"],
+                    invoke_without_command=True)
     @commands.has_permissions(ban_members=True)
     async def mass_ban(self, ctx: commands.Context, reason: str, *users):
         """
         Massively ban a list of users programatically. This will delete the past day of message history for all users.
 
+        Users given by ID (or mention) are banned directly by ID, without needing to look them up first, so users not
+        on the guild may be banned as well. Bans run in parallel, and progress is reported as they complete. If any
+        bans fail, a full report is attached as a file.
+
+        If the bot is interrupted partway through a mass ban, it may be continued with /massban resume.
+
         Parameters
         ----------
             ctx     :: Discord context <!nodoc>
@@ -798,43 +1038,130 @@ class ModTools(commands.Cog):
         --------
             /mban "bot accounts" 123 345 SomeUser
 
+        See Also
+        --------
+            /massban resume  :: Resume an interrupted mass ban
         """
-        report = {"succeeded": [], "failed": []}
-        converter = HuskyConverters.OfflineMemberConverter()
+        converter = commands.MemberConverter()
+        targets = {}
+        hackbans = []
+        failed = []
 
         for user_selector in users:
-            try:
-                user = await converter.convert(ctx, user_selector)
+            id_match = re.match(r'^(?:<@!?)?([0-9]{15,21})>?$', user_selector)
+
+            if id_match is not None:
+                user_id = int(id_match.group(1))
+                member = ctx.guild.get_member(user_id)
+            else:
+                try:
+                    member = await converter.convert(ctx, user_selector)
+                except commands.BadArgument:
+                    failed.append(f"{user_selector} - NOT_FOUND")
+                    continue
 
-                if user == ctx.author:
-                    raise discord.DiscordException("IS_SELF")
+                user_id = member.id
 
-                if user == ctx.bot.user:
-                    raise discord.DiscordException("IS_BOT")
+            if user_id == ctx.author.id:
+                failed.append(f"{user_selector} - IS_SELF")
+            elif user_id == ctx.bot.user.id:
+                failed.append(f"{user_selector} - IS_BOT")
+            elif member is not None and member.top_role.position >= ctx.author.top_role.position:
+                failed.append(f"{user_selector} - IS_ABOVE_USER")
+            elif await self.bot.ban_index.is_banned(ctx.guild, user_id):
+                failed.append(f"{user_selector} - ALREADY_BANNED")
+            else:
+                targets[user_id] = user_selector
 
-                is_trueban = isinstance(user, discord.Member)
-                if is_trueban and (user.top_role.position >= ctx.message.author.top_role.position):
-                    raise discord.DiscordException("IS_ABOVE_USER")
+                if member is None:
+                    hackbans.append(user_id)
 
-                ban_prefix = f"[{'HACKBAN | ' if not is_trueban else ''}MASSBAN | By {ctx.author}] "
-                await ctx.guild.ban(user, reason=ban_prefix + reason, delete_message_days=1)
-                report['succeeded'].append(user_selector)
-            except discord.DiscordException as e:
-                report['failed'].append(f"{user_selector} - {''.join(e.args) if e.args else 'OTHER_ERR'}")
-                LOG.error("Massban Error", e)
-                continue
+        # Users who aren't on the guild are marked as hackbans in the audit log, as they always have been.
+        hackban_reason = f"[HACKBAN | MASSBAN | By {ctx.author}] {reason}"
+
+        await self._run_mass_ban(ctx, str(ctx.message.id), f"[MASSBAN | By {ctx.author}] {reason}",
+                                 list(targets.keys()), failed, {user_id: hackban_reason for user_id in hackbans})
+
+    @mass_ban.command(name="resume", brief="Resume an interrupted mass ban")
+    @commands.has_permissions(ban_members=True)
+    async def mass_ban_resume(self, ctx: commands.Context, job_id: str = None):
+        """
+        If the bot restarted or crashed during a mass ban, the remaining users can be banned with this command.
+
+        With no arguments, this command will list all interrupted mass bans for this guild. Pass a job ID from that
+        list to resume it.
+
+        Parameters
+        ----------
+            ctx     :: Discord context <!nodoc>
+            job_id  :: The ID of the interrupted mass ban to resume.
+        """
+        jobs = {k: v for (k, v) in self.bot.mod_actions.get_interrupted_bulk_bans().items()
+                if v['guild'] == ctx.guild.id}
+
+        if job_id is None or job_id not in jobs:
+            if not jobs:
+                description = "There are no interrupted mass bans for this guild."
+            else:
+                description = "\n".join(f"`{k}` - {len(v['pending'])} users remaining (reason: {v['reason']})"
+                                        for (k, v) in jobs.items())
+
+            await ctx.send(embed=discord.Embed(
+                title="Interrupted Mass Bans",
+                description=description,
+                color=Colors.INFO
+            ))
+            return
+
+        await self._run_mass_ban(ctx, job_id, None, None, [])
+
+    async def _run_mass_ban(self, ctx: commands.Context, job_id: str, reason, user_ids, failed: list,
+                            reasons: dict = None):
+        status_message = await ctx.send(embed=discord.Embed(
+            title=Emojis.BAN + " Mass Ban In Progress",
+            description="Starting mass ban...",
+            color=Colors.INFO
+        ))
+
+        last_update = datetime.datetime.utcnow()
+
+        async def progress(completed, total):
+            nonlocal last_update
+
+            # Keep edits infrequent, so they don't eat into the rate limit the bans need.
+            if completed < total and (datetime.datetime.utcnow() - last_update).total_seconds() < 2:
+                return
+
+            last_update = datetime.datetime.utcnow()
+            await status_message.edit(embed=discord.Embed(
+                title=Emojis.BAN + " Mass Ban In Progress",
+                description=f"Banning {total} users...\n\n{HuskyUtils.progress_bar(completed, total)}",
+                color=Colors.INFO
+            ))
+
+        if user_ids is None:
+            report = await self.bot.mod_actions.resume_bulk_ban(ctx.guild, job_id, progress_callback=progress)
+        else:
+            report = await self.bot.mod_actions.bulk_ban(ctx.guild, user_ids, reason, job_id=job_id,
+                                                         progress_callback=progress, reasons=reasons)
+
+        failed += [f"{user_id} - {error}" for (user_id, error) in report['failed']]
 
         embed = discord.Embed(
             title="Mass Ban Report",
             description=f"{len(report['succeeded'])} users banned.\n"
-            f"{len(report['failed'])} failed to ban. Nonexistent user or other error.",
+                        f"{len(failed)} failed to ban. Nonexistent user or other error.",
             color=Colors.INFO
         )
 
-        if 0 < len(report['failed']) < 5:
-            embed.add_field(name="Failed Bans", value="\n".join(report['failed']))
+        await status_message.delete()
 
-        await ctx.send(embed=embed)
+        if failed:
+            report_file = discord.File(io.BytesIO("\n".join(failed).encode('utf-8')),
+                                       filename=f"massban-{job_id}-failures.txt")
+            await ctx.send(embed=embed, file=report_file)
+        else:
+            await ctx.send(embed=embed)
 
 
 def setup(bot: HuskyBot):
@@ -1,14 +1,23 @@
+import collections
 import logging
+import time
 
 import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
-from libhusky import HuskyUtils, HuskyConverters
+from libhusky import HuskyUtils, HuskyConverters, HuskyMetrics
 from libhusky.HuskyStatics import *
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
 
+# How long to wait for the pins update caused by our own pin or unpin, before assuming it's not coming.
+PIN_ECHO_TIMEOUT = 30
+
+CACHE_REQUESTS = HuskyMetrics.get_registry().counter(
+    "husky_cache_requests_total", "Cache lookups, by cache and result (hit or miss).", ("cache", "result")
+)
+
 
 class ReactToPin(commands.Cog):
     """
@@ -44,22 +53,102 @@ class ReactToPin(commands.Cog):
         self.bot = bot
         self._config = bot.config
 
+        # { channel_id: { message_id: discord.Message } }, newest pin first.
+        self._pin_cache = {}
+
+        # { channel_id: deque(deadline) } - pins updates we expect from our own pins and unpins, which the cache
+        # already reflects. Anything else means someone changed the pins, and the channel is reloaded.
+        self._pin_echoes = {}
+
         LOG.info("Loaded plugin!")
 
-    async def count_reactions(self, message: discord.Message, emoji: discord.PartialEmoji):
-        count = 0
+    async def get_pins(self, channel: discord.TextChannel) -> dict:
+        """
+        Get the pinned messages for a channel, newest first, as a dict of message ID to message.
 
-        for reaction in message.reactions:
-            if str(reaction.emoji) != str(emoji):
-                continue
+        Pins are only requested from Discord the first time a channel is seen (or after its pins change), rather than
+        on every reaction.
+        """
+        pins = self._pin_cache.get(channel.id)
+
+        CACHE_REQUESTS.labels("pins", "hit" if pins is not None else "miss").inc()
+
+        if pins is None:
+            pins = {m.id: m for m in await channel.pins()}
+            self._pin_cache[channel.id] = pins
+            LOG.debug(f"Loaded {len(pins)} pins for channel {channel} into the pin cache.")
 
-            async for user in reaction.users():
-                if user == self.bot.user or user == message.author:
-                    continue
+        return pins
 
-                count += 1
+    async def pin_message(self, message: discord.Message):
+        await self._pin_change(message, message.pin)
+
+        if message.channel.id in self._pin_cache:
+            self._pin_cache[message.channel.id] = {message.id: message, **self._pin_cache[message.channel.id]}
+
+    async def unpin_message(self, message: discord.Message):
+        await self._pin_change(message, message.unpin)
+
+        if message.channel.id in self._pin_cache:
+            self._pin_cache[message.channel.id].pop(message.id, None)
+
+    async def _pin_change(self, message: discord.Message, func):
+        # Expected before the request is even sent, as the gateway may deliver the echo before the response arrives.
+        echoes = self._pin_echoes.setdefault(message.channel.id, collections.deque())
+        deadline = time.monotonic() + PIN_ECHO_TIMEOUT
+        echoes.append(deadline)
+
+        try:
+            await func()
+        except Exception:
+            # No change, so no echo.
+            if deadline in echoes:
+                echoes.remove(deadline)
+
+            raise
+
+    def _consume_pin_echo(self, channel_id: int) -> bool:
+        """
+        Check whether a pins update for a channel is the echo of one of our own pins or unpins.
+        """
+        echoes = self._pin_echoes.get(channel_id)
 
-            break  # optimization to not loop after we find the response we need
+        if not echoes:
+            return False
+
+        now = time.monotonic()
+
+        while echoes and echoes[0] < now:
+            echoes.popleft()
+
+        if not echoes:
+            del self._pin_echoes[channel_id]
+            return False
+
+        echoes.popleft()
+        return True
+
+    async def get_message(self, channel: discord.TextChannel, message_id: int) -> discord.Message:
+        # Recent messages are usually still in dpy's message cache, so try that before asking Discord.
+        message = self.bot._connection._get_message(message_id)
+        CACHE_REQUESTS.labels("messages", "hit" if message is not None else "miss").inc()
+
+        if message is None:
+            message = await channel.fetch_message(message_id)
+
+        return message
+
+    def get_channel_config(self, channel_id: int):
+        channel_config = self._config.get('reactToPin', {}).get(str(channel_id))  # type: dict
+
+        if channel_config is None or not channel_config.get('enabled', False):
+            LOG.debug(f"A pin configuration was not found for channel {channel_id}. Ignoring message.")
+            return None
+
+        return channel_config
+
+    async def count_reactions(self, message: discord.Message, emoji: discord.PartialEmoji):
+        count = await self.bot.reaction_index.count(message, emoji, exclude=[self.bot.user.id, message.author.id])
 
         LOG.debug(f"Message {message.id} has {count} reactions of type {emoji} on it.")
         return count
@@ -67,7 +156,7 @@ class ReactToPin(commands.Cog):
     async def smart_unpin_oldest(self, channel: discord.TextChannel):
         persistent_pinned_messages = self._config.get('reactToPin', {}).get(str(channel.id), {}).get('permanent', [])
 
-        pin_list = reversed(await channel.pins())
+        pin_list = reversed(list((await self.get_pins(channel)).values()))
 
         for item in pin_list:  # type: discord.Message
             if item.id in persistent_pinned_messages:
@@ -75,33 +164,48 @@ class ReactToPin(commands.Cog):
 
             # we have something we can unpin, go ahead and do it, and then break
             LOG.info(f"Unpinned message ID {item.id} from channel {channel} using SmartUnpin")
-            await item.unpin()
+            await self.unpin_message(item)
             return
 
         raise EOFError("No messages are eligible to be unpinned!")
 
-    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
-        channel = self.bot.get_channel(payload.channel_id)  # type: discord.TextChannel
-        message = await channel.fetch_message(payload.message_id)  # type: discord.Message
+    @commands.Cog.listener()
+    async def on_guild_channel_pins_update(self, channel: discord.abc.GuildChannel, last_pin):
+        # Our own pins and unpins were already applied to the cache, so there's nothing to reload for them.
+        if self._consume_pin_echo(channel.id):
+            return
 
-        channel_config = self._config.get('reactToPin', {}).get(str(channel.id))  # type: dict
+        self._pin_cache.pop(channel.id, None)
 
-        LOG.debug("Got react event, processing.")
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel: discord.abc.GuildChannel):
+        self._pin_cache.pop(channel.id, None)
+        self._pin_echoes.pop(channel.id, None)
 
-        if not HuskyUtils.should_process_message(message):
+    @commands.Cog.listener()
+    async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
+        channel_config = self.get_channel_config(payload.channel_id)
+
+        if channel_config is None:
             return
 
-        if channel_config is None or not channel_config.get('enabled', False):
-            LOG.debug(f"A pin configuration was not found for channel {channel}. Ignoring message.")
+        if str(payload.emoji) != channel_config.get('emoji'):
+            LOG.debug(f"Got an invalid emoji for message {payload.message_id} in channel {payload.channel_id}, "
+                      f"ignoring.")
             return
 
+        channel = self.bot.get_channel(payload.channel_id)  # type: discord.TextChannel
+
+        LOG.debug("Got react event, processing.")
+
         # Check if the message is pinned
-        if message in await channel.pins():
+        if payload.message_id in await self.get_pins(channel):
             LOG.debug("Can't repin an already-pinned message.")
             return
 
-        if str(payload.emoji) != channel_config.get('emoji'):
-            LOG.debug(f"Got an invalid emoji for message {message.id} in channel {channel}, ignoring.")
+        message = await self.get_message(channel, payload.message_id)
+
+        if not HuskyUtils.should_process_message(message):
             return
 
         # we are in a valid channel now, with a valid emote.
@@ -111,7 +215,7 @@ class ReactToPin(commands.Cog):
             LOG.debug("Got a valid emote reaction, but still below pin threshold. Ignoring (for now).")
             return
 
-        if len(await channel.pins()) >= 50:
+        if len(await self.get_pins(channel)) >= 50:
             LOG.debug("Too many pins in the current channel, removing oldest one using smart unpin.")
             try:
                 await self.smart_unpin_oldest(channel)
@@ -129,33 +233,35 @@ class ReactToPin(commands.Cog):
 
                 return
 
-        await message.pin()
+        await self.pin_message(message)
         LOG.info(f"Pinned message {message.id} in {channel}, as it got enough reactions.")
 
+    @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload: discord.RawReactionActionEvent):
-        channel = self.bot.get_channel(payload.channel_id)  # type: discord.TextChannel
-        message = await channel.fetch_message(payload.message_id)  # type: discord.Message
+        channel_config = self.get_channel_config(payload.channel_id)
 
-        channel_config = self._config.get('reactToPin', {}).get(str(channel.id))  # type: dict
+        if channel_config is None:
+            return
 
-        if not HuskyUtils.should_process_message(message):
+        if str(payload.emoji) != channel_config.get('emoji'):
+            LOG.debug(f"Got an invalid emoji for message {payload.message_id} in channel {payload.channel_id}, "
+                      f"ignoring.")
             return
 
-        if channel_config is None or not channel_config.get('enabled', False):
-            LOG.debug(f"A pin configuration was not found for channel {channel}. Ignoring message.")
+        if payload.message_id in channel_config.get('permanent', []):
+            LOG.info("Reactions dropped below threshold on permanently pinned message, ignoring but logging.")
             return
 
+        channel = self.bot.get_channel(payload.channel_id)  # type: discord.TextChannel
+
         # Check if the message is pinned
-        if message not in await channel.pins():
+        if payload.message_id not in await self.get_pins(channel):
             LOG.debug("Can't unpin a message that isn't currently pinned.")
             return
 
-        if str(payload.emoji) != channel_config.get('emoji'):
-            LOG.debug(f"Got an invalid emoji for message {message.id} in channel {channel}, ignoring.")
-            return
+        message = await self.get_message(channel, payload.message_id)
 
-        if message.id in channel_config.get('permanent', []):
-            LOG.info("Reactions dropped below threshold on permanently pinned message, ignoring but logging.")
+        if not HuskyUtils.should_process_message(message):
             return
 
         # we are in a valid channel now, with a valid emote.
@@ -165,30 +271,36 @@ class ReactToPin(commands.Cog):
             LOG.debug("Got a valid removal event for the emote, but there are too many reactions to unpin.")
             return
 
-        await message.unpin()
+        await self.unpin_message(message)
         LOG.info(f"Unpinned previously pinned message {message.id} in {channel}, as it is no longer at the required "
                  f"reaction count.")
 
+    @commands.Cog.listener()
     async def on_raw_reaction_clear(self, event: discord.RawReactionClearEvent):
-        channel = self.bot.get_channel(event.channel_id)  # type: discord.TextChannel
-        message = await channel.fetch_message(event.message_id)  # type: discord.Message
+        channel_config = self.get_channel_config(event.channel_id)
 
-        channel_config = self._config.get('reactToPin', {}).get(str(channel.id))  # type: dict
-
-        if not HuskyUtils.should_process_message(message):
+        if channel_config is None:
             return
 
-        if message.id in channel_config.get('permanent', []):
+        if event.message_id in channel_config.get('permanent', []):
             LOG.info("Reactions were cleared on a permanently pinned message, ignoring.")
             return
 
+        channel = self.bot.get_channel(event.channel_id)  # type: discord.TextChannel
+
         # Check if the message is pinned
-        if message not in await channel.pins():
+        if event.message_id not in await self.get_pins(channel):
             LOG.debug("Can't unpin a message that isn't currently pinned.")
             return
 
-        await message.unpin()
+        message = await self.get_message(channel, event.message_id)
+
+        if not HuskyUtils.should_process_message(message):
+            return
 
+        await self.unpin_message(message)
+
+    @commands.Cog.listener()
     async def on_raw_message_edit(self, event: discord.RawMessageUpdateEvent):
         message_id = event.message_id
         channel_id = event.data.get('channel_id', None)
@@ -211,10 +323,13 @@ class ReactToPin(commands.Cog):
 
         self._config.set('reactToPin', plugin_config)
 
+    @commands.Cog.listener()
     async def on_raw_message_delete(self, event: discord.RawMessageDeleteEvent):
         message_id = event.message_id
         channel_id = event.channel_id
 
+        self._pin_cache.get(channel_id, {}).pop(message_id, None)
+
         plugin_config = self._config.get('reactToPin', {})  # type: dict
         channel_config = plugin_config.get(str(channel_id), {})
         permapinned = channel_config.setdefault('permanent', [])
@@ -228,9 +343,13 @@ class ReactToPin(commands.Cog):
 
         self._config.set('reactToPin', plugin_config)
 
+    @commands.Cog.listener()
     async def on_raw_bulk_message_delete(self, event: discord.RawBulkMessageDeleteEvent):
         channel_id = event.channel_id
 
+        for message_id in event.message_ids:
+            self._pin_cache.get(channel_id, {}).pop(message_id, None)
+
         plugin_config = self._config.get('reactToPin', {})  # type: dict
         channel_config = plugin_config.get(str(channel_id), {})
         permapinned = channel_config.setdefault('permanent', [])
@@ -361,7 +480,7 @@ class ReactToPin(commands.Cog):
             await ctx.send("Message is already permanently pinned.")
             return
 
-        await message.pin()
+        await self.pin_message(message)
 
         perm_pins.append(message.id)
 
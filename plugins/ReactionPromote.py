@@ -210,10 +210,10 @@ class ReactionPromote(commands.Cog):
         # Clean up the entry as well.
         try:
             message: discord.Message = await channel.fetch_message(message_id)
-            reaction: discord.Reaction = discord.utils.get(message.reactions, emoji=emoji)
-            async for user in reaction.users():
-                self.roleRemovalBlacklist.append(str(user.id) + str(message_id))
-                await message.remove_reaction(emoji, user)
+
+            for user_id in list(await self.bot.reaction_index.get_reactors(message, emoji)):
+                self.roleRemovalBlacklist.append(str(user_id) + str(message_id))
+                await message.remove_reaction(emoji, discord.Object(id=user_id))
 
         except discord.NotFound as _:
             pass
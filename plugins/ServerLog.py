@@ -134,7 +134,7 @@ class ServerLog(commands.Cog):
             color=Colors.DANGER
         )
 
-        ban_entry = discord.utils.get(await guild.bans(), user=user)
+        ban_entry = await self.bot.ban_index.resolve_reason(guild, user)
 
         if ban_entry is None:
             raise ValueError(f"A ban record for user {user.id} was expected, but no entry was found")
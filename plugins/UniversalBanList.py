@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 
@@ -5,6 +6,7 @@ import discord
 from discord.ext import commands
 
 from HuskyBot import HuskyBot
+from libhusky import HuskyCompute
 from libhusky import HuskyUtils, HuskyStatics
 
 LOG = logging.getLogger("HuskyBot.Plugin." + __name__)
@@ -65,13 +67,30 @@ class UniversalBanList(commands.Cog):
         if message.author.permissions_in(message.channel).manage_messages:
             return
 
-        for ubl_term in self.bot.config.get('ubl', {}).get('bannedPhrases', []):
-            if re.search(ubl_term, message.content, re.IGNORECASE) is not None:
-                await message.author.ban(reason=f"User used UBL keyword `{ubl_term}`. Purging user...",
-                                         delete_message_days=5)
-                await message.guild.unban(message.author, reason="UBL ban reversal")
-                LOG.info("Kicked UBL triggering user (context %s, keyword %s, from %s in %s): %s", context,
-                         message.author, ubl_term, message.channel, message.content)
+        banned_phrases = self.bot.config.get('ubl', {}).get('bannedPhrases', [])
+
+        if not banned_phrases:
+            return
+
+        # Not tied to the message - deleting it quickly shouldn't get anyone out of the ban.
+        try:
+            matched = await self.bot.compute.run(
+                HuskyCompute.search_patterns, banned_phrases, message.content, re.IGNORECASE,
+                cost=HuskyCompute.estimate_search_patterns(banned_phrases, message.content)
+            )
+        except asyncio.TimeoutError:
+            LOG.warning("Timed out checking message %s (context %s, from %s in %s) against the UBL. Is one of the "
+                        "phrases too expensive?", message.id, context, message.author, message.channel)
+            return
+
+        for index in matched:
+            ubl_term = banned_phrases[index]
+
+            await self.bot.mod_actions.softban(message.author,
+                                               reason=f"User used UBL keyword `{ubl_term}`. Purging user...",
+                                               delete_message_days=5)
+            LOG.info("Kicked UBL triggering user (context %s, keyword %s, from %s in %s): %s", context,
+                     message.author, ubl_term, message.channel, message.content)
 
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -89,8 +108,8 @@ class UniversalBanList(commands.Cog):
 
         for ubl_term in self.get_banned_usernames():
             if re.search(ubl_term, member.display_name, re.IGNORECASE) is not None:
-                await member.kick(reason=f"[AUTOMATIC KICK - UBL Module] New user's name contains UBL keyword "
-                                         f"`{ubl_term}`")
+                await self.bot.mod_actions.kick(member, reason=f"[AUTOMATIC KICK - UBL Module] New user's name "
+                                                               f"contains UBL keyword `{ubl_term}`")
                 LOG.info("Kicked UBL triggering new join of user %s (matching UBL %s)", member, ubl_term)
 
     @commands.Cog.listener()
@@ -109,8 +128,8 @@ class UniversalBanList(commands.Cog):
             else:
                 continue
 
-            await after.kick(reason=f"[AUTOMATIC BAN - UBL Module] User {after} changed {u_type} to include UBL "
-                                    f"keyword {ubl_term}")
+            await self.bot.mod_actions.kick(after, reason=f"[AUTOMATIC BAN - UBL Module] User {after} changed "
+                                                          f"{u_type} to include UBL keyword {ubl_term}")
             LOG.info("Kicked UBL triggering %s change of user %s (matching UBL %s)", u_type, after, ubl_term)
 
 
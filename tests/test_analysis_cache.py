@@ -0,0 +1,148 @@
+import unittest
+
+from libhusky import HuskyMedia
+
+ATTACHMENT_URL = "https://cdn.discordapp.com/attachments/1/2/cat.gif"
+REMOTE_URL = "https://example.com/cat.gif"
+
+SMALL = HuskyMedia.FINGERPRINT_BYTES
+LARGE = HuskyMedia.FINGERPRINT_BYTES + 1
+
+
+def clean():
+    return HuskyMedia.MediaVerdict(False)
+
+
+def bad(reason: str = "GIF bomb"):
+    return HuskyMedia.MediaVerdict(True, reason)
+
+
+class ImmutableUrlTest(unittest.TestCase):
+    def test_discord_attachments(self):
+        self.assertTrue(HuskyMedia.is_immutable_url(ATTACHMENT_URL))
+        self.assertTrue(HuskyMedia.is_immutable_url("https://media.discordapp.net/attachments/1/2/cat.gif"))
+
+    def test_other_urls(self):
+        self.assertFalse(HuskyMedia.is_immutable_url(REMOTE_URL))
+        self.assertFalse(HuskyMedia.is_immutable_url("https://cdn.discordapp.com/emojis/1.gif"))
+        self.assertFalse(HuskyMedia.is_immutable_url("https://cdn.discordapp.com.example.com/attachments/1/2/a.gif"))
+        self.assertFalse(HuskyMedia.is_immutable_url("http://[::1"))
+
+
+class UrlTierTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = HuskyMedia.AnalysisCache()
+
+    def test_unknown_url(self):
+        self.assertEqual(self.cache.lookup(ATTACHMENT_URL), (None, None))
+
+    def test_clean_attachment_is_trusted(self):
+        verdict = clean()
+        self.cache.record(ATTACHMENT_URL, "fp", verdict, size=LARGE)
+
+        self.assertEqual(self.cache.lookup(ATTACHMENT_URL), ("fp", verdict))
+
+    def test_clean_remote_file_is_not_trusted(self):
+        self.cache.record(REMOTE_URL, "fp", clean(), size=LARGE)
+
+        # The fingerprint is known, but the file has to be fetched again to check it.
+        self.assertEqual(self.cache.lookup(REMOTE_URL), ("fp", None))
+
+    def test_clean_remote_file_trusted_by_whole_fingerprint(self):
+        verdict = clean()
+        self.cache.record(REMOTE_URL, "fp", verdict, size=SMALL)
+
+        self.assertEqual(self.cache.lookup(REMOTE_URL), ("fp", None))
+        self.assertIs(self.cache.lookup_fingerprint("fp"), verdict)
+
+    def test_bad_remote_file(self):
+        verdict = bad()
+        self.cache.record(REMOTE_URL, "fp", verdict, size=LARGE)
+
+        self.assertEqual(self.cache.lookup(REMOTE_URL), ("fp", verdict))
+
+    def test_unjudged_url(self):
+        self.cache.record(ATTACHMENT_URL, "fp")
+
+        self.assertEqual(self.cache.lookup(ATTACHMENT_URL), ("fp", None))
+
+
+class FingerprintTierTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = HuskyMedia.AnalysisCache()
+
+    def test_bad_verdict_follows_fingerprint(self):
+        verdict = bad()
+        self.cache.record(ATTACHMENT_URL, "fp", verdict, size=LARGE)
+
+        self.assertIs(self.cache.lookup_fingerprint("fp"), verdict)
+
+    def test_partial_fingerprint_clean_verdict_not_shared(self):
+        self.cache.record(ATTACHMENT_URL, "fp", clean(), size=LARGE)
+
+        self.assertIsNone(self.cache.lookup_fingerprint("fp"))
+
+    def test_block_overrides_clean_url_verdict(self):
+        self.cache.record(ATTACHMENT_URL, "fp", clean(), size=LARGE)
+        self.cache.block("fp", "manually blocked")
+
+        (fp, verdict) = self.cache.lookup(ATTACHMENT_URL)
+
+        self.assertEqual(fp, "fp")
+        self.assertTrue(verdict.is_bad)
+        self.assertEqual(verdict.reason, "manually blocked")
+
+    def test_unblock(self):
+        self.cache.record(ATTACHMENT_URL, "abc1", bad(), size=LARGE)
+        self.cache.block("abc2", "manually blocked")
+        self.cache.block("def", "manually blocked")
+
+        self.assertEqual(self.cache.unblock("abc"), 2)
+
+        self.assertIsNone(self.cache.lookup_fingerprint("abc1"))
+        self.assertIsNone(self.cache.lookup_fingerprint("abc2"))
+        self.assertEqual(self.cache.lookup(ATTACHMENT_URL), ("abc1", None))
+        self.assertEqual(self.cache.blocked(), [("def", "manually blocked")])
+
+    def test_unblock_leaves_clean_verdicts(self):
+        verdict = clean()
+        self.cache.record(REMOTE_URL, "abc", verdict, size=SMALL)
+
+        self.assertEqual(self.cache.unblock("abc"), 0)
+        self.assertIs(self.cache.lookup_fingerprint("abc"), verdict)
+
+    def test_blocked_most_recent_first(self):
+        self.cache.block("one", "first")
+        self.cache.block("two", "second")
+        self.cache.record(REMOTE_URL, "three", clean(), size=SMALL)
+
+        self.assertEqual(self.cache.blocked(), [("two", "second"), ("one", "first")])
+
+
+class ExpiryTest(unittest.TestCase):
+    def test_entries_expire(self):
+        cache = HuskyMedia.AnalysisCache(ttl=-1, bad_ttl=-1)
+        cache.record(ATTACHMENT_URL, "fp", bad(), size=LARGE)
+
+        self.assertEqual(cache.lookup(ATTACHMENT_URL), (None, None))
+        self.assertIsNone(cache.lookup_fingerprint("fp"))
+        self.assertEqual(cache.blocked(), [])
+
+    def test_bad_verdicts_kept_longer(self):
+        cache = HuskyMedia.AnalysisCache(ttl=-1)
+        cache.record(ATTACHMENT_URL, "fp", bad(), size=LARGE)
+        cache.record(REMOTE_URL, "other", clean(), size=SMALL)
+
+        self.assertTrue(cache.lookup(ATTACHMENT_URL)[1].is_bad)
+        self.assertEqual(cache.lookup(REMOTE_URL), (None, None))
+
+    def test_least_recently_used_evicted(self):
+        cache = HuskyMedia.AnalysisCache(max_entries=2)
+
+        cache.record("https://cdn.discordapp.com/attachments/1/1/a.gif", "a")
+        cache.record("https://cdn.discordapp.com/attachments/1/2/b.gif", "b")
+        cache.lookup("https://cdn.discordapp.com/attachments/1/1/a.gif")
+        cache.record("https://cdn.discordapp.com/attachments/1/3/c.gif", "c")
+
+        self.assertEqual(cache.lookup("https://cdn.discordapp.com/attachments/1/1/a.gif"), ("a", None))
+        self.assertEqual(cache.lookup("https://cdn.discordapp.com/attachments/1/2/b.gif"), (None, None))
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from libhusky import antispam
+from plugins import AntiSpam
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+class ModuleStatsTest(unittest.TestCase):
+    def test_percentiles_and_error_rate(self):
+        stats = antispam.ModuleStats()
+
+        for i in range(100):
+            stats.record(latency=i / 1000, cpu_time=i / 10000, errored=(i % 4 == 0))
+
+        self.assertEqual(stats.calls, 100)
+        self.assertEqual(stats.errors, 25)
+        self.assertAlmostEqual(stats.error_rate(), 0.25)
+        self.assertAlmostEqual(stats.latency_percentile(0.99), 0.098)
+        self.assertAlmostEqual(stats.cpu_percentile(0.5), 0.0050)
+
+    def test_window_forgets_old_samples(self):
+        stats = antispam.ModuleStats(window=10)
+
+        for _ in range(10):
+            stats.record(1.0, 1.0, True)
+
+        for _ in range(10):
+            stats.record(0.001, 0.001, False)
+
+        self.assertEqual(stats.window_size(), 10)
+        self.assertEqual(stats.error_rate(), 0.0)
+        self.assertEqual(stats.latency_percentile(0.99), 0.001)
+
+        # Lifetime totals aren't windowed.
+        self.assertEqual(stats.errors, 10)
+
+    def test_trip_and_reset(self):
+        stats = antispam.ModuleStats()
+        stats.record(1.0, 1.0, True)
+
+        stats.trip(60, "testing")
+        self.assertTrue(stats.is_tripped())
+        self.assertEqual(stats.trip_count, 1)
+
+        stats.reset_breaker()
+        self.assertFalse(stats.is_tripped())
+        self.assertEqual(stats.window_size(), 0)
+        self.assertEqual(stats.trip_count, 1)
+
+    def test_expired_trip(self):
+        stats = antispam.ModuleStats()
+        stats.trip(-1, "already over")
+
+        self.assertFalse(stats.is_tripped())
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.plugin = AntiSpam.AntiSpam.__new__(AntiSpam.AntiSpam)
+        self.plugin.bot = None
+        self.plugin._config = {}
+
+        self.notices = []
+
+        async def send_to_keyed_channel(bot, channel, embed):
+            self.notices.append(embed)
+
+        patcher = mock.patch.object(AntiSpam.HuskyUtils, 'send_to_keyed_channel', send_to_keyed_channel)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, stats: antispam.ModuleStats):
+        run(self.plugin.check_breaker("TestModule", stats))
+
+    def fill(self, calls: int, latency: float = 0.001, cpu_time: float = 0.001, errors: int = 0):
+        stats = antispam.ModuleStats()
+
+        for i in range(calls):
+            stats.record(latency, cpu_time, i < errors)
+
+        return stats
+
+    def test_healthy_module_stays_enabled(self):
+        stats = self.fill(100)
+        self.check(stats)
+
+        self.assertFalse(stats.is_tripped())
+        self.assertEqual(self.notices, [])
+
+    def test_needs_min_calls(self):
+        defaults = AntiSpam.breaker_defaults
+        stats = self.fill(defaults['minCalls'] - 1, errors=defaults['minCalls'] - 1)
+        self.check(stats)
+
+        self.assertFalse(stats.is_tripped())
+
+    def test_trips_on_error_rate(self):
+        stats = self.fill(100, errors=25)
+        self.check(stats)
+
+        self.assertTrue(stats.is_tripped())
+        self.assertIn("Error rate", stats.trip_reason)
+        self.assertEqual(len(self.notices), 1)
+
+    def test_error_rate_below_limit(self):
+        stats = self.fill(100, errors=24)
+        self.check(stats)
+
+        self.assertFalse(stats.is_tripped())
+
+    def test_trips_on_cpu_budget(self):
+        stats = self.fill(100, cpu_time=(AntiSpam.breaker_defaults['cpuBudgetMs'] + 1) / 1000)
+        self.check(stats)
+
+        self.assertTrue(stats.is_tripped())
+        self.assertIn("CPU", stats.trip_reason)
+
+    def test_trips_on_latency_budget(self):
+        stats = self.fill(100, latency=(AntiSpam.breaker_defaults['latencyBudgetMs'] + 1) / 1000)
+        self.check(stats)
+
+        self.assertTrue(stats.is_tripped())
+        self.assertIn("latency", stats.trip_reason)
+
+    def test_configured_budget(self):
+        self.plugin._config = {'antiSpam': {'__global__': {'circuitBreaker': {'cpuBudgetMs': 0.5}}}}
+
+        stats = self.fill(100, cpu_time=0.001)
+        self.check(stats)
+
+        self.assertTrue(stats.is_tripped())
+
+    def test_tripped_module_not_tripped_again(self):
+        stats = self.fill(100, errors=100)
+        self.check(stats)
+        self.check(stats)
+
+        self.assertEqual(stats.trip_count, 1)
+        self.assertEqual(len(self.notices), 1)
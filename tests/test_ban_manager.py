@@ -0,0 +1,146 @@
+import asyncio
+import types
+import unittest
+from unittest import mock
+
+import discord
+from discord.guild import BanEntry
+
+from libhusky.managers import BanManager as bm
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def http_error(cls, status: int, text: str = ""):
+    return cls(types.SimpleNamespace(status=status, reason=text), text)
+
+
+class FakeBot:
+    def __init__(self):
+        self.loop = asyncio.get_event_loop()
+        self.guilds = []
+
+    def add_listener(self, func, name):
+        pass
+
+    def remove_listener(self, func, name):
+        pass
+
+    def get_guild(self, guild_id):
+        return next((g for g in self.guilds if g.id == guild_id), None)
+
+    async def wait_until_ready(self):
+        pass
+
+
+class FakeGuild:
+    def __init__(self, banned=(), fail_loads: int = 0):
+        self.id = 1
+        self.name = "guild"
+        self.me = types.SimpleNamespace(guild_permissions=types.SimpleNamespace(ban_members=True))
+
+        self.banned = {user_id: BanEntry(reason=f"reason {user_id}", user=discord.Object(id=user_id))
+                       for user_id in banned}
+        self.fail_loads = fail_loads
+        self.list_calls = 0
+        self.fetch_calls = 0
+
+        # Set to have the ban list download wait.
+        self.hold = None
+
+    async def bans(self):
+        self.list_calls += 1
+
+        # The list is as it was when the request was made, however long it takes to arrive.
+        snapshot = list(self.banned.values())
+
+        if self.hold is not None:
+            await self.hold.wait()
+
+        if self.fail_loads:
+            self.fail_loads -= 1
+            raise http_error(discord.HTTPException, 500, "Internal Server Error")
+
+        return snapshot
+
+    async def fetch_ban(self, user):
+        self.fetch_calls += 1
+
+        if user.id not in self.banned:
+            raise http_error(discord.NotFound, 404, "Unknown Ban")
+
+        return self.banned[user.id]
+
+
+class BanManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.manager = bm.BanManager(self.bot)
+        self.addCleanup(self.manager.cleanup)
+
+        # Let the startup load (of no guilds) finish, so the tests load guilds themselves.
+        run(self.manager.__task__)
+
+    def test_index_used_once_loaded(self):
+        guild = FakeGuild(banned=[1, 2])
+        run(self.manager.load_guild(guild))
+
+        self.assertTrue(run(self.manager.is_banned(guild, 1)))
+        self.assertFalse(run(self.manager.is_banned(guild, 3)))
+        self.assertEqual(run(self.manager.get(guild, 2)).reason, "reason 2")
+
+        self.assertEqual(guild.list_calls, 1)
+        self.assertEqual(guild.fetch_calls, 0)
+        self.assertEqual(self.manager.ban_count(guild), 2)
+
+    def test_failed_load_falls_back_to_discord(self):
+        guild = FakeGuild(banned=[1], fail_loads=1)
+        self.bot.guilds.append(guild)
+
+        with mock.patch.object(bm, 'BAN_LOAD_RETRY_DELAY', 0.05):
+            run(self.manager.load_guild(guild))
+
+            # Nothing was loaded, but the user is still reported as banned.
+            self.assertTrue(run(self.manager.is_banned(guild, 1)))
+            self.assertEqual(run(self.manager.get(guild, 1)).reason, "reason 1")
+            self.assertIsNone(run(self.manager.get(guild, 2)))
+            self.assertEqual(guild.fetch_calls, 3)
+
+            # Let the retry run.
+            run(asyncio.sleep(0.1))
+
+        self.assertEqual(guild.list_calls, 2)
+        self.assertTrue(run(self.manager.is_banned(guild, 1)))
+        self.assertEqual(guild.fetch_calls, 3)
+
+    def test_unban_during_load(self):
+        guild = FakeGuild(banned=[1, 2])
+        guild.hold = asyncio.Event()
+
+        async def load():
+            task = asyncio.ensure_future(self.manager.load_guild(guild))
+            await asyncio.sleep(0)
+
+            del guild.banned[2]
+            await self.manager.on_member_unban(guild, discord.Object(id=2))
+            guild.hold.set()
+
+            await task
+
+        run(load())
+
+        self.assertTrue(run(self.manager.is_banned(guild, 1)))
+        self.assertFalse(run(self.manager.is_banned(guild, 2)))
+
+    def test_gateway_bans_after_load(self):
+        guild = FakeGuild()
+        run(self.manager.load_guild(guild))
+
+        user = discord.Object(id=5)
+        run(self.manager.on_member_ban(guild, user))
+        self.assertTrue(run(self.manager.is_banned(guild, 5)))
+
+        run(self.manager.on_member_unban(guild, user))
+        self.assertFalse(run(self.manager.is_banned(guild, 5)))
@@ -0,0 +1,162 @@
+import asyncio
+import re
+import time
+import types
+import unittest
+
+from libhusky import HuskyCompute
+from libhusky.managers import ComputeManager as cm
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def job_count(job: str, result: str) -> float:
+    return cm.JOBS.labels(job, result).value
+
+
+class FakeBot:
+    def __init__(self):
+        self.listeners = {}
+
+    def add_listener(self, func, name):
+        self.listeners[name] = func
+
+    def remove_listener(self, func, name):
+        del self.listeners[name]
+
+
+class KernelTest(unittest.TestCase):
+    def test_search_patterns(self):
+        patterns = [r"\bfoo\b", r"bar", r"\bbaz\b"]
+
+        self.assertEqual(HuskyCompute.search_patterns(patterns, "FOO and baz"), [0, 2])
+        self.assertEqual(HuskyCompute.search_patterns(patterns, "FOO and baz", first_only=True), [0])
+        self.assertEqual(HuskyCompute.search_patterns(patterns, "FOO and baz", flags=0), [2])
+        self.assertEqual(HuskyCompute.search_patterns(patterns, "nothing here"), [])
+
+    def test_best_sequence_match(self):
+        candidates = ["completely different", "hello world!", "hello world"]
+
+        (index, ratio) = HuskyCompute.best_sequence_match(candidates, "hello world", 0.9)
+        self.assertEqual(index, 1)
+        self.assertGreaterEqual(ratio, 0.9)
+
+        self.assertEqual(HuskyCompute.best_sequence_match(candidates, "zzz", 0.9), (None, None))
+
+    def test_estimates_scale_with_input(self):
+        short = HuskyCompute.estimate_search_patterns(["a"] * 10, "x" * 100)
+        long = HuskyCompute.estimate_search_patterns(["a"] * 10, "x" * 1000)
+
+        self.assertAlmostEqual(long, short * 10)
+        self.assertGreater(HuskyCompute.estimate_best_sequence_match(["x" * 100], "y" * 100), 0)
+
+
+class ComputeManagerTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.manager = cm.ComputeManager(self.bot, workers=1, inline_below=1, timeout=30)
+
+        # Kill any workers left behind, rather than waiting for them.
+        self.addCleanup(self.manager._recycle)
+
+    def test_cheap_job_runs_inline(self):
+        before = job_count("search_patterns", "inline")
+
+        result = run(self.manager.run(HuskyCompute.search_patterns, ["foo"], "FOO", cost=0.5))
+
+        self.assertEqual(result, [0])
+        self.assertIsNone(self.manager._executor)
+        self.assertEqual(job_count("search_patterns", "inline"), before + 1)
+
+    def test_expensive_job_is_offloaded(self):
+        before = job_count("search_patterns", "offloaded")
+
+        result = run(self.manager.run(HuskyCompute.search_patterns, ["foo", "bar"], "BAR", re.IGNORECASE, cost=5))
+
+        self.assertEqual(result, [1])
+        self.assertIsNotNone(self.manager._executor)
+        self.assertEqual(job_count("search_patterns", "offloaded"), before + 1)
+
+    def test_unestimated_job_is_offloaded(self):
+        run(self.manager.run(HuskyCompute.search_patterns, ["foo"], "foo"))
+
+        self.assertIsNotNone(self.manager._executor)
+
+    def test_timeout_recycles_pool(self):
+        before = job_count("sleep", "timeout")
+
+        with self.assertRaises(asyncio.TimeoutError):
+            run(self.manager.run(time.sleep, 30, timeout=0.5))
+
+        self.assertIsNone(self.manager._executor)
+        self.assertEqual(job_count("sleep", "timeout"), before + 1)
+
+        # The next job gets a new pool.
+        self.assertEqual(run(self.manager.run(HuskyCompute.search_patterns, ["foo"], "foo")), [0])
+
+    def test_job_on_killed_pool_is_retried(self):
+        self.manager = cm.ComputeManager(self.bot, workers=2, inline_below=1, timeout=30)
+        self.addCleanup(self.manager._recycle)
+
+        before = job_count("sleep", "timeout")
+
+        async def jobs():
+            stuck = asyncio.ensure_future(self.manager.run(time.sleep, 30, timeout=2))
+            innocent = asyncio.ensure_future(self.manager.run(time.sleep, 3, timeout=20))
+
+            return await asyncio.gather(stuck, innocent, return_exceptions=True)
+
+        start = time.perf_counter()
+        (stuck, innocent) = run(jobs())
+
+        self.assertIsInstance(stuck, asyncio.TimeoutError)
+        self.assertIsNone(innocent)
+
+        # The innocent job was restarted on the new pool as soon as the old one was killed, rather than waiting out its
+        # own timeout.
+        self.assertLess(time.perf_counter() - start, 15)
+        self.assertEqual(job_count("sleep", "timeout"), before + 1)
+        self.assertEqual(self.manager._in_flight, {})
+
+    def test_deleted_message_cancels_job(self):
+        message = types.SimpleNamespace(id=1234)
+        payload = types.SimpleNamespace(message_id=message.id)
+
+        async def delete_during_job():
+            job = asyncio.ensure_future(self.manager.run(time.sleep, 30, message=message))
+
+            while message.id not in self.manager._message_jobs:
+                await asyncio.sleep(0)
+
+            await self.bot.listeners["on_raw_message_delete"](payload)
+            return await job
+
+        with self.assertRaises(asyncio.CancelledError):
+            run(delete_during_job())
+
+        self.assertEqual(self.manager._message_jobs, {})
+
+    def test_bulk_delete_cancels_jobs(self):
+        messages = [types.SimpleNamespace(id=i) for i in (1, 2)]
+        payload = types.SimpleNamespace(message_ids={1, 2, 3})
+
+        async def delete_during_jobs():
+            jobs = [asyncio.ensure_future(self.manager.run(time.sleep, 30, message=m)) for m in messages]
+
+            while len(self.manager._message_jobs) < 2:
+                await asyncio.sleep(0)
+
+            await self.bot.listeners["on_raw_bulk_message_delete"](payload)
+            return await asyncio.gather(*jobs, return_exceptions=True)
+
+        results = run(delete_during_jobs())
+
+        self.assertTrue(all(isinstance(r, asyncio.CancelledError) for r in results))
+        self.assertEqual(self.manager._message_jobs, {})
+
+    def test_cleanup(self):
+        self.manager.cleanup()
+
+        self.assertEqual(self.bot.listeners, {})
@@ -0,0 +1,206 @@
+import asyncio
+import struct
+import unittest
+
+from libhusky import HuskyMedia
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def header(width: int, height: int, color_table: bool = False) -> bytes:
+    # A global color table of 2 ** (0 + 1) = 2 entries, if there is one.
+    flags = 0x80 if color_table else 0x00
+    data = b"GIF89a" + struct.pack("<HHBBB", width, height, flags, 0, 0)
+
+    return data + (b"\x00" * 6 if color_table else b"")
+
+
+def extension(payload: bytes = b"\x00" * 4) -> bytes:
+    # A graphic control extension.
+    return b"\x21\xF9" + bytes([len(payload)]) + payload + b"\x00"
+
+
+def frame(left: int = 0, top: int = 0, width: int = 10, height: int = 10, data: bytes = b"\x01\x02") -> bytes:
+    descriptor = b"\x2C" + struct.pack("<HHHHB", left, top, width, height, 0)
+
+    return descriptor + b"\x02" + bytes([len(data)]) + data + b"\x00"
+
+
+TRAILER = b"\x3B"
+
+
+def inspect(data: bytes, expected_size: int = None, chunk_size: int = None) -> HuskyMedia.GifInspector:
+    inspector = HuskyMedia.GifInspector()
+
+    if expected_size is not None:
+        inspector.set_expected_size(expected_size)
+
+    chunk_size = chunk_size or len(data) or 1
+
+    for i in range(0, len(data), chunk_size):
+        inspector.feed(data[i:i + chunk_size])
+
+    inspector.finish()
+    return inspector
+
+
+class FakeContent:
+    def __init__(self, data: bytes):
+        self._data = data
+        self._position = 0
+
+    async def read(self, n: int) -> bytes:
+        chunk = self._data[self._position:self._position + n]
+        self._position += len(chunk)
+
+        return chunk
+
+    def at_eof(self) -> bool:
+        return self._position >= len(self._data)
+
+
+class FakeResponse:
+    def __init__(self, data: bytes, content_length: int = None):
+        self.content = FakeContent(data)
+        self.content_length = content_length
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class GifInspectorTest(unittest.TestCase):
+    def test_normal_gif(self):
+        data = header(100, 100, color_table=True) + extension() + frame() + extension() + frame() + TRAILER
+        result = inspect(data).result
+
+        self.assertTrue(result.complete)
+        self.assertFalse(result.is_bomb)
+        self.assertEqual((result.width, result.height, result.frames), (100, 100, 2))
+        self.assertEqual(result.bytes_read, len(data))
+
+    def test_fed_a_byte_at_a_time(self):
+        data = header(100, 100, color_table=True) + extension() + frame() + TRAILER
+
+        inspector = inspect(data, chunk_size=1)
+
+        self.assertTrue(inspector.result.complete)
+        self.assertEqual(inspector.result.frames, 1)
+        self.assertIsNone(inspector.error)
+
+    def test_header_bomb_with_known_size(self):
+        inspector = HuskyMedia.GifInspector()
+        inspector.set_expected_size(500)
+        inspector.feed(header(10000, 10000))
+
+        self.assertTrue(inspector.done)
+        self.assertEqual(inspector.result.bomb_reason, "10000x10000 GIF in only 500 bytes")
+
+    def test_header_bomb_found_at_trailer(self):
+        result = inspect(header(10000, 10000) + frame() + TRAILER).result
+
+        self.assertTrue(result.is_bomb)
+
+    def test_truncated_header_bomb(self):
+        result = inspect(header(10000, 10000) + frame()[:5]).result
+
+        self.assertFalse(result.complete)
+        self.assertTrue(result.is_bomb)
+
+    def test_header_bomb_with_junk(self):
+        inspector = inspect(header(10000, 10000) + b"\x00")
+
+        self.assertEqual(inspector.error, "unexpected block 0x00")
+        self.assertTrue(inspector.result.is_bomb)
+
+    def test_huge_screen_in_big_file(self):
+        data = header(10000, 10000) + frame(data=b"\x00" * 255) * 4000 + TRAILER
+        result = inspect(data, chunk_size=HuskyMedia.CHUNK_SIZE).result
+
+        self.assertTrue(result.complete)
+        self.assertFalse(result.is_bomb)
+
+    def test_huge_screen_in_one_dimension(self):
+        result = inspect(header(10000, 100) + frame() + TRAILER).result
+
+        self.assertFalse(result.is_bomb)
+
+    def test_oversized_frame(self):
+        data = header(100, 100) + frame() + frame(left=50, width=200) + frame() + TRAILER
+        inspector = inspect(data)
+
+        self.assertTrue(inspector.done)
+        self.assertEqual(inspector.result.frames, 2)
+        self.assertEqual(inspector.result.bomb_reason, "frame 2 is 250x10 on a 100x100 screen")
+
+    def test_frame_within_twice_the_screen(self):
+        result = inspect(header(100, 100) + frame(left=100, top=100, width=100, height=100) + TRAILER).result
+
+        self.assertFalse(result.is_bomb)
+
+    def test_not_a_gif(self):
+        inspector = inspect(b"\x89PNG\r\n\x1a\n" + b"\x00" * 32)
+
+        self.assertEqual(inspector.error, "not a GIF")
+        self.assertFalse(inspector.result.is_bomb)
+        self.assertFalse(inspector.result.complete)
+
+    def test_unexpected_block(self):
+        inspector = inspect(header(100, 100) + frame() + b"\x99" + TRAILER)
+
+        self.assertEqual(inspector.error, "unexpected block 0x99")
+        self.assertFalse(inspector.result.is_bomb)
+
+    def test_nothing_fed_after_done(self):
+        inspector = HuskyMedia.GifInspector()
+        inspector.feed(header(100, 100) + TRAILER)
+        inspector.feed(b"more")
+
+        self.assertEqual(inspector.result.bytes_read, 14)
+
+
+class InspectGifTest(unittest.TestCase):
+    def test_reads_whole_gif(self):
+        data = header(100, 100) + frame() + TRAILER
+        response = FakeResponse(data, content_length=len(data))
+
+        result = run(HuskyMedia.inspect_gif(response))
+
+        self.assertTrue(result.complete)
+        self.assertFalse(response.closed)
+
+    def test_header_bomb_stops_early(self):
+        data = header(10000, 10000) + frame(data=b"\x00" * 255) * 1000 + TRAILER
+        response = FakeResponse(data, content_length=len(data))
+
+        result = run(HuskyMedia.inspect_gif(response))
+
+        self.assertTrue(result.is_bomb)
+        self.assertEqual(result.bytes_read, HuskyMedia.CHUNK_SIZE)
+        self.assertTrue(response.closed)
+
+    def test_header_bomb_with_junk_and_no_length(self):
+        result = run(HuskyMedia.inspect_gif(FakeResponse(header(10000, 10000) + b"\x00")))
+
+        self.assertTrue(result.is_bomb)
+
+    def test_byte_budget(self):
+        data = header(100, 100) + frame(data=b"\x00" * 255) * 1000 + TRAILER
+        response = FakeResponse(data, content_length=len(data))
+
+        result = run(HuskyMedia.inspect_gif(response, byte_budget=10000))
+
+        self.assertFalse(result.complete)
+        self.assertFalse(result.is_bomb)
+        self.assertEqual(result.bytes_read, 10000)
+        self.assertTrue(response.closed)
+
+    def test_head_counts_toward_budget(self):
+        data = header(100, 100) + frame(data=b"\x00" * 255) * 100 + TRAILER
+        response = FakeResponse(data[1000:])
+
+        result = run(HuskyMedia.inspect_gif(response, byte_budget=500, head=data[:1000]))
+
+        self.assertEqual(result.bytes_read, 500)
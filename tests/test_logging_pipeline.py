@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import unittest
+
+from libhusky import HuskyLogging
+
+
+def dropped(level: str) -> float:
+    return HuskyLogging.DROPPED_RECORDS.labels(level).value
+
+
+class CollectingHandler(logging.Handler):
+    def __init__(self, level=logging.NOTSET):
+        super().__init__(level)
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+        self.threads.add(threading.get_ident())
+
+
+class LoggingTestCase(unittest.TestCase):
+    def logger_for(self, handler: logging.Handler) -> logging.Logger:
+        log = logging.getLogger(f"HuskyBot.Tests.{self.id()}")
+        log.setLevel(logging.DEBUG)
+        log.propagate = False
+        log.addHandler(handler)
+        self.addCleanup(log.removeHandler, handler)
+
+        return log
+
+
+class DroppingQueueHandlerTest(LoggingTestCase):
+    def setUp(self):
+        self.queue = queue.Queue(maxsize=2)
+        self.log = self.logger_for(HuskyLogging.DroppingQueueHandler(self.queue))
+
+    def drain(self) -> list:
+        records = []
+
+        while not self.queue.empty():
+            records.append(self.queue.get_nowait())
+
+        return records
+
+    def test_message_is_rendered(self):
+        args = ["original"]
+        self.log.info("Value is %s", args)
+        args[0] = "changed"
+
+        (record,) = self.drain()
+
+        self.assertEqual(record.getMessage(), "Value is ['original']")
+        self.assertIsNone(record.args)
+
+    def test_full_queue_drops_and_counts(self):
+        before = dropped("INFO")
+
+        for i in range(5):
+            self.log.info(f"Message {i}")
+
+        self.assertEqual(dropped("INFO"), before + 3)
+        self.assertEqual([r.getMessage() for r in self.drain()], ["Message 0", "Message 1"])
+
+    def test_drop_warning_after_room(self):
+        for i in range(5):
+            self.log.info(f"Message {i}")
+
+        self.drain()
+        self.log.info("After")
+
+        (warning, record) = self.drain()
+
+        self.assertEqual(warning.levelno, logging.WARNING)
+        self.assertEqual(warning.name, "HuskyBot.Logging")
+        self.assertEqual(warning.getMessage(), "The log queue was full, so 3 log records were dropped.")
+        self.assertEqual(record.getMessage(), "After")
+
+        # The count starts over once reported.
+        self.log.info("Again")
+        self.assertEqual([r.getMessage() for r in self.drain()], ["Again"])
+
+    def test_drop_counted_until_warning_fits(self):
+        for i in range(3):
+            self.log.info(f"Message {i}")
+
+        # Room for the warning, but not the record after it.
+        self.queue.get_nowait()
+        self.log.info("Dropped too")
+
+        self.assertEqual(self.drain()[-1].getMessage(), "The log queue was full, so 1 log records were dropped.")
+
+        self.log.info("After")
+        self.assertEqual([r.getMessage() for r in self.drain()],
+                         ["The log queue was full, so 1 log records were dropped.", "After"])
+
+
+class LogPipelineTest(LoggingTestCase):
+    def test_records_written_on_listener_thread(self):
+        target = CollectingHandler()
+        pipeline = HuskyLogging.LogPipeline(target)
+        log = self.logger_for(pipeline.handler)
+
+        pipeline.start()
+
+        for i in range(100):
+            log.info(f"Message {i}")
+
+        pipeline.stop()
+
+        self.assertEqual([r.getMessage() for r in target.records], [f"Message {i}" for i in range(100)])
+        self.assertNotIn(threading.get_ident(), target.threads)
+        self.assertEqual(pipeline.depth(), 0)
+
+    def test_target_levels_respected(self):
+        everything = CollectingHandler()
+        warnings = CollectingHandler(logging.WARNING)
+        pipeline = HuskyLogging.LogPipeline(everything, warnings)
+        log = self.logger_for(pipeline.handler)
+
+        pipeline.start()
+        log.info("Info")
+        log.warning("Warning")
+        pipeline.stop()
+
+        self.assertEqual(len(everything.records), 2)
+        self.assertEqual([r.getMessage() for r in warnings.records], ["Warning"])
+
+    def test_stop_with_full_queue(self):
+        target = CollectingHandler()
+        pipeline = HuskyLogging.LogPipeline(target, queue_size=5)
+        log = self.logger_for(pipeline.handler)
+
+        # Fill the queue before anything drains it.
+        for i in range(10):
+            log.info(f"Message {i}")
+
+        self.assertEqual(pipeline.depth(), 5)
+
+        pipeline.start()
+        pipeline.stop()
+
+        self.assertEqual([r.getMessage() for r in target.records], [f"Message {i}" for i in range(5)])
+
+    def test_start_and_stop_are_idempotent(self):
+        pipeline = HuskyLogging.LogPipeline(CollectingHandler())
+
+        pipeline.start()
+        pipeline.start()
+        pipeline.stop()
+        pipeline.stop()
@@ -0,0 +1,112 @@
+import unittest
+
+from libhusky import HuskyMetrics
+
+
+class MetricTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = HuskyMetrics.MetricsRegistry()
+
+    def test_counter(self):
+        counter = self.registry.counter("test_events_total", "Events.", ("kind",))
+        counter.labels("a").inc()
+        counter.labels("a").inc(2)
+        counter.labels("b").inc()
+
+        self.assertEqual(counter.render(), [
+            "# HELP test_events_total Events.",
+            "# TYPE test_events_total counter",
+            'test_events_total{kind="a"} 3',
+            'test_events_total{kind="b"} 1'
+        ])
+
+    def test_unlabelled_metric(self):
+        counter = self.registry.counter("test_total", "Things.")
+        counter.inc()
+
+        self.assertIs(counter.labels(), counter.labels())
+        self.assertEqual(counter.render()[-1], "test_total 1")
+
+    def test_wrong_label_count(self):
+        counter = self.registry.counter("test_total", "Things.", ("a", "b"))
+
+        with self.assertRaises(ValueError):
+            counter.labels("only one")
+
+    def test_label_values_escaped(self):
+        counter = self.registry.counter("test_total", "Things.", ("name",))
+        counter.labels('say "hi"\n').inc()
+
+        self.assertEqual(counter.render()[-1], 'test_total{name="say \\"hi\\"\\n"} 1')
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("test_seconds", "Durations.", buckets=(1, 0.1))
+
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual(histogram.render()[2:], [
+            'test_seconds_bucket{le="0.1"} 2',
+            'test_seconds_bucket{le="1"} 3',
+            'test_seconds_bucket{le="+Inf"} 4',
+            "test_seconds_sum 5.65",
+            "test_seconds_count 4"
+        ])
+
+    def test_gauge_callback(self):
+        depth = [3]
+        gauge = self.registry.gauge("test_depth", "Depth.", callback=lambda: depth[0])
+
+        self.assertEqual(gauge.render()[-1], "test_depth 3")
+
+        depth[0] = 7
+        self.assertEqual(gauge.render()[-1], "test_depth 7")
+
+    def test_failing_gauge_callback_keeps_last_value(self):
+        gauge = self.registry.gauge("test_depth", "Depth.")
+        gauge.set(4)
+        gauge.callback = lambda: 1 / 0
+
+        with self.assertLogs("HuskyBot.Metrics", "ERROR"):
+            self.assertEqual(gauge.render()[-1], "test_depth 4")
+
+
+class RegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = HuskyMetrics.MetricsRegistry()
+
+    def test_get_or_create(self):
+        first = self.registry.counter("test_total", "Things.", ("kind",))
+        first.labels("a").inc()
+
+        # As when a plugin is reloaded.
+        second = self.registry.counter("test_total", "Things.", ("kind",))
+
+        self.assertIs(first, second)
+        self.assertEqual(second.labels("a").value, 1)
+        self.assertIs(self.registry.get("test_total"), first)
+
+    def test_name_clash_between_types(self):
+        self.registry.counter("test_total", "Things.")
+
+        with self.assertRaises(ValueError):
+            self.registry.gauge("test_total", "Things.")
+
+    def test_reloaded_gauge_callback_replaced(self):
+        self.registry.gauge("test_depth", "Depth.", callback=lambda: 1)
+        gauge = self.registry.gauge("test_depth", "Depth.", callback=lambda: 2)
+
+        self.assertEqual(gauge.render()[-1], "test_depth 2")
+
+    def test_render(self):
+        self.registry.counter("test_a_total", "A.").inc()
+        self.registry.gauge("test_b", "B.").set(2.5)
+
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP test_a_total A.",
+            "# TYPE test_a_total counter",
+            "test_a_total 1",
+            "# HELP test_b B.",
+            "# TYPE test_b gauge",
+            "test_b 2.5"
+        ]) + "\n")
@@ -0,0 +1,269 @@
+import asyncio
+import datetime
+import types
+import unittest
+from unittest import mock
+
+import discord
+
+from libhusky import HuskyConfig
+from libhusky.managers import ModActionManager as mam
+
+
+def run(coro):
+    return asyncio.get_event_loop().run_until_complete(coro)
+
+
+def http_error(cls, status: int, text: str = ""):
+    return cls(types.SimpleNamespace(status=status, reason=text), text)
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int = 1):
+        self.id = channel_id
+        self.bulk_deletes = []
+
+    async def delete_messages(self, messages):
+        self.bulk_deletes.append([m.id for m in messages])
+
+    def __str__(self):
+        return f"channel-{self.id}"
+
+
+class FakeMessage:
+    def __init__(self, message_id: int, channel: FakeChannel, deleted: bool = False):
+        self.id = message_id
+        self.channel = channel
+        self.created_at = datetime.datetime.utcnow()
+        self.deleted = deleted
+        self.delete_calls = 0
+
+    async def delete(self):
+        self.delete_calls += 1
+
+        if self.deleted:
+            raise http_error(discord.NotFound, 404, "Unknown Message")
+
+        self.deleted = True
+
+
+class FakeGuild:
+    """
+    A guild whose bans succeed, except for users listed in `missing` (404) or `forbidden` (403).
+    """
+
+    def __init__(self, missing=(), forbidden=()):
+        self.id = 1
+        self.missing = set(missing)
+        self.forbidden = set(forbidden)
+        self.bans = []
+        self.reasons = {}
+
+    async def ban(self, user, reason=None, delete_message_days=1):
+        await asyncio.sleep(0)
+
+        if user.id in self.missing:
+            raise http_error(discord.NotFound, 404, "Unknown User")
+
+        if user.id in self.forbidden:
+            raise http_error(discord.Forbidden, 403, "Missing Permissions")
+
+        self.bans.append(user.id)
+        self.reasons[user.id] = reason
+
+    async def kick(self, user, reason=None):
+        await asyncio.sleep(0)
+
+
+class ModActionTestCase(unittest.TestCase):
+    def setUp(self):
+        # Bulk ban jobs are kept in memory, rather than in config/bulkbans.json.
+        self.bulk_ban_config = HuskyConfig.WolfConfig()
+        patcher = mock.patch.object(mam.HuskyConfig, 'get_config', lambda *args, **kwargs: self.bulk_ban_config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.dispatched = []
+
+        self.manager = self.new_manager()
+
+    def new_manager(self) -> mam.ModActionManager:
+        bot = types.SimpleNamespace(loop=asyncio.get_event_loop(),
+                                    dispatch=lambda event, *args: self.dispatched.append((event, *args)))
+        return mam.ModActionManager(bot, flush_interval=0)
+
+
+class QueueTest(ModActionTestCase):
+    def test_deletes_are_coalesced(self):
+        channel = FakeChannel()
+        messages = [FakeMessage(i, channel) for i in range(5)]
+
+        futures = [self.manager.delete_message(m) for m in messages]
+        duplicate = self.manager.delete_message(messages[0])
+
+        self.assertIs(duplicate, futures[0])
+        self.assertEqual(run(asyncio.gather(*futures)), [True] * 5)
+        self.assertEqual(channel.bulk_deletes, [[0, 1, 2, 3, 4]])
+        self.assertEqual(self.manager.stats['deleteRequests'], 6)
+        self.assertEqual(self.manager.stats['deleteCalls'], 1)
+
+    def test_bulk_deleted_messages_announced(self):
+        channel = FakeChannel()
+        messages = [FakeMessage(i, channel) for i in range(3)]
+
+        futures = [self.manager.delete_message(m) for m in messages]
+        futures.append(self.manager.delete_message(FakeMessage(3, channel), quiet=True))
+        run(asyncio.gather(*futures))
+
+        self.assertEqual(self.dispatched, [('message_delete', m) for m in messages])
+
+    def test_quiet_delete_announced_if_also_requested_loudly(self):
+        channel = FakeChannel()
+        messages = [FakeMessage(i, channel) for i in range(2)]
+
+        futures = [self.manager.delete_message(m, quiet=True) for m in messages]
+        self.manager.delete_message(messages[0])
+        run(asyncio.gather(*futures))
+
+        self.assertEqual(self.dispatched, [('message_delete', messages[0])])
+
+    def test_single_delete_of_missing_message(self):
+        message = FakeMessage(1, FakeChannel(), deleted=True)
+
+        self.assertFalse(run(self.manager.delete_message(message)))
+        self.assertEqual(message.delete_calls, 1)
+
+    def test_bans_are_deduplicated(self):
+        guild = FakeGuild()
+        user = discord.Object(id=42)
+
+        first = self.manager.ban(guild, user)
+        second = self.manager.ban(guild, user)
+
+        self.assertIs(first, second)
+        self.assertTrue(run(first))
+        self.assertEqual(guild.bans, [42])
+
+    def test_recent_ban_suppresses_repeat(self):
+        guild = FakeGuild()
+        user = discord.Object(id=42)
+
+        self.assertTrue(run(self.manager.ban(guild, user)))
+        self.assertIsNone(run(self.manager.ban(guild, user)))
+        self.assertEqual(guild.bans, [42])
+
+    def test_kick_coalesces_into_ban_in_flight(self):
+        guild = FakeGuild()
+        member = types.SimpleNamespace(id=42, guild=guild)
+
+        ban = self.manager.ban(guild, member)
+        kick = self.manager.kick(member)
+
+        self.assertIs(kick, ban)
+        run(ban)
+
+    def test_recent_bans_forgotten(self):
+        guild = FakeGuild()
+        self.manager._ban_memory = 0
+
+        run(self.manager.ban(guild, discord.Object(id=1)))
+        run(self.manager.ban(guild, discord.Object(id=2)))
+
+        self.assertEqual(list(self.manager._recent_bans), [(1, 2)])
+
+    def test_ban_of_missing_user(self):
+        guild = FakeGuild(missing=[42])
+
+        self.assertFalse(run(self.manager.ban(guild, discord.Object(id=42))))
+
+
+class BulkBanTest(ModActionTestCase):
+    def test_result_accounting(self):
+        guild = FakeGuild(missing=[2], forbidden=[4])
+
+        result = run(self.manager.bulk_ban(guild, [1, 2, 3, 4, 1], "raid"))
+
+        self.assertEqual(sorted(result['succeeded']), [1, 3])
+        self.assertEqual(sorted(result['failed']), [(2, "not found"), (4, "403 Missing Permissions")])
+        self.assertEqual(sorted(guild.bans), [1, 3])
+
+    def test_recently_banned_user_counts_as_banned(self):
+        guild = FakeGuild()
+        run(self.manager.ban(guild, discord.Object(id=1)))
+
+        result = run(self.manager.bulk_ban(guild, [1, 2], "raid"))
+
+        self.assertEqual(sorted(result['succeeded']), [1, 2])
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(guild.bans, [1, 2])
+
+    def test_per_user_reasons(self):
+        guild = FakeGuild()
+
+        run(self.manager.bulk_ban(guild, [1, 2], "[MASSBAN] raid", reasons={2: "[HACKBAN | MASSBAN] raid"}))
+
+        self.assertEqual(guild.reasons, {1: "[MASSBAN] raid", 2: "[HACKBAN | MASSBAN] raid"})
+
+    def test_progress_callback(self):
+        progress = []
+
+        async def callback(completed, total):
+            progress.append((completed, total))
+
+        run(self.manager.bulk_ban(FakeGuild(), [1, 2, 3], "raid", progress_callback=callback))
+
+        self.assertEqual(sorted(progress), [(1, 3), (2, 3), (3, 3)])
+
+    def test_finished_job_is_forgotten(self):
+        run(self.manager.bulk_ban(FakeGuild(), [1, 2, 3], "raid", job_id="job"))
+
+        self.assertEqual(self.manager.get_interrupted_bulk_bans(), {})
+
+    def test_resume_after_interruption(self):
+        stuck = asyncio.Event()
+        guild = FakeGuild()
+        original_ban = guild.ban
+
+        async def ban(user, **kwargs):
+            # User 3 never finishes, standing in for the bot going down mid-job.
+            if user.id == 3:
+                await stuck.wait()
+
+            await original_ban(user, **kwargs)
+
+        guild.ban = ban
+
+        async def interrupt():
+            task = asyncio.ensure_future(self.manager.bulk_ban(guild, [1, 2, 3], "raid", job_id="job",
+                                                               concurrency=1, reasons={3: "hackban"}))
+
+            while len(guild.bans) < 2:
+                await asyncio.sleep(0)
+
+            await asyncio.sleep(0.01)
+            task.cancel()
+
+        with mock.patch.object(mam, 'BULK_BAN_CHECKPOINT_INTERVAL', 1):
+            run(interrupt())
+
+        job = self.manager.get_interrupted_bulk_bans()["job"]
+        self.assertEqual(job['pending'], [3])
+        self.assertEqual(job['reasons'], {"3": "hackban"})
+        self.assertEqual(sorted(job['succeeded']), [1, 2])
+
+        # Let the queued ban of user 3 finish, so its task isn't left pending.
+        stuck.set()
+        run(asyncio.sleep(0.01))
+
+        # A fresh manager, as after a restart.
+        resumed_guild = FakeGuild(missing=[3])
+        result = run(self.new_manager().resume_bulk_ban(resumed_guild, "job"))
+
+        self.assertEqual(resumed_guild.bans, [])
+        self.assertEqual(sorted(result['succeeded']), [1, 2])
+        self.assertEqual(result['failed'], [(3, "not found")])
+        self.assertEqual(self.manager.get_interrupted_bulk_bans(), {})
+
+    def test_resume_unknown_job(self):
+        with self.assertRaises(KeyError):
+            run(self.manager.resume_bulk_ban(FakeGuild(), "nope"))